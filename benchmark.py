@@ -0,0 +1,561 @@
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import struct
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from io import BytesIO
+from datetime import datetime
+
+# Benchmark cases, each timed in its own process. The modules under test are imported inside the
+# cases, so a missing Pillow only fails the cases that need it.
+CASES = ["scan", "scan_manifest", "statistics", "merge", "catalog_save", "catalog_load", "thumbnails"]
+
+# Cases whose input files are written by a separate process first, so building them costs the case
+# neither time nor memory
+SETUP_CASES = ["scan_manifest", "catalog_load"]
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Entry scripts checked by --startup; each must import without parsing arguments or opening a window
+STARTUP_MODULES = ["gui_json", "image_analytics", "new_image_catalog_by_year", "update_json_by_year", "catalog_cli"]
+
+# Records in the catalog opened by --startup
+STARTUP_RECORDS = 10000
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "image_cataloger_benchmark")
+
+# Modification years of the generated files; every case selects the whole range
+FIRST_YEAR = 2015
+LAST_YEAR = 2023
+
+# Bump when the generated trees change, so older trees in the work directory are rebuilt
+TREE_VERSION = 1
+
+# A 1x1 GIF
+GIF_BYTES = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+PAYLOAD_VARIANTS = 16
+
+
+def png_bytes(width, height, seed):
+    # an RGB PNG written with zlib, so no imaging library is needed
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    rows = b"".join(b"\x00" + bytes((seed * 31 + x * 7 + y * 13) & 0xFF for x in range(width * 3))
+                    for y in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def jpeg_bytes(width, height, seed):
+    # real JPEG payloads need Pillow; without it the .jpg files get PNG data (Pillow reads by content)
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    image = Image.new("RGB", (width, height), ((seed * 37) & 0xFF, (seed * 73) & 0xFF, (seed * 11) & 0xFF))
+    output = BytesIO()
+    image.save(output, "JPEG", quality=85)
+    return output.getvalue()
+
+
+def parse_extension_mix(text):
+    # ".jpg:6,.png:3,.gif:1" -> [(".jpg", 6), (".png", 3), (".gif", 1)]
+    mix = []
+    for part in text.split(","):
+        extension, _, weight = part.strip().partition(":")
+        mix.append((extension.lower(), int(weight or 1)))
+    return mix
+
+
+def tree_settings(args, file_count):
+    return {
+        "version": TREE_VERSION,
+        "files": file_count,
+        "depth": args.depth,
+        "fanout": args.fanout,
+        "files_per_dir": args.files_per_dir,
+        "extensions": args.extensions,
+        "ignore_count": args.ignore_count,
+        "image_size": args.image_size,
+    }
+
+
+def generate_tree(root, settings):
+    # Synthetic image tree: files_per_dir files per directory, directories nested depth levels deep
+    # with fanout subdirectories each, modification years spread over FIRST_YEAR..LAST_YEAR.
+    # Returns the tree description written to root/tree.json.
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+
+    size = settings["image_size"]
+    payloads = {".png": [png_bytes(size, size, seed) for seed in range(PAYLOAD_VARIANTS)], ".gif": [GIF_BYTES]}
+    jpeg_payloads = [jpeg_bytes(size, size, seed) for seed in range(PAYLOAD_VARIANTS)]
+    real_jpeg = jpeg_payloads[0] is not None
+    payloads[".jpg"] = payloads[".jpeg"] = jpeg_payloads if real_jpeg else payloads[".png"]
+
+    extensions = []
+    for extension, weight in parse_extension_mix(settings["extensions"]):
+        extensions.extend([extension] * weight)
+
+    years = LAST_YEAR - FIRST_YEAR + 1
+    image_root = os.path.join(root, "images")
+    for i in range(settings["files"]):
+        directory_number = i // settings["files_per_dir"]
+        parts = [f"d{(directory_number // settings['fanout'] ** level) % settings['fanout']}"
+                 for level in range(settings["depth"])]
+        directory = os.path.join(image_root, *parts)
+        os.makedirs(directory, exist_ok=True)
+        extension = extensions[i % len(extensions)]
+        file_path = os.path.join(directory, f"image_{i:07d}{extension}")
+        variants = payloads.get(extension, payloads[".png"])
+        with open(file_path, "wb") as image_file:
+            image_file.write(variants[i % len(variants)])
+        timestamp = datetime(FIRST_YEAR + i % years, 1 + i % 12, 1 + i % 28, 12).timestamp()
+        os.utime(file_path, (timestamp, timestamp))
+
+    # one real directory is ignored, the other entries match nothing but are still checked
+    ignore_list = [os.path.join(image_root, *(["d1"] * settings["depth"])).replace("\\", "/")]
+    for j in range(1, settings["ignore_count"]):
+        if j % 2:
+            ignore_list.append(f"{image_root}/not_there_{j}".replace("\\", "/"))
+        else:
+            ignore_list.append(f"*/skip_{j}/*")
+
+    tree = dict(settings, image_root=image_root, ignore_list=ignore_list[:settings["ignore_count"]],
+                real_jpeg=real_jpeg)
+    with open(os.path.join(root, "tree.json"), "w", encoding="utf-8") as tree_file:
+        json.dump(tree, tree_file, indent=4)
+    return tree
+
+
+def prepare_tree(work_dir, settings):
+    # reuse a tree generated earlier with the same settings
+    root = os.path.join(work_dir, f"tree_{settings['files']}")
+    try:
+        with open(os.path.join(root, "tree.json"), encoding="utf-8") as tree_file:
+            tree = json.load(tree_file)
+        if all(tree.get(key) == value for key, value in settings.items()):
+            return root, tree
+    except (OSError, ValueError):
+        pass
+    print(f"Generating {settings['files']} files in {root}...")
+    return root, generate_tree(root, settings)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def proc_status_mb(field):
+    # VmRSS (current) or VmHWM (peak) from /proc/self/status; None where there is no /proc
+    try:
+        with open("/proc/self/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Linux: restart the peak RSS (VmHWM) from the current RSS; False where that is not possible
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class TimedSection:
+    # The measured part of a case: wall time, the peak RSS during the part and how far it rose over
+    # the RSS at the start, so the case's untimed setup does not count. Without /proc only the
+    # process peak is known, which includes the setup.
+
+    def __enter__(self):
+        self.peak_reset = reset_peak_rss()
+        self.start_rss = proc_status_mb("VmRSS")
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.start
+        if self.peak_reset and self.start_rss is not None:
+            self.peak_rss = proc_status_mb("VmHWM")
+            self.rss_increase = round(self.peak_rss - self.start_rss, 1)
+        else:
+            self.peak_rss = peak_rss_mb()
+            self.rss_increase = None
+        return False
+
+
+def catalog_records(image_files):
+    from image_record import new_image_record
+    load_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [new_image_record(image_file.path, "benchmark", load_date,
+                             datetime.fromtimestamp(image_file.mtime).strftime("%Y-%m-%d %H:%M:%S"))
+            for image_file in image_files]
+
+
+def tree_scanner(tree):
+    # scan function for the generated tree; its modules are imported here, so a timed scan leaves
+    # out the import time
+    from image_scanner import find_image_files
+    from ignore_matcher import IgnoreMatcher
+
+    def scan(manifest=None):
+        return find_image_files(FIRST_YEAR, LAST_YEAR, tree["image_root"], IgnoreMatcher(tree["ignore_list"]),
+                                manifest=manifest)
+    return scan
+
+
+def scan_tree(tree, manifest=None):
+    return tree_scanner(tree)(manifest)
+
+
+def scratch_dir(root, clear):
+    scratch = os.path.join(root, "scratch")
+    if clear:
+        shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch, exist_ok=True)
+    return scratch
+
+
+def manifest_path(scratch):
+    return os.path.join(scratch, "detail.manifest.json")
+
+
+def catalog_path(scratch):
+    return os.path.join(scratch, f"detail_{FIRST_YEAR}_{LAST_YEAR}.json")
+
+
+def setup_case(case, root, tree):
+    # runs in its own process before a SETUP_CASES case; writes the case's input files
+    scratch = scratch_dir(root, clear=True)
+
+    if case == "scan_manifest":
+        from scan_manifest import ScanManifest
+        from image_scanner import CATALOG_EXTENSIONS
+        manifest = ScanManifest(CATALOG_EXTENSIONS)
+        scan_tree(tree, manifest)
+        manifest.save(manifest_path(scratch))
+
+    elif case == "catalog_load":
+        from catalog_journal import write_json_catalog
+        catalog = {f"detail_{FIRST_YEAR}_{LAST_YEAR}": catalog_records(scan_tree(tree))}
+        write_json_catalog(catalog_path(scratch), catalog, indent=4)
+
+
+def run_case(case, root, tree, thumbnail_files):
+    # runs in the child process; returns (files processed, TimedSection of the measured part)
+    scratch = scratch_dir(root, clear=case not in SETUP_CASES)
+
+    if case == "scan":
+        scan = tree_scanner(tree)
+        with TimedSection() as timed:
+            image_files = scan()
+        return len(image_files), timed
+
+    if case == "scan_manifest":
+        # a second scan with the manifest of the first one, as update_json_by_year does
+        from scan_manifest import ScanManifest
+        from image_scanner import CATALOG_EXTENSIONS
+        scan = tree_scanner(tree)
+        with TimedSection() as timed:
+            image_files = scan(ScanManifest.load(manifest_path(scratch), CATALOG_EXTENSIONS))
+        return len(image_files), timed
+
+    if case == "statistics":
+        from image_analytics import get_image_statistics
+        with TimedSection() as timed:
+            statistics = get_image_statistics(tree["image_root"])
+        return sum(row["Count"] for row in statistics), timed
+
+    if case == "catalog_load":
+        from catalog_model import CatalogModel
+        with TimedSection() as timed:
+            model = CatalogModel.open(catalog_path(scratch))
+        return len(model.paths), timed
+
+    image_files = scan_tree(tree)
+
+    if case == "merge":
+        # half of the files are in the catalog already
+        from catalog_merge import diff_records
+        records = catalog_records(image_files)
+        existing = [record.to_dict() for record in records[:len(records) // 2]]
+        with TimedSection() as timed:
+            diff_records(existing, records)
+        return len(records), timed
+
+    if case == "catalog_save":
+        from catalog_journal import write_json_catalog
+        catalog = {f"detail_{FIRST_YEAR}_{LAST_YEAR}": catalog_records(image_files)}
+        with TimedSection() as timed:
+            write_json_catalog(catalog_path(scratch), catalog, indent=4)
+        return len(image_files), timed
+
+    if case == "thumbnails":
+        from thumbnail_cache import ThumbnailCache
+        image_paths = [image_file.path for image_file in image_files[:thumbnail_files]]
+        thumbnail_cache = ThumbnailCache(os.path.join(scratch, "thumbnails"))
+        with TimedSection() as timed:
+            generated, failed = thumbnail_cache.pregenerate(image_paths)
+        return generated, timed
+
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+
+def run_child(arguments):
+    # run this script with arguments in a fresh interpreter; returns (output lines, error or None)
+    command = [sys.executable, os.path.abspath(__file__)] + arguments
+    completed = subprocess.run(command, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0:
+        return lines, (completed.stderr.strip().splitlines() or ["no output"])[-1]
+    return lines, None
+
+
+def run_case_process(case, root, thumbnail_files):
+    # time one case in a fresh interpreter, after writing its input files in another one;
+    # returns its result dictionary
+    if case in SETUP_CASES:
+        _, error = run_child(["--setup_case", case, "--tree", root])
+        if error:
+            return {"case": case, "error": f"setup: {error}"}
+    lines, error = run_child(["--run_case", case, "--tree", root, "--thumbnail_files", str(thumbnail_files)])
+    if error or not lines:
+        return {"case": case, "error": error or "no output"}
+    return json.loads(lines[-1])
+
+
+def import_time(module):
+    # import time of a module in a fresh interpreter, summed from python -X importtime, and the
+    # slowest modules it imports directly
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        return {"module": module, "error": (completed.stderr.strip().splitlines() or ["no output"])[-1]}
+
+    # each line is "import time: self | cumulative | name", with the name indented by its depth;
+    # a module's imports are listed before it
+    total_us = 0
+    subtree = []
+    direct_imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        total_us += int(self_us)
+        if name.startswith("  "):
+            subtree.append((int(cumulative_us), name))
+            continue
+        if name.strip() == module:
+            direct_imports = sorted((us, name.strip()) for us, name in subtree
+                                    if name.startswith("   ") and not name.startswith("    "))
+        subtree = []
+    return {
+        "module": module,
+        "import_ms": round(total_us / 1000, 1),
+        "slowest_imports": {name: round(us / 1000, 1) for us, name in reversed(direct_imports[-5:])},
+    }
+
+
+def open_catalog_time(catalog_file_path, runs):
+    # wall time of a fresh interpreter importing the app and opening a catalog, best of runs.
+    # The Tk window itself is not created, so this also runs without a display.
+    code = "import sys, gui_json; from catalog_model import CatalogModel; CatalogModel.open(sys.argv[1]).close()"
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", code, catalog_file_path], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError((completed.stderr.strip().splitlines() or ["no output"])[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 1)
+
+
+def interpreter_time(runs):
+    # start-up of a bare interpreter, the floor under every entry script
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 1)
+
+
+def check_startup(work_dir, runs, import_budget_ms, startup_budget_ms):
+    # returns the start-up results and the number of budgets exceeded
+    from catalog_journal import write_json_catalog
+    from image_record import new_image_record
+    catalog_dir = os.path.join(work_dir, "startup")
+    os.makedirs(catalog_dir, exist_ok=True)
+    catalog_file_path = os.path.join(catalog_dir, f"detail_{FIRST_YEAR}_{LAST_YEAR}.json")
+    load_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    records = [new_image_record(f"/pictures/{index // 100}/image_{index}.jpg", "benchmark", load_date, load_date)
+               for index in range(STARTUP_RECORDS)]
+    write_json_catalog(catalog_file_path, {f"detail_{FIRST_YEAR}_{LAST_YEAR}": records}, indent=4)
+
+    failures = 0
+    modules = []
+    for module in STARTUP_MODULES:
+        result = import_time(module)
+        modules.append(result)
+        if "error" in result:
+            failures += 1
+            print(f"{module:>26}: error: {result['error']}")
+            continue
+        over = result["import_ms"] > import_budget_ms
+        failures += over
+        slowest = ", ".join(f"{name} {ms} ms" for name, ms in result["slowest_imports"].items())
+        print(f"{module:>26}: import {result['import_ms']:7.1f} ms{'  OVER BUDGET' if over else ''}  ({slowest})")
+
+    interpreter_ms = interpreter_time(runs)
+    try:
+        open_catalog_ms = open_catalog_time(catalog_file_path, runs)
+    except RuntimeError as e:
+        print(f"{'open catalog':>26}: error: {e}")
+        return {"modules": modules, "interpreter_ms": interpreter_ms, "error": str(e)}, failures + 1
+    over = open_catalog_ms > startup_budget_ms
+    failures += over
+    print(f"{'open catalog':>26}: {open_catalog_ms:7.1f} ms for {STARTUP_RECORDS} records, "
+          f"bare interpreter {interpreter_ms} ms{'  OVER BUDGET' if over else ''}")
+    return {
+        "modules": modules,
+        "interpreter_ms": interpreter_ms,
+        "open_catalog_ms": open_catalog_ms,
+        "records": STARTUP_RECORDS,
+        "import_budget_ms": import_budget_ms,
+        "startup_budget_ms": startup_budget_ms,
+    }, failures
+
+
+def compare_results(results, previous, tolerance):
+    # print the throughput change per case; returns the number of regressions beyond tolerance
+    previous_cases = {(case["case"], case["tree_files"]): case for case in previous.get("cases", [])}
+    regressions = 0
+    for case in results["cases"]:
+        before = previous_cases.get((case["case"], case["tree_files"]))
+        if not before or not case.get("files_per_second") or not before.get("files_per_second"):
+            continue
+        ratio = case["files_per_second"] / before["files_per_second"]
+        regressed = ratio < 1 - tolerance
+        regressions += regressed
+        print(f"{case['case']:>14} {case['tree_files']:>7}: {ratio:6.2f}x{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scanning, statistics, merging, catalog load/save and thumbnails on synthetic image trees.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Number of files of each generated tree.')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES, help='Cases to run.')
+    parser.add_argument('--work_dir', default=DEFAULT_WORK_DIR, help='Directory for the generated trees, reused between runs.')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file to write the results to.')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare throughput against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Throughput drop reported as a regression (0.2 = 20%%).')
+    parser.add_argument('--depth', type=int, default=3, help='Directory nesting depth.')
+    parser.add_argument('--fanout', type=int, default=10, help='Subdirectories per directory.')
+    parser.add_argument('--files_per_dir', type=int, default=50, help='Image files per directory.')
+    parser.add_argument('--extensions', default='.jpg:6,.png:3,.gif:1', help='Extension mix with weights.')
+    parser.add_argument('--ignore_count', type=int, default=20, help='Number of ignore list entries.')
+    parser.add_argument('--image_size', type=int, default=64, help='Width and height of the generated images.')
+    parser.add_argument('--thumbnail_files', type=int, default=1000, help='Images per tree used for the thumbnail case.')
+    parser.add_argument('--startup', action='store_true', help='Check start-up time instead of running the cases: the import time of each entry script (python -X importtime) and the time to open a catalog in a fresh interpreter.')
+    parser.add_argument('--import_budget_ms', type=float, default=150, help='Import time allowed for each entry script with --startup.')
+    parser.add_argument('--startup_budget_ms', type=float, default=400, help='Time allowed for opening a catalog in a fresh interpreter with --startup.')
+    parser.add_argument('--startup_runs', type=int, default=5, help='Runs per start-up measurement; the fastest counts.')
+    parser.add_argument('--run_case', help=argparse.SUPPRESS)
+    parser.add_argument('--setup_case', help=argparse.SUPPRESS)
+    parser.add_argument('--tree', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case or args.setup_case:
+        with open(os.path.join(args.tree, "tree.json"), encoding="utf-8") as tree_file:
+            tree = json.load(tree_file)
+        if args.setup_case:
+            # child process: write the input files of one case
+            setup_case(args.setup_case, args.tree, tree)
+            return
+        # child process: run one case and print its result as the last line
+        files, timed = run_case(args.run_case, args.tree, tree, args.thumbnail_files)
+        print(json.dumps({
+            "case": args.run_case,
+            "files": files,
+            "seconds": round(timed.seconds, 4),
+            "files_per_second": round(files / timed.seconds, 1) if timed.seconds > 0 else None,
+            "peak_rss_mb": timed.peak_rss,
+            "rss_increase_mb": timed.rss_increase,
+        }))
+        return
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cases": [],
+    }
+
+    if args.startup:
+        # exits with status 1 when an import or the catalog opening is over its budget
+        results["startup"], failures = check_startup(args.work_dir, args.startup_runs, args.import_budget_ms,
+                                                     args.startup_budget_ms)
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=4)
+        print("output=", args.output)
+        if failures:
+            sys.exit(1)
+        return
+    for file_count in args.sizes:
+        root, tree = prepare_tree(args.work_dir, tree_settings(args, file_count))
+        for case in args.cases:
+            result = run_case_process(case, root, args.thumbnail_files)
+            result["tree_files"] = file_count
+            results["cases"].append(result)
+            if "error" in result:
+                print(f"{case:>14} {file_count:>7}: error: {result['error']}")
+            else:
+                if result["rss_increase_mb"] is not None:
+                    memory = f"RSS +{result['rss_increase_mb']} MB, peak {result['peak_rss_mb']} MB"
+                else:
+                    memory = f"process peak RSS {result['peak_rss_mb']} MB"
+                print(f"{case:>14} {file_count:>7}: {result['seconds']:8.3f} s {result['files_per_second'] or 0:12.1f} files/s "
+                      f"{memory}")
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=4)
+    print("output=", args.output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)
+        if compare_results(results, previous, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import contextlib
+from datetime import datetime, MINYEAR, MAXYEAR
+import profiling
+
+# Exit codes. argparse exits with 2 for invalid arguments.
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CONFLICT = 3
+
+# --if_exists choices; "ask" is left out, nothing here opens a window
+IF_EXISTS_CHOICES = ["overwrite", "skip", "fail"]
+
+# Errors reported as {"status": "error"} with exit code 1; ImportError covers a missing Pillow or numpy
+COMMAND_ERRORS = (ValueError, OSError, sqlite3.Error, ImportError)
+
+
+class Conflict(Exception):
+    # an output exists and --if_exists is "fail"
+    pass
+
+
+def read_device_id(device_id_file):
+    from new_image_catalog_by_year import get_device_id
+    device_id = get_device_id(device_id_file)
+    if device_id is None:
+        raise ValueError(f"no device_id in {device_id_file}; create it with new_device_id.py")
+    return device_id
+
+
+def check_output_file(output_file_path, if_exists):
+    # True when the output file is to be written
+    if not os.path.exists(output_file_path) or if_exists == "overwrite":
+        return True
+    if if_exists == "skip":
+        return False
+    raise Conflict(f"{output_file_path} already exists")
+
+
+def scan(args):
+    from image_scanner import scan_image_files
+    from ignore_matcher import IgnoreMatcher, read_ignore_list
+    image_files = scan_image_files(args.search_path, IgnoreMatcher(read_ignore_list(args.ignore_file)),
+                                   max_workers=args.workers)
+    if args.start_year or args.end_year:
+        start_year = args.start_year or MINYEAR
+        end_year = args.end_year or MAXYEAR
+        image_files = [image_file for image_file in image_files
+                       if start_year <= datetime.fromtimestamp(image_file.mtime).year <= end_year]
+
+    years = {}
+    for image_file in image_files:
+        year = str(datetime.fromtimestamp(image_file.mtime).year)
+        years[year] = years.get(year, 0) + 1
+    result = {
+        "files": len(image_files),
+        "bytes": sum(image_file.size for image_file in image_files),
+        "files_by_year": dict(sorted(years.items())),
+    }
+    if args.list:
+        result["paths"] = [image_file.path for image_file in image_files]
+    return result
+
+
+def analyze(args):
+    from image_analytics import collect_image_statistics, write_statistics_file
+    statistics = collect_image_statistics(args.search_path, max_workers=args.workers)
+    rows = statistics.rows(args.search_path, datetime.now().strftime('%m/%d/%Y %H:%M'))
+    if args.output_file:
+        if not check_output_file(args.output_file, args.if_exists):
+            return {"skipped": args.output_file}
+        write_statistics_file(rows, args.output_file)
+    return {
+        "files": statistics.total_count(),
+        "bytes": statistics.total_size(),
+        "output_file": args.output_file,
+        "rows": rows,
+    }
+
+
+def create(args):
+    from ignore_matcher import read_ignore_list
+    from new_image_catalog_by_year import create_catalogs, CatalogExists
+    try:
+        return create_catalogs(args.catalog_path, args.search_path, args.start_year, args.end_year,
+                               read_ignore_list(args.ignore_file), sqlite_file=args.sqlite_file,
+                               partitions=args.partitions, content_hash=args.content_hash,
+                               duplicates_file=args.duplicates_file, canonical_only=args.canonical_only,
+                               phash=args.phash, exif=args.exif, device_id=read_device_id(args.device_id_file),
+                               if_exists=args.if_exists)
+    except CatalogExists as e:
+        raise Conflict(str(e))
+
+
+def update(args):
+    from ignore_matcher import read_ignore_list
+    from update_json_by_year import update_catalog
+    merge_stats = update_catalog(args.catalog_file_path, args.search_path, read_ignore_list(args.ignore_file),
+                                 catalog_name=args.catalog_name, full_rescan=args.full_rescan,
+                                 stats_file=args.stats_file, content_hash=args.content_hash,
+                                 duplicates_file=args.duplicates_file, canonical_only=args.canonical_only,
+                                 phash=args.phash, exif=args.exif, device_id=read_device_id(args.device_id_file))
+    if not args.changes:
+        # the lists of added/modified/vanished paths can be long; --stats_file or --changes keeps them
+        merge_stats.pop("changes", None)
+    return merge_stats
+
+
+def dedup(args):
+    from image_scanner import scan_image_files
+    from ignore_matcher import IgnoreMatcher, read_ignore_list
+    from content_hash import HashCache, DuplicateFinder, duplicates_report, write_duplicates_report, hash_cache_path_for
+    image_files = scan_image_files(args.search_path, IgnoreMatcher(read_ignore_list(args.ignore_file)),
+                                   max_workers=args.workers)
+    hash_cache_file_path = args.hash_cache_file or hash_cache_path_for(".")
+    hash_cache = HashCache.load(hash_cache_file_path)
+    duplicate_groups = DuplicateFinder(hash_cache, args.workers).find(image_files)
+    hash_cache.save(hash_cache_file_path)
+
+    if args.duplicates_file and check_output_file(args.duplicates_file, args.if_exists):
+        report = write_duplicates_report(duplicate_groups, args.duplicates_file)
+    else:
+        report = duplicates_report(duplicate_groups)
+    report["files"] = len(image_files)
+    report["duplicates_file"] = args.duplicates_file
+    if not args.list:
+        del report["duplicates"]
+    return report
+
+
+def export(args):
+    # the kind of export follows the output file: .npz snapshot, SQLite catalog file, or JSON catalog
+    from catalog_sqlite import SqliteCatalogStore, is_sqlite_catalog
+    output_file_path = args.output_file
+
+    if is_sqlite_catalog(output_file_path):
+        # import JSON catalogs; --if_exists applies to the catalogs already in the SQLite file
+        from catalog_stream import iter_catalogs
+        store = SqliteCatalogStore(output_file_path)
+        try:
+            existing = set(store.catalog_names())
+            imported = {}
+            skipped = []
+            for json_file_path in args.catalog_file:
+                names = [name for name, _ in iter_catalogs(json_file_path)]
+                conflicts = existing.intersection(names)
+                if conflicts and args.if_exists == "fail":
+                    raise Conflict(f"{', '.join(sorted(conflicts))} already in {output_file_path}")
+                if conflicts and args.if_exists == "skip":
+                    skipped.append(json_file_path)
+                    continue
+                imported.update(store.import_json(json_file_path))
+                existing.update(names)
+        finally:
+            store.close()
+        return {"output_file": output_file_path, "records": imported, "skipped": skipped}
+
+    if not check_output_file(output_file_path, args.if_exists):
+        return {"output_file": output_file_path, "skipped": True}
+
+    if output_file_path.lower().endswith(".npz"):
+        from catalog_snapshot import export_snapshot
+        count = export_snapshot(args.catalog_file, output_file_path)
+        return {"output_file": output_file_path, "records": count}
+
+    if len(args.catalog_file) != 1 or not is_sqlite_catalog(args.catalog_file[0]):
+        raise ValueError("a JSON export needs exactly one SQLite --catalog_file")
+    store = SqliteCatalogStore(args.catalog_file[0])
+    try:
+        records = store.export_json(output_file_path, args.catalog_name)
+    finally:
+        store.close()
+    return {"output_file": output_file_path, "records": records}
+
+
+COMMANDS = {"scan": scan, "analyze": analyze, "create": create, "update": update, "dedup": dedup, "export": export}
+
+
+def add_scan_arguments(parser):
+    parser.add_argument('--search_path', required=True, help='Path to the directory to search for image files.')
+    parser.add_argument('--ignore_file', type=str, required=False, help='Text file name with paths to ignore.')
+
+
+def add_catalog_arguments(parser):
+    parser.add_argument('--content_hash', action='store_true', help='Store a content hash of each image file in its record.')
+    parser.add_argument('--duplicates_file', type=str, required=False, help='JSON file to write the groups of identical image files to.')
+    parser.add_argument('--canonical_only', action='store_true', help='Catalog only one copy of identical image files.')
+    parser.add_argument('--phash', action='store_true', help='Store a perceptual hash of each image for finding near-duplicates.')
+    parser.add_argument('--exif', action='store_true', help='Read the capture date, camera, size and GPS position from the image headers and select images by capture year.')
+    parser.add_argument('--device_id_file', default='device_id.json', help='JSON file with the device_id, see new_device_id.py.')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Run the image cataloger without a display. Each command prints one JSON object on stdout; '
+                    'progress messages go to stderr. Exit status: 0 done, 1 error, 2 invalid arguments, '
+                    '3 an output exists and --if_exists is fail.')
+    parser.add_argument('--quiet', action='store_true', help='Do not print progress messages.')
+    profiling.add_arguments(parser)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = commands.add_parser('scan', help='List the catalog images below a directory.')
+    add_scan_arguments(scan_parser)
+    scan_parser.add_argument('--start_year', type=int, help='Only count files modified in or after this year.')
+    scan_parser.add_argument('--end_year', type=int, help='Only count files modified in or before this year.')
+    scan_parser.add_argument('--list', action='store_true', help='Include the image paths in the output.')
+    scan_parser.add_argument('--workers', type=int, help='Directories listed at the same time.')
+
+    analyze_parser = commands.add_parser('analyze', help='Count images and their size per year and type, as image_analytics.py does.')
+    analyze_parser.add_argument('--search_path', required=True, help='Directory to analyze.')
+    analyze_parser.add_argument('--output_file', help='Also write the statistics to this tab delimited file (file_analysis.txt layout).')
+    analyze_parser.add_argument('--if_exists', choices=IF_EXISTS_CHOICES, default='overwrite', help='When --output_file exists.')
+    analyze_parser.add_argument('--workers', type=int, help='Directories listed at the same time.')
+
+    create_parser = commands.add_parser('create', help='Create catalogs, as new_image_catalog_by_year.py does.')
+    create_parser.add_argument('--catalog_path', required=True, help='Directory where the JSON catalogs are written.')
+    add_scan_arguments(create_parser)
+    create_parser.add_argument('--start_year', type=int, help='Starting year of the date range. Not needed when --partitions lists the ranges.')
+    create_parser.add_argument('--end_year', type=int, help='Ending year of the date range. Not needed when --partitions lists the ranges.')
+    create_parser.add_argument('--sqlite_file', help='Write the catalogs into this SQLite catalog file instead of JSON files.')
+    create_parser.add_argument('--partitions', help='"yearly" or ranges such as 2015-2017,2018,2019-2023.')
+    create_parser.add_argument('--if_exists', choices=IF_EXISTS_CHOICES, default='fail', help='When a catalog already exists.')
+    add_catalog_arguments(create_parser)
+
+    update_parser = commands.add_parser('update', help='Add new images to a catalog, as update_json_by_year.py does.')
+    update_parser.add_argument('--catalog_file_path', required=True, help='JSON (or SQLite .db/.sqlite) catalog file.')
+    update_parser.add_argument('--catalog_name', help='Catalog to update inside a SQLite catalog file, e.g. detail_2023.')
+    add_scan_arguments(update_parser)
+    update_parser.add_argument('--full_rescan', action='store_true', help='Ignore the scan manifest and read every directory again.')
+    update_parser.add_argument('--stats_file', help='JSON file to write the merge statistics to.')
+    update_parser.add_argument('--changes', action='store_true', help='Include the added, modified and vanished paths in the output.')
+    add_catalog_arguments(update_parser)
+
+    dedup_parser = commands.add_parser('dedup', help='Find identical image files.')
+    add_scan_arguments(dedup_parser)
+    dedup_parser.add_argument('--duplicates_file', help='JSON file to write the duplicate groups to.')
+    dedup_parser.add_argument('--hash_cache_file', help='Hash cache to reuse between runs. Default: content_hashes.json in the current directory.')
+    dedup_parser.add_argument('--if_exists', choices=IF_EXISTS_CHOICES, default='overwrite', help='When --duplicates_file exists.')
+    dedup_parser.add_argument('--list', action='store_true', help='Include the duplicate groups in the output.')
+    dedup_parser.add_argument('--workers', type=int, help='Files hashed at the same time.')
+
+    export_parser = commands.add_parser('export', help='Export catalogs to a .npz snapshot, a SQLite catalog file, or JSON.')
+    export_parser.add_argument('--catalog_file', required=True, nargs='+', help='Catalog files to export.')
+    export_parser.add_argument('--output_file', required=True, help='.npz snapshot, .db/.sqlite catalog file, or .json catalog.')
+    export_parser.add_argument('--catalog_name', nargs='*', help='Catalogs to export from a SQLite file to JSON. Default: all.')
+    export_parser.add_argument('--if_exists', choices=IF_EXISTS_CHOICES, default='fail', help='When the output (or a catalog in a SQLite output) exists.')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    profiling.enable(args.profile, args.cprofile)
+
+    # the library code reports progress with print; keep stdout for the JSON result
+    log = open(os.devnull, "w") if args.quiet else sys.stderr
+    result = {"command": args.command}
+    try:
+        with contextlib.redirect_stdout(log):
+            result.update(COMMANDS[args.command](args))
+        result["status"] = "ok"
+        exit_code = EXIT_OK
+    except Conflict as e:
+        result.update(status="conflict", error=str(e))
+        exit_code = EXIT_CONFLICT
+    except COMMAND_ERRORS as e:
+        result.update(status="error", error=str(e))
+        exit_code = EXIT_ERROR
+    finally:
+        if args.quiet:
+            log.close()
+
+    print(json.dumps(result, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
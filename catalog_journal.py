@@ -0,0 +1,132 @@
+import os
+import json
+from catalog_merge import normalize_source
+from image_record import record_to_json
+import profiling
+
+# Compact the journal into the catalog file once it grows past this size
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+
+def journal_path_for(catalog_file_path):
+    # detail_2023.json -> detail_2023.journal.jsonl, next to the catalog
+    return os.path.splitext(catalog_file_path)[0] + ".journal.jsonl"
+
+
+def write_json_atomic(file_path, json_data, **dump_options):
+    # write to a temporary file in the same directory, flush it to disk, then rename over the
+    # catalog; a crash leaves either the old or the new file, never a truncated one. The temporary
+    # file is named per process, so runs in parallel never write into each other's.
+    temp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    dump_options.setdefault("default", record_to_json)
+    with profiling.span("json.dump", file=os.path.basename(file_path)), open(temp_file_path, "w", encoding="utf-8") as f:
+        json.dump(json_data, f, **dump_options)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file_path, file_path)
+
+
+class CatalogJournal:
+    # Append-only JSON-lines log of record edits and trash operations for one JSON catalog.
+    # Each line is {"op": "update", "catalog": ..., "record": {...}} or
+    # {"op": "remove", "catalog": ..., "source": ...}. Readers apply the journal (pending) while
+    # streaming the catalog file; compaction (catalog_stream.compact_catalog) writes the result
+    # back to the catalog file and empties the journal.
+
+    def __init__(self, catalog_file_path):
+        self.catalog_file_path = catalog_file_path
+        self.journal_file_path = journal_path_for(catalog_file_path)
+        self.tail_checked = False
+
+    def size(self):
+        try:
+            return os.path.getsize(self.journal_file_path)
+        except OSError:
+            return 0
+
+    def drop_partial_line(self):
+        # cut off a line left incomplete by a crash, so new entries are not appended after it
+        try:
+            with open(self.journal_file_path, "rb+") as journal_file:
+                data = journal_file.read()
+                if data and not data.endswith(b"\n"):
+                    journal_file.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+        self.tail_checked = True
+
+    def append(self, entry):
+        if not self.tail_checked:
+            self.drop_partial_line()
+        with open(self.journal_file_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(entry, ensure_ascii=False, default=record_to_json) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def record_updated(self, parent_key, record):
+        self.append({"op": "update", "catalog": parent_key, "record": record})
+
+    def record_removed(self, parent_key, source):
+        self.append({"op": "remove", "catalog": parent_key, "source": source})
+
+    def entries(self):
+        try:
+            journal_file = open(self.journal_file_path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with journal_file:
+            for line in journal_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash during append; everything before it is intact
+                    return
+
+    def pending(self):
+        # the journal as JournalEdits, for applying it while streaming the catalog file
+        journal_edits = JournalEdits()
+        for entry in self.entries():
+            if entry["op"] == "update":
+                journal_edits.update(entry["catalog"], entry["record"])
+            elif entry["op"] == "remove":
+                journal_edits.remove(entry["catalog"], entry["source"])
+        return journal_edits
+
+
+class JournalEdits:
+    # Net effect of a journal: the latest version of each updated record and the removed sources,
+    # keyed by (catalog name, normalized source). An update after a removal is ignored; the record
+    # stays removed.
+
+    def __init__(self):
+        self.updated = {}
+        self.removed = set()
+
+    def __bool__(self):
+        return bool(self.updated or self.removed)
+
+    def update(self, parent_key, record):
+        key = (parent_key, normalize_source(record["source"]))
+        if key not in self.removed:
+            self.updated[key] = record
+
+    def remove(self, parent_key, source):
+        key = (parent_key, normalize_source(source))
+        self.removed.add(key)
+        self.updated.pop(key, None)
+
+    def apply(self, parent_key, records):
+        # the records of one catalog with the edits applied
+        for record in records:
+            key = (parent_key, normalize_source(record.get("source", "")))
+            if key in self.removed:
+                continue
+            yield self.updated.get(key, record)
+
+
+def write_json_catalog(catalog_file_path, json_data, **dump_options):
+    # replace the whole catalog; the journal entries are part of json_data and no longer needed
+    write_json_atomic(catalog_file_path, json_data, **dump_options)
+    journal_file_path = journal_path_for(catalog_file_path)
+    if os.path.exists(journal_file_path):
+        os.remove(journal_file_path)
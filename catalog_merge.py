@@ -0,0 +1,96 @@
+import os
+import re
+import json
+import profiling
+
+# Windows drive paths (C:/..., C:\...) compare case-insensitively on every platform
+DRIVE_PATH = re.compile(r"^[A-Za-z]:/")
+
+
+def normalize_source(source):
+    # key used to match catalog sources: forward slashes, and case folded where paths are case-insensitive
+    source = str(source).replace("\\", "/")
+    if os.name == "nt" or DRIVE_PATH.match(source):
+        source = source.lower()
+    return source
+
+
+def build_source_index(records):
+    # normalized source -> position in records, built once per merge
+    source_index = {}
+    for position, record in enumerate(records):
+        source = record.get("source")
+        if source:
+            source_index.setdefault(normalize_source(source), position)
+    return source_index
+
+
+@profiling.traced("merge")
+def diff_records(existing_records, found_records):
+    # Compare a scan with the catalog without holding the existing records: existing_records may be
+    # any iterable (e.g. streamed from the catalog file), only source and date_modified are kept.
+    # Returns the found records to append and the merge statistics:
+    #   added     - found and not in the catalog, appended
+    #   unchanged - found and in the catalog with the same date_modified
+    #   modified  - found and in the catalog, but the file's date_modified changed
+    #   vanished  - in the catalog but not found by this scan
+    existing_index = {}
+    existing_count = 0
+    for record in existing_records:
+        existing_count += 1
+        source = record.get("source")
+        if source:
+            existing_index.setdefault(normalize_source(source), (source, record.get("date_modified")))
+
+    found_sources = set()
+    added_records = []
+    changes = {"added": [], "unchanged": [], "modified": [], "vanished": []}
+
+    for record in found_records:
+        source = normalize_source(record["source"])
+        if source in found_sources:
+            # the same file reached twice, e.g. through C:\x and C:/x
+            continue
+        found_sources.add(source)
+
+        existing = existing_index.get(source)
+        if existing is None:
+            added_records.append(record)
+            changes["added"].append(record["source"])
+        elif existing[1] == record.get("date_modified"):
+            changes["unchanged"].append(existing[0])
+        else:
+            changes["modified"].append(existing[0])
+
+    for source, existing in existing_index.items():
+        if source not in found_sources:
+            changes["vanished"].append(existing[0])
+
+    stats = {key: len(sources) for key, sources in changes.items()}
+    stats["existing"] = existing_count
+    stats["found"] = len(found_sources)
+    stats["total"] = existing_count + len(added_records)
+    stats["changes"] = changes
+    return added_records, stats
+
+
+def merge_records(existing_records, found_records):
+    # Append the found records that are not in the catalog yet. Existing records are kept as they are.
+    # Returns the merged list and the merge statistics (see diff_records).
+    merged_records = list(existing_records)
+    added_records, stats = diff_records(merged_records, found_records)
+    merged_records.extend(added_records)
+    return merged_records, stats
+
+
+def merge_catalog(existing_catalog, base_name, found_records):
+    # merge into the base_name list of a loaded catalog dictionary, in place
+    merged_records, stats = merge_records(existing_catalog.get(base_name, []), found_records)
+    existing_catalog[base_name] = merged_records
+    stats["catalog"] = base_name
+    return stats
+
+
+def write_merge_stats(stats, stats_file_path):
+    with open(stats_file_path, "w", encoding="utf-8") as stats_file:
+        json.dump(stats, stats_file, indent=4)
@@ -0,0 +1,233 @@
+from array import array
+from bisect import bisect_left
+from catalog_merge import normalize_source
+from catalog_journal import CatalogJournal, JOURNAL_COMPACT_BYTES
+from catalog_sqlite import SqliteCatalogStore, is_sqlite_catalog
+from catalog_stream import compact_catalog, load_catalog_records
+from image_record import ImageRecord, to_image_records
+from similarity_index import MultiIndexHash
+
+
+class JsonCatalogFile:
+    # detail_*.json storage: edits are appended to the catalog's journal (detail_*.journal.jsonl)
+    # and compacted into the file, sorted by edit timestamp, when the journal grows past
+    # compact_bytes or the catalog is closed. Compaction reads the file on disk, not the model,
+    # so changes written by other processes since the catalog was opened are kept.
+
+    def __init__(self, file_path, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.file_path = file_path
+        self.journal = CatalogJournal(file_path)
+        self.compact_bytes = compact_bytes
+
+    def load(self):
+        return load_catalog_records(self.file_path)
+
+    def compact(self):
+        compact_catalog(self.file_path)
+
+    def record_updated(self, model, parent_key, record):
+        self.journal.record_updated(parent_key, record)
+        if self.journal.size() > self.compact_bytes:
+            self.compact()
+
+    def record_removed(self, model, parent_key, source):
+        self.journal.record_removed(parent_key, source)
+        if self.journal.size() > self.compact_bytes:
+            self.compact()
+
+    def close(self, model=None):
+        if self.journal.size():
+            self.compact()
+
+
+class SourceIndex:
+    # normalized source -> position for one catalog list. Holds the hash of each normalized source in
+    # a sorted array instead of a dictionary of path strings, 16 bytes a record; a hash is confirmed
+    # against the record's source, so different sources with equal hashes are told apart. A source
+    # that occurs twice gives its first position, as in catalog_merge.
+
+    def __init__(self, records):
+        self.records = records
+        entries = sorted((hash(normalize_source(record["source"])), position)
+                         for position, record in enumerate(records) if record.get("source"))
+        self.hashes = array("q", [entry[0] for entry in entries])
+        self.positions = array("q", [entry[1] for entry in entries])
+
+    def entries(self, key):
+        # entry numbers of the hash of key, lowest position first
+        key_hash = hash(key)
+        entry = bisect_left(self.hashes, key_hash)
+        while entry < len(self.hashes) and self.hashes[entry] == key_hash:
+            yield entry
+            entry += 1
+
+    def position(self, key):
+        # position of a normalized source, or None
+        for entry in self.entries(key):
+            position = self.positions[entry]
+            if normalize_source(self.records[position]["source"]) == key:
+                return position
+        return None
+
+    def remove(self, key, position):
+        # the record of key at position has been taken out of the list; the records after it move up
+        for entry in self.entries(key):
+            if self.positions[entry] == position:
+                del self.hashes[entry]
+                del self.positions[entry]
+                break
+        positions = self.positions
+        for entry in range(len(positions)):
+            if positions[entry] > position:
+                positions[entry] -= 1
+
+
+class SourcePaths:
+    # the Picture Deck path list: the sources of the records, made into path strings as they are read;
+    # holds the records rather than a copy of every path
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [record["source"] for record in self.records[index]]
+        return self.records[index]["source"]
+
+    def __iter__(self):
+        return (record["source"] for record in self.records)
+
+
+class CatalogModel:
+    # In-memory catalog: json_data ({catalog name: [ImageRecord]}) plus a normalized source -> position
+    # index per catalog (SourceIndex) and the Picture Deck path list (SourcePaths). Both are derived from
+    # json_data. The index is kept up to date by replace_record, remove_record and sort instead of being
+    # rebuilt from the whole catalog; the path list is made on first use after a change.
+    # The store (JsonCatalogFile or SqliteCatalogStore) persists update_record and trash_record.
+
+    def __init__(self, json_data=None, store=None):
+        self.json_data = {}
+        self.path_list = None
+        self.source_index = {}
+        self.similarity_index = None
+        self.store = store
+        self.set_data(json_data or {})
+
+    @classmethod
+    def open(cls, file_path):
+        # .db/.sqlite files are SQLite catalogs, anything else a JSON catalog
+        if is_sqlite_catalog(file_path):
+            store = SqliteCatalogStore(file_path)
+        else:
+            store = JsonCatalogFile(file_path)
+        return cls(store.load(), store)
+
+    def set_data(self, json_data):
+        # loaded dictionaries become ImageRecords, which take a fraction of the memory; JSON catalogs
+        # are parsed straight into ImageRecords (load_catalog_records)
+        interned = {}
+        for records in json_data.values():
+            if isinstance(records, list):
+                to_image_records(records, interned)
+        self.json_data = json_data
+        self.rebuild()
+
+    def rebuild(self):
+        self.path_list = None
+        self.source_index = {}
+        self.similarity_index = None
+        for parent_key in self.catalog_names():
+            self.source_index[parent_key] = SourceIndex(self.json_data[parent_key])
+
+    @property
+    def paths(self):
+        # records hold their source in two parts, so the path strings are only made when the
+        # Picture Deck or thumbnail generation reads them
+        if self.path_list is None:
+            self.path_list = SourcePaths([record for parent_key in self.catalog_names()
+                                          for record in self.json_data[parent_key] if record.get("source")])
+        return self.path_list
+
+    def position(self, parent_key, source):
+        # position of a source in one catalog list, or None
+        catalog_index = self.source_index.get(parent_key)
+        if catalog_index is None:
+            return None
+        return catalog_index.position(normalize_source(source))
+
+    def catalog_names(self):
+        return [key for key, value in self.json_data.items() if isinstance(value, list)]
+
+    def records(self, parent_key):
+        return self.json_data[parent_key]
+
+    def find(self, source):
+        # returns (catalog name, record) or (None, None)
+        key = normalize_source(source)
+        for parent_key, catalog_index in self.source_index.items():
+            position = catalog_index.position(key)
+            if position is not None:
+                return parent_key, self.json_data[parent_key][position]
+        return None, None
+
+    def replace_record(self, parent_key, record):
+        position = self.position(parent_key, record["source"])
+        if position is None:
+            return False
+        records = self.json_data[parent_key]
+        if records[position].get("phash") != record.get("phash"):
+            self.similarity_index = None
+        records[position] = ImageRecord.from_dict(record)
+        self.path_list = None
+        return True
+
+    def remove_record(self, parent_key, source):
+        position = self.position(parent_key, source)
+        if position is None:
+            return False
+        self.similarity_index = None
+        self.json_data[parent_key].pop(position)
+        self.source_index[parent_key].remove(normalize_source(source), position)
+        # the same source may be in several catalogs; the path list is made again on next use
+        self.path_list = None
+        return True
+
+    def near_duplicates(self, phash, max_distance):
+        # [(distance, source)] of the records whose perceptual hash is within max_distance bits,
+        # closest first; the index is built on first use
+        if self.similarity_index is None:
+            self.similarity_index = MultiIndexHash()
+            for parent_key in self.catalog_names():
+                for record in self.json_data[parent_key]:
+                    if record.get("phash") and record.get("source"):
+                        self.similarity_index.add(int(record["phash"], 16), record["source"])
+        return sorted(self.similarity_index.search(int(phash, 16), max_distance))
+
+    def sort(self, field, reverse=True):
+        for parent_key in self.catalog_names():
+            self.json_data[parent_key].sort(key=lambda x: x.get(field, 0), reverse=reverse)
+        self.rebuild()
+
+    def update_record(self, parent_key, record):
+        # merge the edited fields into the record and persist it; the edit dialog shows only the
+        # descriptive fields, so content_hash, phash and the EXIF fields are kept from the stored record
+        position = self.position(parent_key, record["source"])
+        if position is None:
+            return
+        merged = dict(self.json_data[parent_key][position].items())
+        merged.update(record.items())
+        record = ImageRecord.from_dict(merged)
+        if self.replace_record(parent_key, record):
+            self.store.record_updated(self, parent_key, record)
+
+    def close(self):
+        # flush pending changes (JSON journal compaction) and release the store
+        self.store.close(self)
+
+    def trash_record(self, parent_key, source):
+        # remove a record and persist the removal
+        if self.remove_record(parent_key, source):
+            self.store.record_removed(self, parent_key, source)
@@ -0,0 +1,246 @@
+import argparse
+from array import array
+import numpy as np
+from catalog_stream import iter_catalog_records
+from catalog_sqlite import SqliteCatalogStore, is_sqlite_catalog
+
+SNAPSHOT_VERSION = 1
+
+# Columns stored dictionary-encoded: an int32 code per record plus the distinct values, which are
+# kept as UTF-8 bytes with offsets (<column>_codes, <column>_data, <column>_offsets)
+STRING_COLUMNS = ["catalog", "source", "device_id", "artist", "media", "category", "location",
+                  "year_of_work", "for_sale"]
+
+# Numeric columns and their array typecodes. year comes from date_modified; a missing or unparsable
+# year or timestamp is 0, a missing or unparsable price is NaN.
+NUMERIC_COLUMNS = {"year": "h", "timestamp": "q", "price": "d"}
+
+NUMERIC_DTYPES = {"h": np.int16, "q": np.int64, "d": np.float64}
+
+
+class StringColumnEncoder:
+
+    def __init__(self):
+        self.codes = array("i")
+        self.index = {}
+        self.values = []
+
+    def add(self, value):
+        value = "" if value is None else str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def arrays(self, column):
+        encoded = [value.encode("utf-8") for value in self.values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        return {
+            f"{column}_codes": np.frombuffer(self.codes, dtype=np.int32),
+            f"{column}_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            f"{column}_offsets": offsets,
+        }
+
+
+def parse_year(date_modified):
+    try:
+        return int(str(date_modified)[:4])
+    except ValueError:
+        return 0
+
+
+def parse_price(price):
+    # "1,200", "$300" and 300 are all 300-ish prices; "" and "n/a" are NaN
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price)
+    try:
+        return float(str(price).strip().lstrip("$€£").replace(",", ""))
+    except ValueError:
+        return float("nan")
+
+
+def parse_timestamp(timestamp):
+    return timestamp if isinstance(timestamp, int) and not isinstance(timestamp, bool) else 0
+
+
+def catalog_file_records(catalog_file_path):
+    # (catalog name, record) for a JSON catalog (streamed) or every catalog of a SQLite file
+    if is_sqlite_catalog(catalog_file_path):
+        store = SqliteCatalogStore(catalog_file_path)
+        try:
+            for catalog in store.catalog_names():
+                for record in store.records(catalog):
+                    yield catalog, record
+        finally:
+            store.close()
+    else:
+        yield from iter_catalog_records(catalog_file_path)
+
+
+def export_snapshot(catalog_file_paths, snapshot_file_path):
+    # write the records of one or more catalog files into one .npz snapshot; returns the record count
+    encoders = {column: StringColumnEncoder() for column in STRING_COLUMNS}
+    numbers = {column: array(typecode) for column, typecode in NUMERIC_COLUMNS.items()}
+
+    for catalog_file_path in catalog_file_paths:
+        for catalog, record in catalog_file_records(catalog_file_path):
+            encoders["catalog"].add(catalog)
+            for column in STRING_COLUMNS[1:]:
+                encoders[column].add(record.get(column))
+            numbers["year"].append(parse_year(record.get("date_modified", "")))
+            numbers["timestamp"].append(parse_timestamp(record.get("timestamp")))
+            numbers["price"].append(parse_price(record.get("price", "")))
+
+    arrays = {"version": np.array(SNAPSHOT_VERSION)}
+    for column, encoder in encoders.items():
+        arrays.update(encoder.arrays(column))
+    for column, values in numbers.items():
+        arrays[column] = np.frombuffer(values, dtype=NUMERIC_DTYPES[NUMERIC_COLUMNS[column]])
+    np.savez(snapshot_file_path, **arrays)
+    return len(numbers["year"])
+
+
+class CatalogSnapshot:
+    # Read side of a snapshot. Conditions and group-bys work on the integer codes, so a query
+    # never touches the strings of the records it does not return.
+    #
+    #   snapshot = CatalogSnapshot.load("catalogs.npz")
+    #   mask = snapshot.mask(category="art", year=(2015, 2020))
+    #   snapshot.group_by(["year", "for_sale"], sum_column="price", mask=mask)
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.value_cache = {}
+
+    @classmethod
+    def load(cls, snapshot_file_path):
+        with np.load(snapshot_file_path) as snapshot_file:
+            arrays = {name: snapshot_file[name] for name in snapshot_file.files}
+        if int(arrays.get("version", -1)) != SNAPSHOT_VERSION:
+            raise ValueError(f"{snapshot_file_path} is not a version {SNAPSHOT_VERSION} catalog snapshot")
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.arrays["year"])
+
+    def values(self, column):
+        # the distinct values of a string column, indexed by code
+        if column not in self.value_cache:
+            data = self.arrays[f"{column}_data"].tobytes()
+            offsets = self.arrays[f"{column}_offsets"].tolist()
+            values = np.empty(len(offsets) - 1, dtype=object)
+            values[:] = [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+            self.value_cache[column] = values
+        return self.value_cache[column]
+
+    def column(self, column, mask=None):
+        # per-record values of a column, optionally only the records selected by mask
+        if column in NUMERIC_COLUMNS:
+            data = self.arrays[column]
+            return data if mask is None else data[mask]
+        codes = self.arrays[f"{column}_codes"]
+        return self.values(column)[codes if mask is None else codes[mask]]
+
+    def mask(self, **conditions):
+        # records matching all conditions: a value, a list of values, or (low, high) inclusive for numbers
+        mask = np.ones(len(self), dtype=bool)
+        for column, condition in conditions.items():
+            wanted = condition if isinstance(condition, (list, set)) else [condition]
+            if column in NUMERIC_COLUMNS:
+                data = self.arrays[column]
+                if isinstance(condition, tuple):
+                    low, high = condition
+                    mask &= (data >= low) & (data <= high)
+                else:
+                    mask &= np.isin(data, list(wanted))
+            elif column in STRING_COLUMNS:
+                wanted_codes = np.flatnonzero(np.isin(self.values(column), [str(value) for value in wanted]))
+                mask &= np.isin(self.arrays[f"{column}_codes"], wanted_codes)
+            else:
+                raise KeyError(f"Unknown snapshot column: {column}")
+        return mask
+
+    def count(self, mask=None):
+        return len(self) if mask is None else int(np.count_nonzero(mask))
+
+    def sum(self, column, mask=None):
+        return float(np.nansum(self.column(column, mask)))
+
+    def group_codes(self, column):
+        # (code per record, number of codes) for a column
+        if column in NUMERIC_COLUMNS:
+            values, codes = np.unique(self.arrays[column], return_inverse=True)
+            return codes, values
+        return self.arrays[f"{column}_codes"], self.values(column)
+
+    def group_by(self, columns, sum_column=None, mask=None):
+        # one dictionary per group: the group values, "count", and the sum of sum_column (NaN counts as 0)
+        keys = np.zeros(len(self), dtype=np.int64)
+        group_values = []
+        for column in columns:
+            codes, values = self.group_codes(column)
+            keys = keys * len(values) + codes
+            group_values.append(values)
+        if mask is not None:
+            keys = keys[mask]
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique_keys))
+        if sum_column:
+            weights = np.nan_to_num(self.column(sum_column, mask).astype(np.float64))
+            sums = np.bincount(inverse, weights=weights, minlength=len(unique_keys))
+
+        # split the combined keys back into one code per column
+        columns_codes = []
+        for values in reversed(group_values):
+            columns_codes.append(unique_keys % len(values))
+            unique_keys = unique_keys // len(values)
+        columns_codes.reverse()
+
+        group_columns = [values[codes].tolist() for values, codes in zip(group_values, columns_codes)]
+        rows = []
+        for i, count in enumerate(counts.tolist()):
+            row = {column: group_column[i] for column, group_column in zip(columns, group_columns)}
+            row["count"] = count
+            if sum_column:
+                row[sum_column] = float(sums[i])
+            rows.append(row)
+        return rows
+
+
+def parse_condition(text):
+    # "category=art", "year=2015..2020" or "for_sale=yes,Yes"
+    column, _, value = text.partition("=")
+    if column in NUMERIC_COLUMNS:
+        number = float if NUMERIC_COLUMNS[column] == "d" else int
+        if ".." in value:
+            low, high = value.split("..")
+            return column, (number(low), number(high))
+        return column, [number(v) for v in value.split(",")]
+    return column, value.split(",")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export catalogs to a columnar .npz snapshot, or report on a snapshot.')
+    parser.add_argument('command', choices=['export', 'report'], help='export catalog files, or report on a snapshot.')
+    parser.add_argument('--snapshot_file', required=True, help='Path to the .npz snapshot file.')
+    parser.add_argument('--catalog_file', nargs='+', help='JSON or SQLite catalog files to export.')
+    parser.add_argument('--group_by', nargs='+', default=['catalog'], help='Columns to group the report by.')
+    parser.add_argument('--sum', dest='sum_column', help='Numeric column to total per group, e.g. price.')
+    parser.add_argument('--where', nargs='*', default=[], help='Conditions such as category=art year=2015..2020.')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        if not args.catalog_file:
+            parser.error('export needs --catalog_file')
+        count = export_snapshot(args.catalog_file, args.snapshot_file)
+        print(f"Exported {count} records to {args.snapshot_file}")
+    else:
+        snapshot = CatalogSnapshot.load(args.snapshot_file)
+        mask = snapshot.mask(**dict(parse_condition(condition) for condition in args.where)) if args.where else None
+        header = args.group_by + ['count'] + ([args.sum_column] if args.sum_column else [])
+        print("\t".join(header))
+        for row in snapshot.group_by(args.group_by, args.sum_column, mask):
+            print("\t".join(str(row[column]) for column in header))
@@ -0,0 +1,168 @@
+import os
+import json
+import sqlite3
+import argparse
+from catalog_merge import normalize_source
+from catalog_journal import write_json_catalog
+from catalog_stream import iter_catalogs
+from image_record import RECORD_FIELDS
+
+# File extensions opened as SQLite catalogs instead of JSON
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Record keys in RECORD_FIELDS are stored in their own columns. Any other key is kept in the extra
+# column as JSON. The columns are declared without a type, so strings, integers, floats and null keep
+# their type; values SQLite has no type for (booleans, lists, objects, integers beyond 64 bits) go to
+# the extra column too.
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    catalog TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    source_key TEXT NOT NULL,
+    {", ".join(RECORD_FIELDS)},
+    layout TEXT NOT NULL,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS images_catalog_source ON images (catalog, source_key);
+CREATE INDEX IF NOT EXISTS images_source ON images (source);
+CREATE INDEX IF NOT EXISTS images_date_modified ON images (date_modified);
+CREATE INDEX IF NOT EXISTS images_timestamp ON images (timestamp);
+"""
+
+
+def is_sqlite_catalog(file_path):
+    return os.path.splitext(file_path)[1].lower() in SQLITE_EXTENSIONS
+
+
+def is_column_value(value):
+    # whether a value reads back from a column unchanged; SQLite stores True as 1
+    if type(value) is int:
+        return -2 ** 63 <= value < 2 ** 63
+    return value is None or type(value) in (str, float)
+
+
+class SqliteCatalogStore:
+    # Catalog storage with one row per image. Saving an edited record is a single-row UPDATE
+    # instead of rewriting the whole catalog. A database can hold any number of catalogs
+    # (detail_2015, detail_2016, ...). The layout column keeps the key order of each record,
+    # so records read back exactly as they were imported.
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self, model=None):
+        self.connection.close()
+
+    def row_values(self, catalog, position, record):
+        values = [catalog, position, normalize_source(record["source"])]
+        extra = {}
+        for key, value in record.items():
+            if key not in RECORD_FIELDS or not is_column_value(value):
+                extra[key] = value
+        values.extend(None if field in extra else record.get(field) for field in RECORD_FIELDS)
+        values.append(json.dumps(list(record)))
+        values.append(json.dumps(extra) if extra else None)
+        return values
+
+    def row_record(self, row):
+        # row is (layout, extra, *RECORD_FIELDS)
+        values = dict(zip(RECORD_FIELDS, row[2:]))
+        if row[1]:
+            values.update(json.loads(row[1]))
+        return {key: values.get(key) for key in json.loads(row[0])}
+
+    def catalog_names(self):
+        rows = self.connection.execute("SELECT DISTINCT catalog FROM images ORDER BY catalog")
+        return [row[0] for row in rows]
+
+    def records(self, catalog):
+        rows = self.connection.execute(
+            f"SELECT layout, extra, {', '.join(RECORD_FIELDS)} FROM images WHERE catalog = ? ORDER BY position",
+            (catalog,))
+        return [self.row_record(row) for row in rows]
+
+    def load(self):
+        # the whole database in the JSON catalog layout: {catalog name: [records]}
+        return {catalog: self.records(catalog) for catalog in self.catalog_names()}
+
+    def source_keys(self, catalog):
+        rows = self.connection.execute("SELECT source_key FROM images WHERE catalog = ?", (catalog,))
+        return {row[0] for row in rows}
+
+    def add_records(self, catalog, records):
+        # append records whose source is not in the catalog yet; returns the number added
+        with self.connection:
+            position = self.connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM images WHERE catalog = ?", (catalog,)).fetchone()[0]
+            added = 0
+            for record in records:
+                cursor = self.connection.execute(
+                    f"INSERT OR IGNORE INTO images (catalog, position, source_key, {', '.join(RECORD_FIELDS)}, layout, extra) "
+                    f"VALUES ({', '.join('?' * (len(RECORD_FIELDS) + 5))})",
+                    self.row_values(catalog, position, record))
+                if cursor.rowcount:
+                    position += 1
+                    added += 1
+        return added
+
+    def replace_catalog(self, catalog, records):
+        with self.connection:
+            self.connection.execute("DELETE FROM images WHERE catalog = ?", (catalog,))
+        return self.add_records(catalog, records)
+
+    def update_record(self, catalog, record):
+        values = self.row_values(catalog, 0, record)
+        assignments = ", ".join(f"{field} = ?" for field in RECORD_FIELDS)
+        with self.connection:
+            cursor = self.connection.execute(
+                f"UPDATE images SET {assignments}, layout = ?, extra = ? WHERE catalog = ? AND source_key = ?",
+                values[3:] + [catalog, values[2]])
+        return cursor.rowcount > 0
+
+    def delete_record(self, catalog, source):
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM images WHERE catalog = ? AND source_key = ?", (catalog, normalize_source(source)))
+        return cursor.rowcount > 0
+
+    def import_json(self, json_file_path):
+        # every catalog list in the file replaces the catalog of the same name; returns {catalog: records}.
+        # The file is streamed with its journal applied, so edits not compacted yet are imported too.
+        return {catalog: self.replace_catalog(catalog, records) for catalog, records in iter_catalogs(json_file_path)}
+
+    def export_json(self, json_file_path, catalogs=None):
+        json_data = {catalog: self.records(catalog) for catalog in (catalogs or self.catalog_names())}
+        write_json_catalog(json_file_path, json_data, indent=4, ensure_ascii=False)
+        return {catalog: len(records) for catalog, records in json_data.items()}
+
+    # CatalogModel storage interface
+
+    def record_updated(self, model, parent_key, record):
+        self.update_record(parent_key, record)
+
+    def record_removed(self, model, parent_key, source):
+        self.delete_record(parent_key, source)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import JSON catalogs into a SQLite catalog, or export them back to JSON.')
+    parser.add_argument('command', choices=['import', 'export'], help='import JSON files, or export a catalog to JSON.')
+    parser.add_argument('--sqlite_file', required=True, help='Path to the SQLite catalog file.')
+    parser.add_argument('--json_file', required=True, nargs='+', help='JSON catalog file(s) to import, or the JSON file to export to.')
+    parser.add_argument('--catalog_name', nargs='*', help='Catalogs to export, e.g. detail_2023. Default: all.')
+    args = parser.parse_args()
+
+    store = SqliteCatalogStore(args.sqlite_file)
+    if args.command == 'import':
+        for json_file_path in args.json_file:
+            for catalog, count in store.import_json(json_file_path).items():
+                print(f"Imported {count} records into {catalog} from {json_file_path}")
+    else:
+        for catalog, count in store.export_json(args.json_file[0], args.catalog_name).items():
+            print(f"Exported {count} records from {catalog} to {args.json_file[0]}")
+    store.close()
@@ -0,0 +1,221 @@
+import os
+import re
+import json
+from catalog_journal import CatalogJournal, journal_path_for
+from image_record import ImageRecord, record_to_json
+import profiling
+
+# Characters read from the catalog file at a time. Larger reads leave megabytes of freed buffers
+# in the process after a load.
+CHUNK_SIZE = 256 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def is_catalog_value(value):
+    # top-level values other than record lists (device_id and the like) are passed around decoded;
+    # record lists as iterables of records
+    return value is None or isinstance(value, (dict, str, int, float, bool))
+
+
+class CatalogStreamReader:
+    # Incremental reader for the {"detail_X": [ {...}, {...} ], ...} catalog layout.
+    # Only the current chunk and the record being decoded are held in memory.
+
+    def __init__(self, catalog_file):
+        self.catalog_file = catalog_file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # read the next chunk, keeping the unread part of the buffer
+        chunk = self.catalog_file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non-whitespace character
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of catalog file")
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(f"Expected '{character}' at catalog position {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the value continues in the next chunk
+                if not self.fill():
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and self.fill():
+                # a number may continue in the next chunk, decode it again
+                continue
+            self.pos = end
+            return value
+
+    def records(self):
+        # the records of the list that starts at the current position
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def catalogs(self, include_values=False):
+        # (catalog name, record iterator) for every list in the file, in file order;
+        # each record iterator must be used before moving on to the next catalog.
+        # With include_values, other top-level keys are included as (key, decoded value).
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            name = self.value()
+            self.expect(":")
+            if self.peek() == "[":
+                records = self.records()
+                yield name, records
+                # skip what the caller did not read
+                for _ in records:
+                    pass
+            else:
+                value = self.value()
+                if include_values:
+                    yield name, value
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+
+def iter_catalogs(catalog_file_path, apply_journal=True, include_values=False):
+    # (catalog name, record iterator) pairs read incrementally, with pending journal edits applied;
+    # include_values adds the other top-level keys, see CatalogStreamReader.catalogs
+    journal_edits = CatalogJournal(catalog_file_path).pending() if apply_journal else None
+
+    with open(catalog_file_path, encoding='utf-8') as catalog_file:
+        for name, records in CatalogStreamReader(catalog_file).catalogs(include_values):
+            if journal_edits and not is_catalog_value(records):
+                records = journal_edits.apply(name, records)
+            yield name, records
+
+
+def load_catalog_records(catalog_file_path):
+    # the whole catalog, as json.load would return it with the journal applied, but with every record
+    # an ImageRecord as soon as it is parsed; neither the file text nor a list of record dictionaries
+    # is ever held, which keeps the process from growing to several times the final catalog size.
+    # The intern table lives for this load only.
+    interned = {}
+    return {name: value if is_catalog_value(value) else [ImageRecord.from_dict(record, interned) for record in value]
+            for name, value in iter_catalogs(catalog_file_path, include_values=True)}
+
+
+def iter_catalog_records(catalog_file_path, catalog_name=None, apply_journal=True):
+    # (catalog name, record) for every record, or only those of catalog_name
+    for name, records in iter_catalogs(catalog_file_path, apply_journal):
+        if catalog_name is None or name == catalog_name:
+            for record in records:
+                yield name, record
+
+
+def iter_catalog_sources(catalog_file_path):
+    # image paths for the Picture Deck or thumbnail generation, without loading the catalog
+    for _, record in iter_catalog_records(catalog_file_path):
+        source = record.get("source")
+        if source:
+            yield source
+
+
+def write_catalog_stream(catalog_file_path, catalogs, indent=4, ensure_ascii=True):
+    # Write (catalog name, records iterable) pairs in the same layout as json.dump(..., indent=indent),
+    # one record at a time, to a temporary file that then replaces the catalog. Pairs whose value is
+    # not a record list (is_catalog_value) are written as they are. The journal is dropped, since its
+    # edits were applied while reading.
+    padding = "\n" + " " * indent
+    record_padding = padding + " " * indent
+    temp_file_path = f"{catalog_file_path}.{os.getpid()}.tmp"
+    with profiling.span("write_catalog_stream", file=os.path.basename(catalog_file_path)), \
+            open(temp_file_path, "w", encoding="utf-8") as catalog_file:
+        catalog_file.write("{")
+        catalog_count = 0
+        for name, records in catalogs:
+            catalog_file.write(("," if catalog_count else "") + padding + json.dumps(name, ensure_ascii=ensure_ascii) + ": ")
+            catalog_count += 1
+            if is_catalog_value(records):
+                text = json.dumps(records, indent=indent, ensure_ascii=ensure_ascii)
+                catalog_file.write(text.replace("\n", padding))
+                continue
+            catalog_file.write("[")
+            record_count = 0
+            for record in records:
+                text = json.dumps(record, indent=indent, ensure_ascii=ensure_ascii, default=record_to_json)
+                catalog_file.write(("," if record_count else "") + record_padding + text.replace("\n", record_padding))
+                record_count += 1
+            catalog_file.write((padding if record_count else "") + "]")
+            profiling.count("records_written", record_count)
+        catalog_file.write(("\n" if catalog_count else "") + "}")
+        catalog_file.flush()
+        os.fsync(catalog_file.fileno())
+    os.replace(temp_file_path, catalog_file_path)
+
+    journal_file_path = journal_path_for(catalog_file_path)
+    if os.path.exists(journal_file_path):
+        os.remove(journal_file_path)
+
+
+def append_catalog_records(catalog_file_path, catalog_name, new_records, indent=4):
+    # append records to one catalog of a JSON catalog file by streaming the old file into the new one;
+    # the other catalogs and top-level keys are copied unchanged
+    def catalogs():
+        found = False
+        if os.path.exists(catalog_file_path):
+            for name, records in iter_catalogs(catalog_file_path, include_values=True):
+                if name == catalog_name and not is_catalog_value(records):
+                    found = True
+                    yield name, chain_records(records, new_records)
+                else:
+                    yield name, records
+        if not found:
+            yield catalog_name, new_records
+
+    write_catalog_stream(catalog_file_path, catalogs(), indent)
+
+
+def compact_catalog(catalog_file_path):
+    # Apply the journal to the catalog file: the file on disk is streamed through its pending edits
+    # and written back with each record list sorted by edit timestamp, most recent first, as saves
+    # always did. Records added to the file while it was open (an update run by catalog_cli) are kept.
+    def catalogs():
+        for name, records in iter_catalogs(catalog_file_path, include_values=True):
+            if not is_catalog_value(records):
+                records = sorted(records, key=lambda x: x.get('timestamp', 0), reverse=True)
+            yield name, records
+
+    write_catalog_stream(catalog_file_path, catalogs(), ensure_ascii=False)
+
+
+def chain_records(*record_iterables):
+    for records in record_iterables:
+        yield from records
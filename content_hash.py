@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from image_scanner import default_worker_count
+import profiling
+
+# Bump when the layout of the hash cache file changes
+HASH_CACHE_VERSION = 1
+
+# The partial hash covers the first and the last PARTIAL_HASH_BYTES of a file
+PARTIAL_HASH_BYTES = 64 * 1024
+
+READ_BYTES = 1024 * 1024
+
+
+def hash_cache_path_for(catalog_dir):
+    # one cache per catalog directory, shared by all of its catalogs
+    return os.path.join(catalog_dir or ".", "content_hashes.json")
+
+
+def partial_hash(file_path, size):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as image_file:
+        digest.update(image_file.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES:
+            image_file.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+            digest.update(image_file.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(file_path, size=None):
+    # hashlib releases the GIL on large updates, so several files hash in parallel on threads
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as image_file:
+        while True:
+            data = image_file.read(READ_BYTES)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+HASH_FUNCTIONS = {"partial": partial_hash, "full": full_hash}
+
+
+class HashCache:
+    # Partial and full content hashes from earlier runs, keyed by path. An entry is only used while
+    # the file's mtime and size are the ones it was hashed with.
+
+    def __init__(self, files=None):
+        self.files = files or {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cache_file_path):
+        # an unreadable cache is treated as empty
+        try:
+            with open(cache_file_path, encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return cls()
+        if data.get("version") != HASH_CACHE_VERSION:
+            return cls()
+        return cls(data.get("files", {}))
+
+    def get(self, image_file, kind):
+        entry = self.files.get(image_file.path)
+        with self.lock:
+            if entry is not None and entry[0] == image_file.mtime and entry[1] == image_file.size and entry[2].get(kind):
+                self.hits += 1
+                return entry[2][kind]
+            self.misses += 1
+        return None
+
+    def set(self, image_file, kind, value):
+        with self.lock:
+            entry = self.files.get(image_file.path)
+            if entry is None or entry[0] != image_file.mtime or entry[1] != image_file.size:
+                entry = self.files[image_file.path] = [image_file.mtime, image_file.size, {}]
+            entry[2][kind] = value
+
+    def save(self, cache_file_path):
+        temp_file_path = f"{cache_file_path}.{os.getpid()}.tmp"
+        with open(temp_file_path, "w", encoding='utf-8') as cache_file:
+            json.dump({"version": HASH_CACHE_VERSION, "files": self.files}, cache_file, separators=(",", ":"))
+        os.replace(temp_file_path, cache_file_path)
+
+
+def canonical_key(image_file):
+    # the copy kept by --canonical_only: the oldest file, then the shortest path
+    return image_file.mtime, len(image_file.path), image_file.path
+
+
+class DuplicateFinder:
+    # Finds files with identical content among ImageFile entries (path, size, mtime, ctime):
+    # files are grouped by size, same-size files by a hash of their first and last 64 KB, and only
+    # files that still collide are hashed in full. Hashing runs on a thread pool.
+
+    def __init__(self, hash_cache=None, max_workers=None):
+        self.hash_cache = hash_cache if hash_cache is not None else HashCache()
+        self.max_workers = max_workers or default_worker_count()
+        self.hashed = {"partial": 0, "full": 0}
+
+    def hashes(self, image_files, kind):
+        # {path: hash} of the given kind; unreadable files are left out
+        results = {}
+        missing = []
+        for image_file in image_files:
+            value = self.hash_cache.get(image_file, kind)
+            if value is None:
+                missing.append(image_file)
+            else:
+                results[image_file.path] = value
+
+        def compute(image_file):
+            try:
+                return image_file, HASH_FUNCTIONS[kind](image_file.path, image_file.size)
+            except OSError:
+                return image_file, None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for image_file, value in executor.map(compute, missing):
+                if value is not None:
+                    self.hash_cache.set(image_file, kind, value)
+                    results[image_file.path] = value
+                    self.hashed[kind] += 1
+        return results
+
+    def content_hashes(self, image_files):
+        # full hash of every file, for the content_hash field of the catalog records
+        return self.hashes(image_files, "full")
+
+    def find(self, image_files, full_hashes=None):
+        # lists of files with the same content, each sorted with the canonical copy first.
+        # full_hashes ({path: full hash} of every file, from content_hashes) replaces the partial pass.
+        by_size = defaultdict(list)
+        for image_file in image_files:
+            by_size[image_file.size].append(image_file)
+        candidates = [image_file for group in by_size.values() if len(group) > 1 for image_file in group]
+
+        if full_hashes is None:
+            partial_hashes = self.hashes(candidates, "partial")
+            by_partial = defaultdict(list)
+            for image_file in candidates:
+                if image_file.path in partial_hashes:
+                    by_partial[(image_file.size, partial_hashes[image_file.path])].append(image_file)
+            candidates = [image_file for group in by_partial.values() if len(group) > 1 for image_file in group]
+            full_hashes = self.hashes(candidates, "full")
+
+        by_content = defaultdict(list)
+        for image_file in candidates:
+            if image_file.path in full_hashes:
+                by_content[full_hashes[image_file.path]].append(image_file)
+
+        return [(content_hash, sorted(group, key=canonical_key))
+                for content_hash, group in by_content.items() if len(group) > 1]
+
+
+def duplicate_paths(duplicate_groups):
+    # paths of every copy that is not the canonical one
+    return {image_file.path for _, group in duplicate_groups for image_file in group[1:]}
+
+
+def duplicates_report(duplicate_groups):
+    groups = [{
+        "content_hash": content_hash,
+        "size": group[0].size,
+        "canonical": group[0].path,
+        "duplicates": [image_file.path for image_file in group[1:]],
+    } for content_hash, group in sorted(duplicate_groups, key=lambda item: item[1][0].path)]
+    return {
+        "groups": len(groups),
+        "duplicate_files": sum(len(group["duplicates"]) for group in groups),
+        "duplicate_bytes": sum(group["size"] * len(group["duplicates"]) for group in groups),
+        "duplicates": groups,
+    }
+
+
+def write_duplicates_report(duplicate_groups, report_file_path):
+    report = duplicates_report(duplicate_groups)
+    with open(report_file_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=4)
+    return report
+
+
+@profiling.traced("deduplicate")
+def deduplicate_image_files(image_files, hash_cache_file_path, content_hash=False, duplicates_file=None,
+                            canonical_only=False):
+    # Shared by the catalog scripts. Returns the image files to catalog (only the canonical copies
+    # with canonical_only) and {path: content hash} when content_hash is set.
+    hash_cache = HashCache.load(hash_cache_file_path)
+    duplicate_finder = DuplicateFinder(hash_cache)
+
+    content_hashes = duplicate_finder.content_hashes(image_files) if content_hash else {}
+
+    if duplicates_file or canonical_only:
+        duplicate_groups = duplicate_finder.find(image_files, content_hashes if content_hash else None)
+        skipped = duplicate_paths(duplicate_groups)
+        print(f"Duplicate groups: {len(duplicate_groups)}, duplicate copies: {len(skipped)}")
+        if duplicates_file:
+            write_duplicates_report(duplicate_groups, duplicates_file)
+            print("duplicates_file=", duplicates_file)
+        if canonical_only:
+            image_files = [image_file for image_file in image_files if image_file.path not in skipped]
+
+    hash_cache.save(hash_cache_file_path)
+    print(f"Files hashed: {duplicate_finder.hashed['partial']} partial, {duplicate_finder.hashed['full']} full; "
+          f"reused from cache: {hash_cache.hits}")
+    return image_files, content_hashes
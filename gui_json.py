@@ -1,29 +1,88 @@
 import os
 import json
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import subprocess
 import argparse
 import shutil
 import time
+import threading
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from thumbnail_cache import ThumbnailCache
+from preview_loader import load_preview
+from catalog_model import CatalogModel
+from catalog_sqlite import is_sqlite_catalog
+from catalog_merge import normalize_source
+import profiling
+
+# Pillow, numpy and the catalog update code are imported where they are first used, so opening a
+# catalog only loads tkinter and the catalog model.
 
-# Create the argument parser
-parser = argparse.ArgumentParser(
-    description='Search for images within a date range and write metadata to a JSON file.')
-parser.add_argument('--file_path', required=True,
-                    help='Path to the directory to search for image files.')
+# Get the directory of the current script
+script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Maximum number of child nodes shown below a catalog or page node in the Treeview
+RECORDS_PER_NODE = 100
+
+# How often the main window checks a background catalog update for progress, in milliseconds
+UPDATE_POLL_MS = 100
+
+# Status bar text for the phases reported by update_catalog
+UPDATE_PHASES = {
+    "scan": "Scanning",
+    "metadata": "Reading image metadata",
+    "hashes": "Hashing files",
+    "phash": "Computing perceptual hashes",
+    "records": "Building records",
+    "merge": "Merging",
+    "write": "Writing catalog",
+}
+
+
+class CatalogUpdateJob:
+    # Runs update_catalog on a background thread. Progress and the outcome are handed to the Tk thread
+    # through a queue, which JsonEditor.poll_update drains from the event loop.
+
+    def __init__(self, catalog_file_path, **options):
+        self.catalog_file_path = catalog_file_path
+        self.options = options
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        # takes effect at the next progress report, before anything is written
+        self.cancel_event.set()
+
+    def progress(self, phase, done, total):
+        from update_json_by_year import UpdateCancelled
+        if self.cancel_event.is_set():
+            raise UpdateCancelled()
+        self.events.put(("progress", phase, done, total))
+
+    def run(self):
+        from update_json_by_year import update_catalog, UpdateCancelled
+        try:
+            merge_stats = update_catalog(self.catalog_file_path, progress=self.progress, **self.options)
+        except UpdateCancelled:
+            self.events.put(("cancelled", None))
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        else:
+            self.events.put(("done", merge_stats))
 
-# Parse the arguments
-args = parser.parse_args()
 
-file_path = args.file_path
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
 
 
-# Get the directory of the current script
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
 class JsonEditor:
 
     def __init__(self, master, file_path):
@@ -40,6 +99,21 @@ class JsonEditor:
         self.current_page = 0
         self.photo_images = []
 
+        # persistent Picture Deck thumbnails, keyed by path + mtime + size
+        self.thumbnail_cache = ThumbnailCache()
+
+        # thumbnails are decoded on a worker pool and handed back to the Tk thread through a queue,
+        # which poll_thumbnails drains from the event loop
+        self.thumbnail_executor = ThreadPoolExecutor(max_workers=4)
+        self.thumbnail_queue = queue.Queue()
+        self.thumbnails_pending = 0
+        self.thumbnail_poll_scheduled = False
+        # decoded thumbnails of the recent and prefetched pages, least recently used first
+        self.thumbnail_images = OrderedDict()
+        # bumped on every page draw so results for a page no longer shown are dropped
+        self.grid_generation = 0
+        self.placeholder_photo = None
+
         # Initialize the image_widgets list
         self.image_widgets = []
 
@@ -65,14 +139,22 @@ class JsonEditor:
         self.scrollbar.pack(side="right", fill="y")
         self.tree.configure(yscrollcommand=self.scrollbar.set)
 
-        # read JSON file and populate TreeView
-        with open(self.file_path, encoding='utf-8') as f:
-            self.json_data = json.load(f)
+        # status bar for a catalog update running in the background, shown only while one runs
+        self.update_job = None
+        self.update_phase = None
+        self.status_frame = tk.Frame(self.master)
+        self.status_label = tk.Label(self.status_frame, anchor="w")
+        self.status_label.pack(side="left", fill="x", expand=True, padx=5)
+        self.cancel_update_button = tk.Button(
+            self.status_frame, text="Cancel", command=self.cancel_update)
+        self.cancel_update_button.pack(side="right", padx=5, pady=2)
+        self.update_progress_bar = ttk.Progressbar(self.status_frame, length=200)
+        self.update_progress_bar.pack(side="right", padx=5)
+
+        # read JSON file into the catalog model and populate TreeView
+        self.model = CatalogModel.open(self.file_path)
         self.populate_tree(self.json_data, "")
 
-        self.image_path_data = self.extract_image_paths_from_json(
-            self.json_data)
-
         # Create the image grid window instance
         # self.create_image_grid_window(image_path_data, self.json_data)
 
@@ -90,7 +172,7 @@ class JsonEditor:
         self.file_menu.add_command(
             label="Update Existing Catalog", command=self.update_existing_catalog)
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Exit", command=self.master.quit)
+        self.file_menu.add_command(label="Exit", command=self.exit_app)
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
 
         # create view menu
@@ -100,29 +182,34 @@ class JsonEditor:
             label="Sort by Date", command=self.sort_by_date)  # New menu item
         self.view_menu.add_command(
             label="Picture Deck", command=lambda: self.show_image_grid(self.image_path_data))
+        self.view_menu.add_command(
+            label="Generate Thumbnails", command=self.generate_thumbnails)
 
         self.menu_bar.add_cascade(label="View", menu=self.view_menu)
 
+        # compact the catalog's edit journal when the main window is closed
+        self.master.protocol("WM_DELETE_WINDOW", self.exit_app)
+
+        # insert the rows of a record or page of records when it is expanded
+        self.tree.bind("<<TreeviewOpen>>", self.expand_tree_node)
+
         # bind double-click event to Treeview object
         self.tree.bind("<ButtonRelease-1>", lambda event: self.click_handler(event,
                        self.tree.item(self.tree.focus())))
 
         # print("image_path_data=", self.image_path_data)
 
-    # extract file paths from json for picture deck
+    # the catalog data and the Picture Deck path list are kept by the catalog model
 
-    def extract_image_paths_from_json(self, json_data):
-        image_path_data = []
-        for _, image_list in json_data.items():
-            for image_info in image_list:
-                source = image_info.get("source")
-                if source:
-                    image_path_data.append(source)
-        return (image_path_data)
+    @property
+    def json_data(self):
+        return self.model.json_data
 
-    def show_full_image(self, image_path):
-        full_image = Image.open(image_path)
+    @property
+    def image_path_data(self):
+        return self.model.paths
 
+    def show_full_image(self, image_path):
         # Get the screen width and height
         screen_width = self.master.winfo_screenwidth()
         screen_height = self.master.winfo_screenheight()
@@ -131,13 +218,14 @@ class JsonEditor:
         window_width = screen_width // 2
         window_height = screen_height // 2
 
-        # Resize the image to fit the window
-        full_image.thumbnail((window_width, window_height))
+        # Decode the image already scaled to fit the window
+        full_image = load_preview(image_path, (window_width, window_height))
 
         # Create a new window to display the full-size image
         full_image_window = tk.Toplevel(self.master)
         full_image_window.title(image_path)
 
+        from PIL import ImageTk
         full_photo = ImageTk.PhotoImage(full_image)
         full_label = tk.Label(full_image_window, image=full_photo)
         full_label.image = full_photo
@@ -157,26 +245,58 @@ class JsonEditor:
             button_frame, text="Properties", command=lambda path=image_path: self.show_image_properties(path))
         properties_button.pack(side=tk.RIGHT, padx=10)
 
+        # Create a "Near-duplicates" button listing resized or re-encoded copies of the image
+        near_duplicates_button = tk.Button(
+            button_frame, text="Near-duplicates", command=lambda path=image_path: self.show_near_duplicates(path))
+        near_duplicates_button.pack(side=tk.RIGHT, padx=10)
+
         # Close the full-size image window when it's double-clicked
         full_label.bind("<Double-Button-1>",
                         lambda e: full_image_window.destroy())
 
+    def show_near_duplicates(self, image_path):
+        # records are matched by their phash field (catalog scripts with --phash);
+        # an image without one is hashed here
+        _, record = self.model.find(image_path)
+        phash = record.get("phash") if record else None
+        from perceptual_hash import dhash_or_none, NEAR_DUPLICATE_DISTANCE
+        if not phash:
+            phash = dhash_or_none(image_path)
+        if not phash:
+            messagebox.showerror("Near-duplicates", "The image could not be read.")
+            return
+
+        matches = [(distance, source) for distance, source in self.model.near_duplicates(phash, NEAR_DUPLICATE_DISTANCE)
+                   if normalize_source(source) != normalize_source(image_path)]
+        if not matches:
+            messagebox.showinfo(
+                "Near-duplicates", "No near-duplicates found. Catalogs created or updated with --phash can be searched.")
+            return
+
+        window = tk.Toplevel(self.master)
+        window.title(f"Near-duplicates of {image_path}")
+        scrollbar = tk.Scrollbar(window)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox = tk.Listbox(window, width=100, height=min(len(matches), 20), yscrollcommand=scrollbar.set)
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=listbox.yview)
+        for distance, source in matches:
+            listbox.insert(tk.END, f"{distance:2d}  {source}")
+
+        # double-click a match to open it
+        listbox.bind("<Double-Button-1>", lambda e: listbox.curselection() and self.show_full_image(
+            matches[listbox.curselection()[0]][1]))
+
     def show_image_properties(self, image_path):
         # Find the image_info dictionary with the matching "source" key
 
         self.record_status = None
-        image_info = None
-
-        for _, image_list in self.json_data.items():
-            for info in image_list:
-                if info.get("source") == image_path:
-                    image_info = info
-                    break
+        parent_key, image_info = self.model.find(image_path)
 
         # Replace "if image_info:" with this code
         if image_info:
             # Convert the image_info to a JSON string
-            input_json = json.dumps(image_info, indent=4)
+            input_json = json.dumps(image_info.to_dict(), indent=4)
 
             # Call the input_dialog function to display image properties
             j = self.input_dialog(image_path, input_json)
@@ -184,11 +304,7 @@ class JsonEditor:
             if self.record_status == "cancelled":
                 return
 
-            if j:
-                parent_key = next(iter(self.json_data))
-
-                self.update_json_file(
-                    parent_key, j)
+            if j and self.update_json_file(parent_key, j):
                 messagebox.showinfo(
                     "Image Properties", "Image data updated")
 
@@ -196,31 +312,45 @@ class JsonEditor:
             tk.messagebox.showerror(
                 "Image Not Found", "Image properties not found in JSON data.")
 
+    @profiling.traced("create_image_grid")
     def create_image_grid(self, image_path_data, frame, current_page=0):
 
         num_cols = 5
         start_idx = current_page * 25
         end_idx = start_idx + 25
 
+        self.grid_generation += 1
+        if self.placeholder_photo is None:
+            self.placeholder_photo = tk.PhotoImage(width=100, height=100)
+
+        # lay out placeholders right away; each cell is filled in when its thumbnail is decoded
         for idx, image_path in enumerate(image_path_data[start_idx:end_idx]):
-            if os.path.exists(image_path):
-                image = Image.open(image_path)
-                image.thumbnail((100, 100))
-                photo = ImageTk.PhotoImage(image)
+            label = tk.Label(frame, image=self.placeholder_photo, relief="groove")
+            label.grid(row=idx // num_cols, column=idx %
+                       num_cols, padx=5, pady=5)
+
+            label.bind("<Enter>", lambda e,
+                       name=image_path: self.show_tooltip(name))
+            label.bind("<Leave>", self.hide_tooltip)
 
-                label = tk.Label(frame, image=photo)
-                label.image = photo
-                label.grid(row=idx // num_cols, column=idx %
-                           num_cols, padx=5, pady=5)
+            label.bind("<Double-Button-1>", lambda e,
+                       path=image_path: self.show_full_image(path))
 
-                label.bind("<Enter>", lambda e,
-                           name=image_path: self.show_tooltip(name))
-                label.bind("<Leave>", self.hide_tooltip)
+            self.image_widgets.append(label)
 
-                label.bind("<Double-Button-1>", lambda e,
-                           path=image_path: self.show_full_image(path))
+            image = self.thumbnail_images.get(image_path)
+            if image is not None:
+                self.thumbnail_images.move_to_end(image_path)
+                self.show_thumbnail(label, image)
+            else:
+                self.request_thumbnail(image_path, label)
 
-                self.image_widgets.append(label)
+        # warm the previous and next pages in the background
+        for page in (current_page + 1, current_page - 1):
+            if page >= 0:
+                for image_path in image_path_data[page * 25:page * 25 + 25]:
+                    if image_path not in self.thumbnail_images:
+                        self.request_thumbnail(image_path)
 
         button_frame = tk.Frame(frame)
         button_frame.grid(row=idx // num_cols + 1,
@@ -242,6 +372,74 @@ class JsonEditor:
             button_frame, text=">>|", command=self.show_last_25)
         last_25_button.pack(side=tk.LEFT, padx=10)
 
+    def request_thumbnail(self, image_path, label=None):
+        # decode a thumbnail on the worker pool; label is None for prefetched images
+        generation = self.grid_generation
+
+        def load_thumbnail():
+            # every request is answered, or poll_thumbnails would wait for it forever
+            image = None
+            try:
+                with profiling.span("load_thumbnail"):
+                    image = self.thumbnail_cache.get(image_path)
+            except Exception:
+                # Pillow raises more than OSError for corrupt files (SyntaxError, struct.error, EOFError, ...)
+                pass
+            finally:
+                self.thumbnail_queue.put((generation, image_path, label, image))
+
+        self.thumbnails_pending += 1
+        self.thumbnail_executor.submit(load_thumbnail)
+        self.schedule_thumbnail_poll()
+
+    def schedule_thumbnail_poll(self):
+        if not self.thumbnail_poll_scheduled:
+            self.thumbnail_poll_scheduled = True
+            self.master.after(20, self.poll_thumbnails)
+
+    def poll_thumbnails(self):
+        # runs on the Tk thread: paint every thumbnail decoded since the last poll
+        self.thumbnail_poll_scheduled = False
+        while True:
+            try:
+                generation, image_path, label, image = self.thumbnail_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.thumbnails_pending -= 1
+
+            if image is not None:
+                self.thumbnail_images[image_path] = image
+                self.thumbnail_images.move_to_end(image_path)
+                while len(self.thumbnail_images) > 100:
+                    self.thumbnail_images.popitem(last=False)
+
+            if label is None or generation != self.grid_generation or not label.winfo_exists():
+                continue
+            if image is None:
+                # missing or unreadable image, leave the cell empty
+                label.destroy()
+            else:
+                self.show_thumbnail(label, image)
+
+        if self.thumbnails_pending > 0:
+            self.schedule_thumbnail_poll()
+
+    def show_thumbnail(self, label, image):
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(image)
+        label.configure(image=photo, relief="flat")
+        label.image = photo
+
+    def generate_thumbnails(self):
+        # create the missing Picture Deck thumbnails in the background
+        image_paths = list(self.image_path_data)
+
+        def pregenerate():
+            generated, failed = self.thumbnail_cache.pregenerate(image_paths)
+            print(f"Thumbnails ready: {generated}, failed: {failed}")
+
+        threading.Thread(target=pregenerate, daemon=True).start()
+
     def show_image_grid(self, image_path_data):
         self.image_grid_window = tk.Toplevel(self.master)
         self.image_grid_window.title("Image Grid")
@@ -306,19 +504,25 @@ class JsonEditor:
 
     def open_file(self):
         file_path = filedialog.askopenfilename(
-            defaultextension=".json", filetypes=[("JSON Files", "*.json")])
+            defaultextension=".json", filetypes=[("JSON Files", "*.json"), ("SQLite Catalogs", "*.db *.sqlite *.sqlite3")])
         if file_path:
+            self.model.close()
             self.file_path = file_path
             self.tree.delete(*self.tree.get_children())
-            with open(self.file_path, encoding='utf-8') as f:
-                self.json_data = json.load(f)
+            self.model = CatalogModel.open(self.file_path)
             self.populate_tree(self.json_data, "")
 
+    def exit_app(self):
+        if self.update_job is not None:
+            self.update_job.cancel()
+        self.model.close()
+        self.master.quit()
+
     def run_image_analytics(self):
         # Construct the relative file path
         self.master.title("Image Cataloger - running image analytics...")
         script_path = os.path.join(script_dir, "image_analytics.py")
-        subprocess.Popen(["python", script_path])
+        subprocess.Popen(["python", script_path, "--show_dialog"])
         self.master.title("Image Cataloger")
 
     def create_new_catalog(self):
@@ -366,61 +570,191 @@ class JsonEditor:
 
     def update_existing_catalog(self):
         file_path = filedialog.askopenfilename(
-            defaultextension=".json", filetypes=[("JSON Files", "*.json")])
+            defaultextension=".json", filetypes=[("JSON Files", "*.json"), ("SQLite Catalogs", "*.db *.sqlite *.sqlite3")])
         default_search_path = os.path.expanduser("~")
         default_ignore_file = os.path.join(script_dir, "ignore_this.txt")
         print("file_path=", file_path)
         print("default_ignore_file=", default_ignore_file)
 
         if file_path:
+            if self.update_job is not None:
+                messagebox.showinfo("Update Existing Catalog",
+                                    f"An update of {self.update_job.catalog_file_path} is still running.")
+                return
+
+            # a SQLite catalog file holds several catalogs; ask which one to update
+            catalog_name = None
+            if is_sqlite_catalog(file_path):
+                catalog_name = simpledialog.askstring(
+                    "Update Existing Catalog", "Catalog name (e.g. detail_2023):", parent=self.master)
+                if not catalog_name:
+                    return
+
             # Update the status message
-            # messagebox.showinfo("Updating Catalog", "Refreshing catalog, with new items")
             self.master.title(
                 "Image Cataloger - updating existing image catalog...")
 
-            # Run the subprocess
-            script_path = os.path.join(script_dir, "update_json_by_year.py")
-            subprocess.run(["python", script_path, "--catalog_file_path", file_path,
-                           "--search_path", default_search_path, "--ignore_file", default_ignore_file])
-
-            # Display the message box
-            messagebox.showinfo("Catalog Updated",
-                                f"Image catalog refreshed\nFile: {file_path}")
-            self.master.title("Image Cataloger")
+            # the scan and merge run in this process on a worker thread, so the window stays responsive
+            from ignore_matcher import read_ignore_list
+            self.update_job = CatalogUpdateJob(
+                file_path, search_path=default_search_path, ignore_list=read_ignore_list(default_ignore_file),
+                catalog_name=catalog_name)
+            self.update_phase = None
+            self.update_progress_bar.config(mode="indeterminate", value=0)
+            self.status_label.config(text="Starting catalog update...")
+            self.cancel_update_button.config(state="normal")
+            self.status_frame.pack(side="bottom", fill="x", before=self.tree)
+            self.update_job.start()
+            self.master.after(UPDATE_POLL_MS, self.poll_update)
         else:
             # Update the status message if no file was selected
             self.status_label.config(text="No file selected.")
 
-    def populate_tree(self, node, parent):
-        if isinstance(node, dict):
+    def is_open_catalog(self, catalog_file_path):
+        return os.path.normcase(os.path.abspath(catalog_file_path)) == os.path.normcase(os.path.abspath(self.file_path))
+
+    def updating_open_catalog(self):
+        # the update rewrites the catalog file and drops its journal, so edits and trash operations
+        # wait until it has finished
+        return self.update_job is not None and self.is_open_catalog(self.update_job.catalog_file_path)
+
+    def cancel_update(self):
+        if self.update_job is not None:
+            self.update_job.cancel()
+            self.cancel_update_button.config(state="disabled")
+            self.status_label.config(text="Cancelling...")
+
+    def poll_update(self):
+        # runs on the Tk thread: show the latest progress of the background update, or its outcome
+        job = self.update_job
+        latest = None
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] != "progress":
+                self.finish_update(job, *event)
+                return
+            latest = event
+
+        if latest is not None and not job.cancel_event.is_set():
+            self.show_update_progress(*latest[1:])
+        self.master.after(UPDATE_POLL_MS, self.poll_update)
+
+    def show_update_progress(self, phase, done, total):
+        now = time.perf_counter()
+        if phase != self.update_phase:
+            # rate and ETA are measured per phase
+            self.update_phase = phase
+            self.update_phase_start = now
+            if total:
+                self.update_progress_bar.stop()
+                self.update_progress_bar.config(mode="determinate", maximum=total)
+            else:
+                self.update_progress_bar.config(mode="indeterminate")
+                self.update_progress_bar.start(20)
+
+        text = f"{UPDATE_PHASES.get(phase, phase)}: {done:,} files"
+        if total:
+            text += f" of {total:,}"
+            self.update_progress_bar.config(maximum=max(total, done), value=done)
+        elapsed = now - self.update_phase_start
+        if done and elapsed > 0:
+            rate = done / elapsed
+            text += f", {rate:,.0f} files/s"
+            if total and total > done:
+                text += f", ETA {format_duration((total - done) / rate)}"
+        self.status_label.config(text=text)
+
+    def finish_update(self, job, outcome, result):
+        self.update_job = None
+        self.update_progress_bar.stop()
+        self.status_frame.pack_forget()
+        self.master.title("Image Cataloger")
 
-            for key, value in node.items():
-                if isinstance(value, (dict, list)):
-                    item = self.tree.insert(parent, "end", text=key)
-                    self.populate_tree(value, item)
-                    self.image_path_data = self.extract_image_paths_from_json(
-                        self.json_data)
+        if outcome == "done":
+            # reload the open catalog when it is the one that was updated
+            if self.is_open_catalog(job.catalog_file_path):
+                self.refresh()
+            messagebox.showinfo("Catalog Updated",
+                                f"Image catalog refreshed\nFile: {job.catalog_file_path}\n"
+                                f"Added: {result['added']}, unchanged: {result['unchanged']}, "
+                                f"modified: {result['modified']}, vanished: {result['vanished']}")
+        elif outcome == "cancelled":
+            messagebox.showinfo("Update Cancelled",
+                                f"The catalog was not changed.\nFile: {job.catalog_file_path}")
+        else:
+            messagebox.showerror("Update Failed", f"{job.catalog_file_path}\n{result}")
 
-                else:
-                    item = self.tree.insert(
-                        parent, "end", text=key, values=(value,))
-                    if key in ['artist', 'title', 'media', 'category', 'description', 'year_of_work', 'for_sale', 'price']:
-                        # enable editing for the specified keys
-                        self.tree.item(item, tags=())
-        elif isinstance(node, list):
-            for i, item in enumerate(node):
-                if isinstance(item, (dict, list)):
-                    self.populate_tree(item, parent)
-                    # add space between records, except for the last record
-                    if i != len(node) - 1:
-                        self.tree.insert(parent, "end", text="")
-                    self.image_path_data = self.extract_image_paths_from_json(
-                        self.json_data)
-                else:
-                    self.tree.insert(parent, "end", text="", values=(item,))
-                    # add space between records, except for the last record
-                    if i != len(node) - 1:
-                        self.tree.insert(parent, "end", text="")
+    @profiling.traced("populate_tree")
+    def populate_tree(self, node, parent):
+        # Insert only one collapsed node per record (or per page of records for large catalogs);
+        # the key/value rows of a record are inserted when it is expanded, see expand_tree_node.
+        self.lazy_tree_nodes = {}
+        self.record_items = {}
+        self.catalog_items = {}
+
+        for key, value in node.items():
+            if isinstance(value, list):
+                item = self.tree.insert(parent, "end", text=key, open=True)
+                self.catalog_items[key] = item
+                self.insert_record_nodes(item, key, 0, len(value))
+            else:
+                self.tree.insert(parent, "end", text=key, values=(value,))
+
+    def insert_record_nodes(self, parent, parent_key, start, end):
+        # at most RECORDS_PER_NODE children per node: records, or pages of records when there are more
+        page_size = 1
+        while (end - start) > page_size * RECORDS_PER_NODE:
+            page_size *= RECORDS_PER_NODE
+
+        records = self.model.records(parent_key)
+        for page_start in range(start, end, page_size):
+            page_end = min(page_start + page_size, end)
+            if page_size == 1:
+                record = records[page_start]
+                item = self.tree.insert(parent, "end", text=str(
+                    page_start + 1), values=(record.get("source", ""),))
+                self.lazy_tree_nodes[item] = ("record", parent_key, record.get("source", ""))
+                self.record_items[item] = (parent_key, record.get("source", ""))
+            else:
+                item = self.tree.insert(
+                    parent, "end", text=f"Records {page_start + 1} - {page_end}")
+                self.lazy_tree_nodes[item] = ("page", parent_key, page_start, page_end)
+            # placeholder child so the node can be expanded
+            self.tree.insert(item, "end", text="")
+
+    def reload_catalog_node(self, parent_key):
+        # page nodes hold record positions, which shift when a record is trashed, so the record and
+        # page nodes of the catalog are inserted again
+        item = self.catalog_items.get(parent_key)
+        if item is None:
+            return
+        self.tree.delete(*self.tree.get_children(item))
+        self.lazy_tree_nodes = {node: lazy_node for node, lazy_node in self.lazy_tree_nodes.items()
+                                if self.tree.exists(node)}
+        self.record_items = {node: record_item for node, record_item in self.record_items.items()
+                             if self.tree.exists(node)}
+        self.insert_record_nodes(item, parent_key, 0, len(self.model.records(parent_key)))
+
+    def expand_tree_node(self, event):
+        item = self.tree.focus()
+        lazy_node = self.lazy_tree_nodes.pop(item, None)
+        if lazy_node is None:
+            return
+
+        # replace the placeholder with the real children
+        self.tree.delete(*self.tree.get_children(item))
+        if lazy_node[0] == "page":
+            _, parent_key, start, end = lazy_node
+            self.insert_record_nodes(item, parent_key, start, end)
+        else:
+            # records are looked up by source, so edits and trash since populate_tree do not shift them
+            _, parent_key, source = lazy_node
+            _, record = self.model.find(source)
+            for key, value in (record or {}).items():
+                self.tree.insert(item, "end", text=key, values=(value,))
 
     def build_dictionary(self, start_item_id, n):
         record = {}
@@ -456,16 +790,12 @@ class JsonEditor:
                     parent_key = self.get_parent_value(
                         start_item_id)  # catalog name also top of json
 
-                    # open the image
-                    image = Image.open(path)
-                    # resize the image to fit the window
-                    width, height = image.size
-                    new_width = min(width, 800)
-                    new_height = int(height * (new_width / width))
-                    image = image.resize((new_width, new_height))
+                    # open the image, decoded at no more than 800 pixels wide to fit the window
+                    image = load_preview(path, (800, None))
+                    from PIL import ImageTk
                     photo = ImageTk.PhotoImage(image)
                     # display the image in a label widget
-                    label = tk.Label(root, image=photo)
+                    label = tk.Label(self.master, image=photo)
                     # keep a reference to the photo to prevent it from being garbage collected
                     label.image = photo
                     label.pack()
@@ -482,8 +812,7 @@ class JsonEditor:
                     if self.record_status == "cancelled":
                         return
 
-                    if j:
-                        self.update_json_file(parent_key, j)
+                    if j and self.update_json_file(parent_key, j):
                         messagebox.showinfo(
                             "Image Properties", "Image data updated")
 
@@ -492,7 +821,12 @@ class JsonEditor:
                         "Image not found", "The image file does not exist.")
 
     def get_parent_value(self, start_item_id):
-        parent_item_value = self.tree.item(self.tree.parent(start_item_id))
+        # a field row sits below its record node, which knows the catalog name
+        record_item = self.tree.parent(start_item_id)
+        if record_item in self.record_items:
+            return self.record_items[record_item][0]
+
+        parent_item_value = self.tree.item(record_item)
         parent_key = parent_item_value['text']
 
         if parent_key:
@@ -502,6 +836,7 @@ class JsonEditor:
 
     # input_dialog
     def input_dialog(self, title, key_value):
+        from PIL import Image
         input_list = [(k, v) for k, v in json.loads(key_value).items()]
 
         # Create a tkinter window
@@ -575,6 +910,11 @@ class JsonEditor:
 
         # Define a function to move the selected file to the trash folder
         def move_to_trash():
+            # the record could not be removed from the catalog, so the file stays where it is
+            if self.updating_open_catalog():
+                messagebox.showwarning("Catalog Update Running",
+                                       "The catalog is being updated. Send the image to the trash when the update has finished.")
+                return
             get_input()
             catalog_dir = os.path.dirname(os.path.abspath(__file__))
             # Create the trash directory if it doesn't exist
@@ -610,7 +950,8 @@ class JsonEditor:
 
         # Create an "Edit" menu
         edit_menu = tk.Menu(menu_bar, tearoff=0)
-        edit_menu.add_command(label="Send to Trash", command=move_to_trash)
+        edit_menu.add_command(label="Send to Trash", command=move_to_trash,
+                              state="disabled" if self.updating_open_catalog() else "normal")
 
         # Create a "View" menu
         view_menu = tk.Menu(menu_bar, tearoff=0)
@@ -652,51 +993,37 @@ class JsonEditor:
         return input_values
 
     def update_json_file(self, parent_key, j):
+        # returns whether the record was saved
+
+        # the update rewrites the catalog file and drops its journal, so an edit saved now would be lost
+        if self.updating_open_catalog():
+            messagebox.showwarning("Catalog Update Running",
+                                   "The catalog is being updated. Save the record again when the update has finished.")
+            return False
 
         # Set the last_modified timestamp for the modified dictionary
         j['timestamp'] = int(time.time())
-        detail_list = self.json_data[parent_key]
 
         if self.record_status == "moved":
-            # Remove the item from the detail list if record_status is "moved"
-            detail_list = [
-                item for item in detail_list if item["source"] != j["source"]]
+            # Remove the item from the catalog if record_status is "moved"
+            self.model.trash_record(parent_key, j["source"])
+            self.reload_catalog_node(parent_key)
         else:
-            for i, item in enumerate(detail_list):
-                if os.path.normpath(str(item["source"])) == os.path.normpath(str(j["source"])):
-                    detail_list[i] = j
-                    break
-
-        self.json_data[parent_key] = detail_list
-
-        # sort list
-        sorted_json_data = self.timestamp_sort(self.json_data)
-
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(sorted_json_data, f, indent=4, ensure_ascii=False)
+            # JSON catalogs append the edit to their journal, SQLite catalogs update one row
+            self.model.update_record(parent_key, j)
 
         self.record_status = None
+        return True
 
     def refresh(self):
         self.tree.delete(*self.tree.get_children())
-        with open(self.file_path, encoding='utf-8') as f:
-            self.json_data = json.load(f)
-            self.populate_tree(self.json_data, "")
-
-    def timestamp_sort(self, json_data):
-
-        for parent_key, child_dict in json_data.items():
-            sorted_dicts = sorted(child_dict, key=lambda x: x.get(
-                'timestamp', 0), reverse=True)
-            json_data[parent_key] = sorted_dicts
-        return json_data
+        self.model.close()
+        self.model = CatalogModel.open(self.file_path)
+        self.populate_tree(self.json_data, "")
 
     def sort_by_date(self):
         # Sort the JSON data by the "date_modified" field
-        for parent_key, child_dict in self.json_data.items():
-            sorted_dicts = sorted(child_dict, key=lambda x: x.get(
-                'date_modified', 0), reverse=True)
-            self.json_data[parent_key] = sorted_dicts
+        self.model.sort("date_modified")
 
         # Clear and repopulate the TreeView with the sorted data
         self.tree.delete(*self.tree.get_children())
@@ -707,9 +1034,24 @@ class Tranport:
     global parent_key
 
 
-if __name__ == "__main__":
+def main():
+    # Create the argument parser
+    parser = argparse.ArgumentParser(
+        description='Search for images within a date range and write metadata to a JSON file.')
+    parser.add_argument('--file_path', required=True,
+                        help='Path to the directory to search for image files.')
+    profiling.add_arguments(parser)
+
+    # Parse the arguments
+    args = parser.parse_args()
+    profiling.enable(args.profile, args.cprofile)
+
     root = tk.Tk()
-    json_editor = JsonEditor(root, file_path)
+    JsonEditor(root, args.file_path)
     root.mainloop()
 
+
+if __name__ == "__main__":
+    main()
+
 # end of script
@@ -0,0 +1,83 @@
+import os
+import re
+import fnmatch
+
+# Characters that turn an ignore-file line into a glob pattern instead of a path
+GLOB_CHARACTERS = set("*?[")
+
+
+def read_ignore_list(ignore_file):
+    # lines of an ignore file (paths or glob patterns); a missing file ignores nothing
+    if ignore_file and os.path.exists(ignore_file):
+        with open(ignore_file, encoding='utf-8') as ignore_lines:
+            return [line.rstrip() for line in ignore_lines]
+    return []
+
+
+def normalize_path(path):
+    # absolute, case-normalized path with forward slashes, without a trailing slash
+    return os.path.normcase(os.path.abspath(path)).replace("\\", "/").rstrip("/")
+
+
+class IgnoreMatcher:
+    # Compiled ignore list: plain paths go into a trie keyed by path component,
+    # lines containing * ? or [ are compiled into one glob regular expression.
+    # A path is ignored when it is an ignored path, lies below one, or matches a pattern.
+
+    def __init__(self, ignore_list=()):
+        self.trie = {}
+        self.patterns = []
+        self.pattern_regex = None
+
+        for ignore_path in ignore_list:
+            ignore_path = ignore_path.strip()
+            if not ignore_path or ignore_path.startswith("#"):
+                continue
+            if GLOB_CHARACTERS.intersection(ignore_path):
+                self.add_pattern(ignore_path)
+            else:
+                self.add_path(ignore_path)
+
+        if self.patterns:
+            self.pattern_regex = re.compile("|".join(fnmatch.translate(pattern) for pattern in self.patterns))
+
+    @classmethod
+    def from_file(cls, ignore_filename):
+        # one path or pattern per line, as in ignore_this.txt
+        with open(ignore_filename, encoding='utf-8') as ignore_file:
+            return cls(line.rstrip() for line in ignore_file)
+
+    def add_path(self, ignore_path):
+        node = self.trie
+        for part in normalize_path(ignore_path).split("/"):
+            if node.get(None):
+                # an ancestor is already ignored
+                return
+            node = node.setdefault(part, {})
+        # None marks the end of an ignored path; everything below it is dropped
+        node.clear()
+        node[None] = True
+
+    def add_pattern(self, pattern):
+        self.patterns.append(os.path.normcase(pattern).replace("\\", "/"))
+
+    def __bool__(self):
+        return bool(self.trie) or bool(self.patterns)
+
+    def matches(self, path, is_directory=False):
+        path = normalize_path(path)
+
+        node = self.trie
+        for part in path.split("/"):
+            node = node.get(part)
+            if node is None:
+                break
+            if None in node:
+                return True
+
+        if self.pattern_regex is None:
+            return False
+        if self.pattern_regex.match(path) is not None:
+            return True
+        # let a pattern such as */AppData/* prune the AppData directory itself
+        return is_directory and self.pattern_regex.match(path + "/") is not None
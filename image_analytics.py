@@ -1,77 +1,130 @@
-from tkinter import messagebox
-import pandas as pd
 import os
+import csv
+import argparse
 from datetime import datetime
+from image_scanner import scan_images
+
+# Image file extensions included in the analysis
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+
+# Column layout of file_analysis.txt
+STATISTICS_COLUMNS = ['Directory_Path', 'Processed_Date', 'Image_Year', 'Type', 'Count', 'Size (MB)']
+
+
+class ImageStatistics:
+    # Streaming aggregator: every file is folded into a (year, type) counter as it
+    # is found, so memory is bounded by the number of groups, not the number of files
+
+    def __init__(self):
+        # (year, type) -> [count, size in bytes]
+        self.counters = {}
+
+    def add(self, image_year, file_type, size_bytes):
+        counter = self.counters.get((image_year, file_type))
+        if counter is None:
+            self.counters[(image_year, file_type)] = [1, size_bytes]
+        else:
+            counter[0] += 1
+            counter[1] += size_bytes
+
+    def merge(self, other):
+        # combine the counters of another aggregator, e.g. from a second directory
+        for (image_year, file_type), (count, size_bytes) in other.counters.items():
+            counter = self.counters.setdefault((image_year, file_type), [0, 0])
+            counter[0] += count
+            counter[1] += size_bytes
+
+    def total_count(self):
+        return sum(count for count, _ in self.counters.values())
+
+    def total_size(self):
+        return sum(size_bytes for _, size_bytes in self.counters.values())
+
+    def rows(self, directory_path, processed_date):
+        # one row per (year, type), ordered by year and type, then by size descending
+        groups = sorted(self.counters.items())
+        groups.sort(key=lambda group: group[1][1], reverse=True)
+
+        rows = []
+        for (image_year, file_type), (count, size_bytes) in groups:
+            rows.append({
+                'Directory_Path': directory_path,
+                'Processed_Date': processed_date,
+                'Image_Year': image_year,
+                'Type': file_type,
+                'Count': count,
+                'Size (MB)': round(size_bytes / (1024 * 1024), 2)
+            })
+        return rows
+
+
+def collect_image_statistics(directory_path, statistics=None, max_workers=None):
+    # walk the directory once and fold each image file into the counters
+    if statistics is None:
+        statistics = ImageStatistics()
+
+    # walk the directory and its subdirectories once, reusing the stat from each directory entry
+    for image_file in scan_images(directory_path, IMAGE_EXTENSIONS, max_workers=max_workers):
+        # get the file creation year, type and size
+        create_year = datetime.fromtimestamp(image_file.ctime).strftime('%Y')
+        file_type = os.path.splitext(image_file.path)[-1].upper()
+        statistics.add(create_year, file_type, image_file.size)
+
+    return statistics
+
 
 def get_image_statistics(directory_path):
-    # create an empty DataFrame to store the statistics
-    statistics_df = pd.DataFrame(columns=['Directory_Path', 'Processed_Date', 'Image_Year', 'Type', 'Count', 'Size (MB)'])
-    
     # get the current date and time
     processed_date = datetime.now().strftime('%m/%d/%Y %H:%M')
-    
-    # loop through the directory and its subdirectories
-    for root, dirs, files in os.walk(directory_path):
-        for file in files:
-            # get the file extension and check if it's an image file
-            ext = os.path.splitext(file)[-1].lower()
-            if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                # get the file creation year and type
-                file_path = os.path.join(root, file)
-                create_time = os.path.getctime(file_path)
-                create_year = datetime.fromtimestamp(create_time).strftime('%Y')
-                file_type = ext.upper()
-                
-                # get the file size in MB
-                size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                
-                # add the file data to the DataFrame
-                row = {
-                    'Directory_Path': directory_path,
-                    'Processed_Date': processed_date,
-                    'Image_Year': create_year,
-                    'Type': file_type,
-                    'Count': 1,
-                    'Size (MB)': size_mb
-                }
-                statistics_df = pd.concat([statistics_df, pd.DataFrame(row, index=[0])], ignore_index=True)
-    
-    # group the DataFrame by year and type and get the count and sum of file sizes
-    grouped_df = statistics_df.groupby(['Image_Year', 'Type']).agg({'Count': 'sum', 'Size (MB)': 'sum'}).reset_index()
-    
-    # sort the DataFrame by size_mb
-    grouped_df['Size (MB)'] = pd.to_numeric(grouped_df['Size (MB)']) # convert the size column to numeric
-    sorted_df = grouped_df.sort_values(['Size (MB)'], ascending=[False])
-    
-    # add the directory path and processed date to the DataFrame
-    sorted_df['Directory_Path'] = directory_path
-    sorted_df['Processed_Date'] = processed_date
-    
-    # reorder the columns
-    sorted_df = sorted_df[['Directory_Path', 'Processed_Date', 'Image_Year', 'Type', 'Count', 'Size (MB)']]
-    
-    # round the Size (MB) column to two decimal places
-    sorted_df['Size (MB)'] = sorted_df['Size (MB)'].round(2)
-    
-    # write the results to a tab delimited file
-    sorted_df.to_csv(output_file_path, sep='\t', index=False)
-    
-    return sorted_df
+
+    # aggregate the files into (year, type) counters; one row dictionary per group, sorted by size
+    statistics = collect_image_statistics(directory_path)
+    return statistics.rows(directory_path, processed_date)
+
+
+def statistics_dataframe(rows):
+    # optional pandas view of the statistics rows, for callers that want a DataFrame
+    import pandas as pd
+    return pd.DataFrame(rows, columns=STATISTICS_COLUMNS)
+
+
+def write_statistics_file(rows, output_file_path):
+    # tab delimited, in the layout DataFrame.to_csv(sep='\t', index=False) wrote: a header row,
+    # then the rows with os.linesep line endings
+    with open(output_file_path, 'w', encoding='utf-8', newline='') as output_file:
+        writer = csv.writer(output_file, delimiter='\t', lineterminator=os.linesep)
+        writer.writerow(STATISTICS_COLUMNS)
+        for row in rows:
+            writer.writerow([row[column] for column in STATISTICS_COLUMNS])
+
 
 def write_results_to_file(directory_path, output_file_path):
     # get the image statistics for the directory
     image_statistics = get_image_statistics(directory_path)
 
     # write the statistics to a tab delimited file
-    image_statistics.to_csv(output_file_path, sep='\t', index=False)
+    write_statistics_file(image_statistics, output_file_path)
 
     print(f'Successfully saved image statistics to {output_file_path}')
-    messagebox.showinfo("Image Analytics", f"Done")
+    return image_statistics
 
-if __name__ == '__main__':
+
+def main():
     # Set the directory to search, the output filename, and the processed date
     default_search_path = os.path.expanduser("~")
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_file_path = os.path.join(script_dir, "file_analysis.txt")   
+    parser = argparse.ArgumentParser(description='Count the image files and their size per year and type.')
+    parser.add_argument('--search_path', default=default_search_path, help='Directory to analyze. Default: your home directory.')
+    parser.add_argument('--output_file', default=os.path.join(script_dir, "file_analysis.txt"), help='Tab delimited file to write the statistics to.')
+    parser.add_argument('--show_dialog', action='store_true', help='Show a message box when done (used by the app).')
+    args = parser.parse_args()
+
     print("Analyzing image files..")
-    write_results_to_file(default_search_path, output_file_path)
+    write_results_to_file(args.search_path, args.output_file)
+    if args.show_dialog:
+        from tkinter import messagebox
+        messagebox.showinfo("Image Analytics", "Done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+import re
+import math
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from content_hash import HashCache
+import profiling
+
+# EXIF tags
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+MAKE = 0x010F
+MODEL = 0x0110
+DATE_TIME_ORIGINAL = 0x9003
+DATE_TIME_DIGITIZED = 0x9004
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+# Formats whose EXIF block is read with the header. PNG keeps it in an eXIf chunk that Pillow may
+# only find by decoding the image, so for the other formats only what the header parse found is used.
+EXIF_HEADER_FORMATS = {"JPEG", "MPO", "TIFF", "WEBP"}
+
+EXIF_DATE = re.compile(r"^(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})")
+
+
+def metadata_cache_path_for(catalog_dir):
+    # one cache per catalog directory, shared by all of its catalogs
+    return os.path.join(catalog_dir or ".", "image_metadata.json")
+
+
+def exif_date(value):
+    # "2019:07:04 12:34:56" -> "2019-07-04 12:34:56", the format of date_modified; None if unset
+    match = EXIF_DATE.match(str(value or "").strip())
+    if not match or match.group(1) == "0000":
+        return None
+    return "{}-{}-{} {}:{}:{}".format(*match.groups())
+
+
+def gps_degrees(dms, ref):
+    # (degrees, minutes, seconds) rationals -> signed decimal degrees
+    degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    if math.isnan(degrees):
+        return None
+    return -degrees if str(ref).upper() in ("S", "W") else degrees
+
+
+def read_image_metadata(image_path):
+    # Capture date, camera and dimensions from the file header. Image.open only parses the header,
+    # so no pixel data is decoded. getexif is only called for EXIF_HEADER_FORMATS: for PNG it loads
+    # the whole image to look for an eXIf chunk after the pixel data.
+    from PIL import Image
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if image.format in EXIF_HEADER_FORMATS:
+            exif = image.getexif()
+        else:
+            exif = Image.Exif()
+            if image.info.get("exif"):
+                exif.load(image.info["exif"])
+
+    metadata = {"width": width, "height": height}
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    date_taken = exif_date(exif_ifd.get(DATE_TIME_ORIGINAL)) or exif_date(exif_ifd.get(DATE_TIME_DIGITIZED))
+    if date_taken:
+        metadata["date_taken"] = date_taken
+
+    camera = " ".join(str(exif.get(tag, "")).strip("\x00 ") for tag in (MAKE, MODEL)).strip()
+    if camera:
+        metadata["camera"] = camera
+
+    gps = exif.get_ifd(GPS_IFD)
+    try:
+        latitude = gps_degrees(gps[GPS_LATITUDE], gps.get(GPS_LATITUDE_REF, "N"))
+        longitude = gps_degrees(gps[GPS_LONGITUDE], gps.get(GPS_LONGITUDE_REF, "E"))
+    except (KeyError, IndexError, TypeError, ValueError, ZeroDivisionError):
+        latitude = longitude = None
+    if latitude is not None and longitude is not None:
+        metadata["gps"] = [round(latitude, 6), round(longitude, 6)]
+    return metadata
+
+
+def read_image_metadata_or_none(image_path):
+    # process pool worker; unreadable images get no metadata
+    from PIL import Image
+    try:
+        return read_image_metadata(image_path)
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        return None
+
+
+@profiling.traced("image_metadata")
+def image_metadata(image_files, metadata_cache_file_path, max_workers=None):
+    # {path: metadata} for ImageFile entries. Headers are parsed in a process pool, so the parsing
+    # scales with the cores; results are cached by path, mtime and size.
+    metadata_cache = HashCache.load(metadata_cache_file_path)
+    results = {}
+    missing = []
+    for image_file in image_files:
+        value = metadata_cache.get(image_file, "exif")
+        if value is None:
+            missing.append(image_file)
+        else:
+            results[image_file.path] = value
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            paths = [image_file.path for image_file in missing]
+            for image_file, value in zip(missing, executor.map(read_image_metadata_or_none, paths, chunksize=64)):
+                if value is not None:
+                    metadata_cache.set(image_file, "exif", value)
+                    results[image_file.path] = value
+
+    metadata_cache.save(metadata_cache_file_path)
+    print(f"Image metadata: {len(missing)} read, {len(image_files) - len(missing)} reused from cache")
+    return results
+
+
+def capture_year(image_file, metadata):
+    # year the picture was taken, or the file's modification year when the header has no date
+    date_taken = metadata.get(image_file.path, {}).get("date_taken")
+    if date_taken:
+        return int(date_taken[:4])
+    return datetime.fromtimestamp(image_file.mtime).year
+
+
+def files_captured_in(image_files, metadata, start_year, end_year):
+    return [image_file for image_file in image_files if start_year <= capture_year(image_file, metadata) <= end_year]
+
+
+def add_metadata_fields(image_dict, metadata):
+    # date_taken, camera, width and height as record fields; GPS coordinates fill an empty location
+    for key in ("date_taken", "camera", "width", "height"):
+        image_dict[key] = metadata.get(key, "")
+    if metadata.get("gps") and not image_dict.get("location"):
+        image_dict["location"] = "{:.6f}, {:.6f}".format(*metadata["gps"])
@@ -0,0 +1,208 @@
+import re
+
+# Record keys of the catalog scripts, the columns of a SQLite catalog
+RECORD_FIELDS = ["source", "device_id", "load_date", "date_modified", "artist", "title", "media",
+                 "category", "location", "description", "year_of_work", "for_sale", "price", "timestamp"]
+
+# Fields with few distinct values; equal strings share one object across the records of a load
+INTERNED_FIELDS = frozenset(["device_id", "load_date", "artist", "media", "category", "for_sale"])
+
+# Key order of the records written by the catalog scripts
+NEW_RECORD_LAYOUT = ("source", "device_id", "load_date", "date_modified", "artist", "title", "media",
+                     "category", "location", "description", "year_of_work", "for_sale", "price")
+
+# date_modified values in the format the catalog scripts write are held as the integer
+# YYYYMMDDhhmmss, a third of the size of the string; any other value is held as a 1-tuple
+DATE_LAYOUT = re.compile(r"[1-9][0-9]{3}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}")
+
+# Key orders seen so far; a catalog has a handful, and no values are kept here
+record_layouts = {}
+
+
+class RecordLayout:
+    # the key order of a record and the position of each key in ImageRecord.fields
+
+    __slots__ = ("keys", "positions", "source", "date_modified", "interned")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys, 1)}
+        self.source = self.positions.get("source")
+        self.date_modified = self.positions.get("date_modified")
+        self.interned = [position for key, position in self.positions.items() if key in INTERNED_FIELDS]
+
+
+def record_layout(keys):
+    layout = record_layouts.get(keys)
+    if layout is None:
+        layout = record_layouts[keys] = RecordLayout(keys)
+    return layout
+
+
+def pack_date(value):
+    # "2019-07-04 12:34:56" -> 20190704123456
+    if type(value) is str and DATE_LAYOUT.fullmatch(value):
+        return int(value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19])
+    return (value,)
+
+
+def unpack_date(value):
+    if type(value) is tuple:
+        return value[0]
+    text = str(value)
+    return f"{text[0:4]}-{text[4:6]}-{text[6:8]} {text[8:10]}:{text[10:12]}:{text[12:14]}"
+
+
+class ImageRecord:
+    # One catalog record in four slots instead of a 13-14 key dictionary. A string source is held as
+    # its directory (the source slot) and its file name, date_modified packed (see pack_date), and
+    # every other value in the fields tuple: its layout (the record's key order) followed by the
+    # values in that order, with None in place of source and date_modified. Records loaded with the
+    # same intern table share equal directories, strings of INTERNED_FIELDS and fields tuples, and
+    # records made by the catalog scripts differ only in source and date_modified, so most records
+    # of a catalog point at one fields tuple. The table is dropped after the load; nothing outlives
+    # the records themselves.
+    # to_dict gives back exactly the dictionary the record was made from. Supports the dictionary
+    # operations the GUI and the scripts use (get, [], in, keys, items); json.dump needs
+    # default=record_to_json.
+
+    __slots__ = ("source", "source_name", "date_modified", "fields")
+
+    def __init__(self, layout=NEW_RECORD_LAYOUT, values=(), interned=None):
+        # values are given in layout order; interned is the intern table of a load, see to_image_records
+        layout = record_layout(tuple(layout))
+        fields = [layout]
+        fields.extend(values)
+        if layout.source:
+            self.set_source(fields[layout.source], interned)
+            fields[layout.source] = None
+        if layout.date_modified:
+            self.date_modified = pack_date(fields[layout.date_modified])
+            fields[layout.date_modified] = None
+        if interned is None:
+            self.fields = tuple(fields)
+            return
+        for position in layout.interned:
+            value = fields[position]
+            if type(value) is str:
+                fields[position] = interned.setdefault(value, value)
+        fields = tuple(fields)
+        # 1 == 1.0 == True, so only tuples of strings are shared
+        if all(value is None or type(value) is str for value in fields[1:]):
+            fields = interned.setdefault(fields, fields)
+        self.fields = fields
+
+    @classmethod
+    def from_dict(cls, record, interned=None):
+        if isinstance(record, ImageRecord):
+            return record
+        return cls(tuple(record), record.values(), interned)
+
+    def to_dict(self):
+        return {key: self[key] for key in self.fields[0].keys}
+
+    def set_source(self, value, interned=None):
+        if type(value) is str:
+            cut = max(value.rfind("/"), value.rfind("\\")) + 1
+            directory = value[:cut]
+            self.source = interned.setdefault(directory, directory) if interned is not None else directory
+            self.source_name = value[cut:]
+        else:
+            self.source = value
+            self.source_name = None
+
+    def __getitem__(self, key):
+        position = self.fields[0].positions[key]
+        if key == "source":
+            if self.source_name is None:
+                return self.source
+            return self.source + self.source_name
+        if key == "date_modified":
+            return unpack_date(self.date_modified)
+        return self.fields[position]
+
+    def __setitem__(self, key, value):
+        layout = self.fields[0]
+        fields = list(self.fields)
+        if key not in layout.positions:
+            layout = fields[0] = record_layout(layout.keys + (key,))
+            fields.append(None)
+        if key == "source":
+            self.set_source(value)
+        elif key == "date_modified":
+            self.date_modified = pack_date(value)
+        else:
+            fields[layout.positions[key]] = value
+        self.fields = tuple(fields)
+
+    def __delitem__(self, key):
+        layout = self.fields[0]
+        position = layout.positions[key]
+        keys = layout.keys[:position - 1] + layout.keys[position:]
+        self.fields = (record_layout(keys),) + self.fields[1:position] + self.fields[position + 1:]
+        if key == "source":
+            del self.source, self.source_name
+        elif key == "date_modified":
+            del self.date_modified
+
+    def __contains__(self, key):
+        return key in self.fields[0].positions
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.fields[0].keys)
+
+    def values(self):
+        return [self[key] for key in self.fields[0].keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self.fields[0].keys]
+
+    def __iter__(self):
+        return iter(self.fields[0].keys)
+
+    def __len__(self):
+        return len(self.fields[0].keys)
+
+    def __eq__(self, other):
+        if isinstance(other, ImageRecord):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # layouts are shared by identity, so records are pickled as their keys and values
+        return ImageRecord, (self.keys(), self.values())
+
+    def __repr__(self):
+        return f"ImageRecord({self.to_dict()!r})"
+
+
+def new_image_record(source, device_id, load_date, date_modified):
+    # a record as created by the catalog scripts, with the descriptive fields left empty
+    return ImageRecord(NEW_RECORD_LAYOUT, (source, device_id, load_date, date_modified) + ("",) * 9)
+
+
+def to_image_records(records, interned=None):
+    # convert a record list in place, so each dictionary can be freed as soon as it is replaced;
+    # pass the same intern table ({}) for every list of a load
+    if interned is None:
+        interned = {}
+    for position, record in enumerate(records):
+        records[position] = ImageRecord.from_dict(record, interned)
+    return records
+
+
+def record_to_json(value):
+    # default= hook for json.dump/json.dumps
+    if isinstance(value, ImageRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,167 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from ignore_matcher import IgnoreMatcher
+import profiling
+
+# Image file extensions searched for by the catalog scripts
+CATALOG_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif']
+
+# Files found between two calls of a scan progress callback
+SCAN_PROGRESS_INTERVAL = 256
+
+# One image file found by the scanner, with the stat values taken from its DirEntry
+ImageFile = namedtuple('ImageFile', ['path', 'size', 'mtime', 'ctime'])
+
+
+def default_worker_count():
+    # the walk is bound by stat/readdir latency (network shares), not by CPU
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def list_directory(directory, extensions):
+    # raw listing of one directory: (name, size, mtime, ctime) of the image files matching the
+    # extensions, and the names of its subdirectories
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                        # DirEntry caches the stat result (on Windows it comes with the listing)
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_size, stat.st_mtime, stat.st_ctime))
+                except OSError:
+                    # the entry disappeared or cannot be read, skip it
+                    continue
+    except OSError:
+        # unreadable directory, skipped the same way os.walk does
+        pass
+    return files, subdirs
+
+
+def scan_directory(directory, extensions, include_hidden=True, ignore=None, manifest=None):
+    # list one directory: image files matching the extensions and the subdirectories to descend into.
+    # Ignored subdirectories are pruned here, so nothing below them is ever listed.
+    # With a ScanManifest, an unchanged directory is taken from the previous scan instead of being read.
+    listing = None
+    if manifest is not None:
+        directory_mtime, listing = manifest.cached_listing(directory)
+    if listing is None:
+        listing = list_directory(directory, extensions)
+        profiling.count("directories_listed")
+        if manifest is not None:
+            manifest.record(directory, directory_mtime, listing)
+    else:
+        profiling.count("directories_from_manifest")
+
+    files = []
+    subdirs = []
+    for name, size, mtime, ctime in listing[0]:
+        if not include_hidden and name.startswith('.'):
+            continue
+        path = os.path.join(directory, name)
+        if ignore and ignore.matches(path):
+            continue
+        files.append(ImageFile(path, size, mtime, ctime))
+
+    for name in listing[1]:
+        if not include_hidden and name.startswith('.'):
+            continue
+        path = os.path.join(directory, name)
+        if ignore and ignore.matches(path, is_directory=True):
+            continue
+        subdirs.append(path)
+
+    return files, subdirs
+
+
+def scan_images(search_path, extensions=CATALOG_EXTENSIONS, include_hidden=True, max_workers=None, ignore=None,
+                manifest=None):
+    # Walk the tree once for all extensions, yielding ImageFile tuples.
+    # Directories are listed on a thread pool; each listed directory queues its subdirectories.
+    # ignore is an IgnoreMatcher (or a list of ignore paths) used to prune whole subtrees.
+    # manifest is an optional ScanManifest for incremental rescans.
+    extensions = frozenset(ext.lower() for ext in extensions)
+    if max_workers is None:
+        max_workers = default_worker_count()
+    if ignore is not None and not isinstance(ignore, IgnoreMatcher):
+        ignore = IgnoreMatcher(ignore)
+    if ignore and ignore.matches(search_path, is_directory=True):
+        return
+
+    if max_workers <= 1:
+        stack = [search_path]
+        while stack:
+            files, subdirs = scan_directory(stack.pop(), extensions, include_hidden, ignore, manifest)
+            stack.extend(subdirs)
+            yield from files
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+    try:
+        pending = {executor.submit(scan_directory, search_path, extensions, include_hidden, ignore, manifest)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(executor.submit(scan_directory, subdir, extensions, include_hidden, ignore, manifest))
+                yield from files
+    finally:
+        # the generator may be closed early; drop the queued listings (shutdown(cancel_futures=True)
+        # would do this, but needs Python 3.9)
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def check_year_range(start_year, end_year):
+    # the scripts print the ValueError message and exit with status 1
+    if not start_year:
+        raise ValueError("Start year is required.")
+
+    if not end_year:
+        raise ValueError("End year is required.")
+
+    if end_year < start_year:
+        raise ValueError("End year should be greater than or equal to start year.")
+
+
+@profiling.traced("scan_image_files")
+def scan_image_files(search_path, ignore_list, max_workers=None, manifest=None, progress=None):
+    # every catalog image below search_path, sorted, with "/" separators. Ignored directories are
+    # pruned by the scanner. Hidden files and directories are skipped, as the recursive glob used to do.
+    # progress(files_found) is called every SCAN_PROGRESS_INTERVAL files and once at the end.
+    image_files = []
+    for image_file in scan_images(search_path, CATALOG_EXTENSIONS, include_hidden=False,
+                                  max_workers=max_workers, ignore=ignore_list, manifest=manifest):
+        image_files.append(image_file._replace(path=image_file.path.replace("\\", "/")))
+        if progress is not None and len(image_files) % SCAN_PROGRESS_INTERVAL == 0:
+            progress(len(image_files))
+    if progress is not None:
+        progress(len(image_files))
+    profiling.count("image_files_found", len(image_files))
+    # the parallel walk finishes directories in any order
+    image_files.sort()
+    return image_files
+
+
+@profiling.traced("find_images")
+def find_image_files(start_year, end_year, search_path, ignore_list, max_workers=None, manifest=None, progress=None):
+    # ignore_list is a list of ignore paths/patterns or a compiled IgnoreMatcher
+    check_year_range(start_year, end_year)
+
+    # Filter the files to only include those modified within the date range
+    return [image_file for image_file in scan_image_files(search_path, ignore_list, max_workers, manifest, progress)
+            if start_year <= datetime.fromtimestamp(image_file.mtime).year <= end_year]
+
+
+def find_images(start_year, end_year, search_path, ignore_list):
+    # file paths only, for callers that do not need the stat values
+    return [image_file.path for image_file in find_image_files(start_year, end_year, search_path, ignore_list)]
@@ -2,64 +2,19 @@
 
 import argparse
 import os
-import glob
 import json
 from datetime import datetime
-from tkinter import messagebox
+from image_scanner import scan_image_files, check_year_range, CATALOG_EXTENSIONS
+from ignore_matcher import IgnoreMatcher, read_ignore_list
+from image_record import new_image_record
+from scan_manifest import ScanManifest, manifest_path_for
+from content_hash import deduplicate_image_files, hash_cache_path_for
+from image_metadata import image_metadata, metadata_cache_path_for, capture_year, add_metadata_fields
+from catalog_sqlite import SqliteCatalogStore
+from catalog_journal import write_json_atomic
+import profiling
 
 
-def find_images(start_year, end_year, search_path, ignore_list):
-    if not end_year:
-        print("Error: End year is required.")
-        exit(1)
-
-    if end_year < start_year:
-        print("Error: End year should be greater than or equal to start year.")
-        exit(1)
-
-    # Define a list of common image file extensions
-    extensions = ["*.jpg", "*.jpeg", "*.png", "*.gif"]
-    # Use glob to search for files with those extensions in the search_path directory
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(search_path, "**", ext), recursive=True))
-
-    # Filter the files to only include those modified within the date range and not in the ignore list
-    filtered_files = []
-    for file_path in files:
-        ignore_file_check = False
-        for ignore_path in ignore_list:
-            if any(os.path.normcase(os.path.abspath(file_path)) == os.path.normcase(os.path.abspath(ignore_path)) or os.path.normcase(file_path).startswith(os.path.normcase(ignore_path)) for ignore_path in ignore_list):
-                ignore_file_check = True
-                break
-
-        if ignore_file_check:
-            continue
-
-        modified_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-        if start_year <= modified_date.year <= end_year:
-            file_path = file_path.replace("\\", "/")
-            filtered_files.append(file_path)
-
-    return filtered_files
-
-
-# Create the argument parser
-parser = argparse.ArgumentParser(description='Search for images within a date range and write metadata to a JSON file.')
-parser.add_argument('--catalog_path', required=True, help='Path to the directory where the JSON catalog will be saved.')
-parser.add_argument('--search_path', required=True, help='Path to the directory to search for image files.')
-parser.add_argument('--start_year', type=int, required=True, help='Starting year of the date range.')
-parser.add_argument('--end_year', type=int, required=False, help='Ending year of the date range.')
-parser.add_argument('--ignore_file', type=str, required=False, help='Text file name with paths to ignore.')
-
-# Parse the arguments
-args = parser.parse_args()
-
-catalog_path = args.catalog_path
-search_path = args.search_path
-start_year = args.start_year
-end_year = args.end_year
-
 # Function to get the unique device ID
 
 def get_device_id(json_file_path):
@@ -82,96 +37,248 @@ def get_device_id(json_file_path):
         return None
 
 
-ignore_list = []
-device_id = get_device_id("device_id.json")  # Get the device id
-print("device_id",device_id)
-
-
-if args.ignore_file:
-    ignore_filename = args.ignore_file
-    if os.path.exists(ignore_filename):
-        with open(ignore_filename, 'r') as ignore_file:
-            ignore_list = [line.rstrip() for line in ignore_file]
-
-
-print("ignore_list =", ignore_list)
-print("Getting catalog items...")
-print("start_year=", start_year, "end_year=", end_year,  "catalog_path=", catalog_path, "search_path=", search_path )
-
-# Call the function to search for images within the date range of start_year and end_year
-image_files = find_images(start_year, end_year, search_path, ignore_list)
-
-# Create a list of dictionaries for each image file with metadata fields
-image_list = []
-total_size = 0  # Initialize total size to 0
-for file_path in image_files:
-    # Get the current datetime as a string
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # Get the date modified of the file and convert it to a string representation
-    mod_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M:%S")
-    # Create a dictionary with metadata fields, including date modified
-    image_dict = {       
-        "source": file_path,
-        "device_id": device_id,
-        "load_date": current_date,
-        "date_modified": mod_date,
-        "artist": "",
-        "title": "",
-        "media": "",
-        "category": "",
-        "location": "",
-        "description": "",
-        "year_of_work": "",
-        "for_sale": "",
-        "price": ""
+# What to do when the catalog being created already exists, see replace_existing
+IF_EXISTS_CHOICES = ["ask", "overwrite", "skip", "fail"]
+
+
+class CatalogExists(Exception):
+    # the catalog already exists and if_exists is "fail"
+    pass
+
+
+def parse_partitions(spec, start_year, end_year):
+    # "yearly" -> one catalog per year from start_year to end_year;
+    # "2015-2017,2018,2019-2023" -> one catalog per range, start_year and end_year are not used
+    if spec == "yearly":
+        check_year_range(start_year, end_year)
+        return [(year, year) for year in range(start_year, end_year + 1)]
+
+    partitions = []
+    for part in spec.split(","):
+        years = part.strip().split("-")
+        try:
+            partition = (int(years[0]), int(years[-1]))
+        except ValueError:
+            raise ValueError(f"invalid partition '{part}'. Use 'yearly' or ranges such as 2015-2017,2018.")
+        check_year_range(*partition)
+        partitions.append(partition)
+    return partitions
+
+
+def catalog_name(start_year, end_year):
+    if end_year == start_year:
+        return f"detail_{start_year}"
+    return f"detail_{start_year}_{end_year}"
+
+
+def replace_existing(if_exists, title, message):
+    # whether an existing catalog is replaced. Only "ask" opens a message box, so the other policies
+    # run without a display.
+    if if_exists == "overwrite":
+        return True
+    if if_exists == "skip":
+        return False
+    if if_exists == "ask":
+        from tkinter import messagebox
+        return messagebox.askquestion(title, f"{message} Do you want to replace it?") == 'yes'
+    raise CatalogExists(message)
+
+
+def create_catalog(catalog_path, sqlite_file, start_year, end_year, image_files, device_id, content_hashes, phashes,
+                   metadata, scan_manifest, if_exists="ask"):
+    # write the catalog of one year range; returns a summary of it, or None when an existing catalog is kept
+
+    # Create a list of records for each image file with metadata fields
+    image_list = []
+    total_size = 0  # Initialize total size to 0
+    with profiling.span("build_records", files=len(image_files)):
+        for image_file in image_files:
+            file_path = image_file.path
+            # Get the current datetime as a string
+            current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Get the date modified of the file (stat taken during the scan) and convert it to a string representation
+            mod_date = datetime.fromtimestamp(image_file.mtime).strftime("%Y-%m-%d %H:%M:%S")
+            # Create a record with metadata fields, including date modified; the other fields start empty
+            image_dict = new_image_record(file_path, device_id, current_date, mod_date)
+            if content_hashes is not None:
+                image_dict["content_hash"] = content_hashes.get(file_path, "")
+            if phashes is not None:
+                image_dict["phash"] = phashes.get(file_path, "")
+            if metadata is not None:
+                add_metadata_fields(image_dict, metadata.get(file_path, {}))
+            # Append the dictionary to the list of image objects
+            image_list.append(image_dict)
+            # Add the file size to the total size
+            total_size += image_file.size
+            print("image_dict", image_dict.to_dict())
+
+    # Create a dictionary with the list of image objects
+    base_name = catalog_name(start_year, end_year)
+    output_dict = {
+        base_name: image_list
     }
-    # Append the dictionary to the list of image objects
-    image_list.append(image_dict)
-    # Add the file size to the total size
-    total_size += os.path.getsize(file_path)
-    print("image_dict", image_dict)
-
-
-# Create a dictionary with the list of image objects
-if end_year == start_year:
-    base_name = f"detail_{start_year}"
-else:
-    base_name = f"detail_{start_year}_{end_year}"
-output_dict = {
-    base_name: image_list
-}
-
-# Write the dictionary to a JSON file
-output_filename = f"{base_name}.json"
-output_file_path = os.path.join(catalog_path, output_filename)
-print("output_file_path = ", output_file_path)
-
-if os.path.exists(output_file_path):
-    while True:
-        choice = messagebox.askquestion("File Exists", f"File '{output_filename}' already exists. Do you want to replace it?")
-        if choice == 'yes':
-            os.remove(output_file_path)
-            break
-        elif choice == 'no':
-            messagebox.showinfo("Exiting Program", "Exiting program...")
-            exit(0)
-        else:
-            messagebox.showwarning("Invalid Choice", "Invalid choice. Please select 'Yes' or 'No'.")
 
-with open(output_file_path, "w") as json_file:
-    json.dump(output_dict, json_file)
+    if sqlite_file:
+        # Write the list into the SQLite catalog file, replacing a catalog of the same name
+        output_filename = base_name
+        output_file_path = sqlite_file
+        print("output_file_path = ", output_file_path)
+        catalog_store = SqliteCatalogStore(output_file_path)
+
+        try:
+            if base_name in catalog_store.catalog_names() and not replace_existing(
+                    if_exists, "Catalog Exists", f"Catalog '{base_name}' already exists in '{output_file_path}'."):
+                return None
+
+            with profiling.span("sqlite.replace_catalog", catalog=base_name):
+                catalog_store.replace_catalog(base_name, image_list)
+        finally:
+            catalog_store.close()
+    else:
+        # Write the dictionary to a JSON file
+        output_filename = f"{base_name}.json"
+        output_file_path = os.path.join(catalog_path, output_filename)
+        print("output_file_path = ", output_file_path)
+
+        if os.path.exists(output_file_path) and not replace_existing(
+                if_exists, "File Exists", f"File '{output_filename}' already exists."):
+            return None
+
+        # written to a temporary file and renamed, so a catalog being replaced is never left half written
+        write_json_atomic(output_file_path, output_dict)
+
+    # the listing covers the whole search path, so every catalog of the scan gets the same manifest
+    scan_manifest.save(manifest_path_for(output_file_path, base_name if sqlite_file else None))
+
+    # Convert total size to megabytes and gigabytes
+    total_size_mb = total_size / (1024 * 1024)
+    total_size_gb = total_size_mb / 1024
+
+    # Print a message indicating that the output has been written to the JSON file, along with the total number of files and total size
+    print(f"Image file paths written to {catalog_path}{output_filename}")
+    print(f"Total number of images: {len(image_files)}")
+    print(f"Total size: {total_size} bytes, {total_size_mb:.2f} MB, {total_size_gb:.2f} GB")
+    return {"catalog": base_name, "file": output_file_path, "images": len(image_files), "bytes": total_size}
+
+
+def create_catalogs(catalog_path, search_path, start_year, end_year, ignore_list=(), sqlite_file=None,
+                    partitions=None, content_hash=False, duplicates_file=None, canonical_only=False, phash=False,
+                    exif=False, device_id=None, if_exists="ask"):
+    # Scan search_path once and write one catalog for the year range, or one per partition.
+    # Returns {"created": [catalog summaries], "skipped": [catalog names]}. Raises ValueError for bad
+    # years or partitions and CatalogExists when a catalog exists and if_exists is "fail".
+    if device_id is None:
+        device_id = get_device_id("device_id.json")  # Get the device id
+    print("device_id",device_id)
+
+    # Compile the ignore list once; ignored directories are pruned during the search
+    ignore_matcher = IgnoreMatcher(list(ignore_list))
+
+    # Record the directory listings so later updates of this catalog can skip unchanged directories
+    scan_manifest = ScanManifest(CATALOG_EXTENSIONS)
+
+    # Hash and metadata caches are kept next to the catalog
+    cache_dir = os.path.dirname(sqlite_file) if sqlite_file else catalog_path
+
+    # Catalogs to write: one for the whole range, or one per partition
+    if partitions:
+        year_ranges = parse_partitions(partitions, start_year, end_year)
+    else:
+        check_year_range(start_year, end_year)
+        year_ranges = [(start_year, end_year)]
+    # only the partition years: files from the gaps between partitions go into no catalog, so they are
+    # not hashed, and their copies do not count when picking canonical files
+    years = {year for partition_start, partition_end in year_ranges for year in range(partition_start, partition_end + 1)}
+
+    # One traversal serves every partition
+    image_files = scan_image_files(search_path, ignore_matcher, manifest=scan_manifest)
+    if exif:
+        # Images are selected by the year they were taken, read from the EXIF header; images without
+        # a capture date fall back to their modification year
+        metadata = image_metadata(image_files, metadata_cache_path_for(cache_dir))
+    else:
+        metadata = {}
+    image_files = [image_file for image_file in image_files if capture_year(image_file, metadata) in years]
+
+    # Find identical copies by content; hashes are cached next to the catalog, by path, mtime and size
+    content_hashes = {}
+    if content_hash or duplicates_file or canonical_only:
+        image_files, content_hashes = deduplicate_image_files(
+            image_files, hash_cache_path_for(cache_dir), content_hash, duplicates_file, canonical_only)
+
+    # Perceptual hashes of resized and re-encoded copies differ in only a few bits
+    phashes = {}
+    if phash:
+        from perceptual_hash import perceptual_hashes
+        phashes = perceptual_hashes(image_files, hash_cache_path_for(cache_dir))
+
+    # Bucket the images by year once, then write each partition from its years
+    files_by_year = {}
+    for image_file in image_files:
+        files_by_year.setdefault(capture_year(image_file, metadata), []).append(image_file)
+
+    results = {"created": [], "skipped": []}
+    for partition_start, partition_end in year_ranges:
+        partition_files = sorted(image_file for year in range(partition_start, partition_end + 1)
+                                 for image_file in files_by_year.get(year, []))
+        created = create_catalog(catalog_path, sqlite_file, partition_start, partition_end, partition_files, device_id,
+                                 content_hashes if content_hash else None, phashes if phash else None,
+                                 metadata if exif else None, scan_manifest, if_exists)
+        if created is None:
+            results["skipped"].append(catalog_name(partition_start, partition_end))
+        else:
+            results["created"].append(created)
+    return results
+
+
+def main():
+    # Create the argument parser
+    parser = argparse.ArgumentParser(description='Search for images within a date range and write metadata to a JSON file.')
+    parser.add_argument('--catalog_path', required=True, help='Path to the directory where the JSON catalog will be saved.')
+    parser.add_argument('--search_path', required=True, help='Path to the directory to search for image files.')
+    parser.add_argument('--start_year', type=int, required=False, help='Starting year of the date range. Not needed when --partitions lists the ranges.')
+    parser.add_argument('--end_year', type=int, required=False, help='Ending year of the date range. Not needed when --partitions lists the ranges.')
+    parser.add_argument('--ignore_file', type=str, required=False, help='Text file name with paths to ignore.')
+    parser.add_argument('--sqlite_file', type=str, required=False, help='Write the catalog into this SQLite catalog file instead of a JSON file.')
+    parser.add_argument('--content_hash', action='store_true', help='Store a content hash of each image file in its record.')
+    parser.add_argument('--duplicates_file', type=str, required=False, help='JSON file to write the groups of identical image files to.')
+    parser.add_argument('--canonical_only', action='store_true', help='Catalog only one copy of identical image files.')
+    parser.add_argument('--phash', action='store_true', help='Store a perceptual hash of each image for finding near-duplicates.')
+    parser.add_argument('--exif', action='store_true', help='Read the capture date, camera, size and GPS position from the image headers and select images by capture year.')
+    parser.add_argument('--partitions', type=str, required=False, help='Write several catalogs from one scan: "yearly" (start_year to end_year) or ranges such as 2015-2017,2018,2019-2023.')
+    parser.add_argument('--if_exists', choices=IF_EXISTS_CHOICES, default='ask', help='When a catalog already exists: ask in a message box (default), overwrite it, skip it, or fail. Only "ask" needs a display.')
+    profiling.add_arguments(parser)
+
+    # Parse the arguments
+    args = parser.parse_args()
+    profiling.enable(args.profile, args.cprofile)
+
+    ignore_list = read_ignore_list(args.ignore_file)
+    print("ignore_list =", ignore_list)
+    print("Getting catalog items...")
+    print("start_year=", args.start_year, "end_year=", args.end_year,  "catalog_path=", args.catalog_path, "search_path=", args.search_path )
 
-# Convert total size to megabytes and gigabytes
-total_size_mb = total_size / (1024 * 1024)
-total_size_gb = total_size_mb / 1024
+    try:
+        results = create_catalogs(args.catalog_path, args.search_path, args.start_year, args.end_year, ignore_list,
+                                  sqlite_file=args.sqlite_file, partitions=args.partitions,
+                                  content_hash=args.content_hash, duplicates_file=args.duplicates_file,
+                                  canonical_only=args.canonical_only, phash=args.phash, exif=args.exif,
+                                  if_exists=args.if_exists)
+    except (ValueError, CatalogExists) as e:
+        print("Error:", str(e))
+        exit(1)
 
-# Print a message indicating that the output has been written to the JSON file, along with the total number of files and total size
-print(f"Image file paths written to {catalog_path}{output_filename}")
-print(f"Total number of images: {len(image_files)}")
-print(f"Total size: {total_size} bytes, {total_size_mb:.2f} MB, {total_size_gb:.2f} GB")
-messagebox.showinfo("Catalog Created", output_filename)
+    created = [catalog["catalog"] if args.sqlite_file else os.path.basename(catalog["file"]) for catalog in results["created"]]
+    if args.if_exists != "ask":
+        print("Catalogs created:", ", ".join(created) if created else "none")
+        return
 
+    from tkinter import messagebox
+    if not results["created"] and not args.partitions:
+        messagebox.showinfo("Exiting Program", "Exiting program...")
+        exit(0)
+    messagebox.showinfo("Catalog Created", "\n".join(created) if created else "No catalog created.")
 
-    
-# End of script
 
+if __name__ == "__main__":
+    main()
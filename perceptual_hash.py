@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from preview_loader import load_preview
+from content_hash import HashCache
+import profiling
+
+# dHash of HASH_SIZE x HASH_SIZE bits (64 bits, 16 hex digits)
+HASH_SIZE = 8
+
+# Hashes at most this many bits apart are shown as near-duplicates
+NEAR_DUPLICATE_DISTANCE = 10
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    # Difference hash: the image reduced to (hash_size + 1) x hash_size grey pixels, one bit per
+    # pair of horizontal neighbours (left brighter than right or not). Resizing and re-encoding
+    # change few bits, so near-duplicates have a small Hamming distance.
+    image = load_preview(image_path, (hash_size * 8, hash_size * 8))
+    image = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, :-1] > pixels[:, 1:]
+    return np.packbits(bits).tobytes().hex()
+
+
+def dhash_or_none(image_path):
+    # process pool worker; unreadable images get no hash
+    try:
+        return dhash(image_path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+@profiling.traced("perceptual_hashes")
+def perceptual_hashes(image_files, hash_cache_file_path, max_workers=None):
+    # {path: dHash} for ImageFile entries. Decoding is CPU bound, so it runs in a process pool;
+    # hashes are cached with the content hashes, by path, mtime and size.
+    hash_cache = HashCache.load(hash_cache_file_path)
+    results = {}
+    missing = []
+    for image_file in image_files:
+        value = hash_cache.get(image_file, "phash")
+        if value is None:
+            missing.append(image_file)
+        else:
+            results[image_file.path] = value
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            paths = [image_file.path for image_file in missing]
+            for image_file, value in zip(missing, executor.map(dhash_or_none, paths, chunksize=32)):
+                if value is not None:
+                    hash_cache.set(image_file, "phash", value)
+                    results[image_file.path] = value
+
+    hash_cache.save(hash_cache_file_path)
+    print(f"Perceptual hashes: {len(missing)} computed, {len(image_files) - len(missing)} reused from cache")
+    return results
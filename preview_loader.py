@@ -0,0 +1,25 @@
+def preview_size(size, box):
+    # fit size into box = (max_width, max_height) keeping the aspect ratio, never enlarging;
+    # None leaves that side unbounded
+    width, height = size
+    max_width = box[0] or width
+    max_height = box[1] or height
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_preview(image_path, box):
+    # Decode an image scaled down to fit box. JPEG files are decoded at 1/2, 1/4 or 1/8 scale
+    # by the decoder itself (draft mode), so a 24 MP photo never exists at full size in memory.
+    # Other formats cannot decode at a reduced size and are fully decoded before resizing.
+    # Pillow is imported on the first decode, not when the app starts.
+    from PIL import Image
+    with Image.open(image_path) as image:
+        target_size = preview_size(image.size, box)
+        if image.format == "JPEG":
+            # draft picks the smallest scale that still is at least target_size
+            image.draft(image.mode, target_size)
+        image.load()
+        if image.size != target_size:
+            return image.resize(target_size)
+        return image
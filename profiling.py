@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+
+# Environment variables that turn profiling on without a command line flag
+TRACE_ENV = "IMAGE_CATALOGER_PROFILE"
+CPROFILE_ENV = "IMAGE_CATALOGER_CPROFILE"
+
+# Profiling state. While disabled, span() hands out one shared do-nothing context manager and
+# count() returns at once, so instrumented code pays only a global lookup and a call.
+enabled = False
+trace_file_path = None
+events = []
+counters = {}
+counters_lock = threading.Lock()
+profiler = None
+cprofile_file_path = None
+start_time = time.perf_counter()
+
+
+class NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    # one complete ("X") trace event, timed from __enter__ to __exit__
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": round((self.start - start_time) * 1e6, 1),
+            "dur": round((end - self.start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        events.append(event)
+        return False
+
+
+def span(name, **args):
+    # with profiling.span("merge"): ...
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def traced(name):
+    # decorator: a span around every call of the function
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Span(name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    # add to a named counter; the totals are written as counter events when the trace is saved
+    if not enabled:
+        return
+    with counters_lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+def enable(trace_file=None, cprofile_file=None):
+    # Turn profiling on for this process. trace_file/cprofile_file default to the environment
+    # variables; nothing is enabled when neither is set. The files are written at exit.
+    global enabled, trace_file_path, profiler, cprofile_file_path
+    trace_file = trace_file or os.environ.get(TRACE_ENV)
+    cprofile_file = cprofile_file or os.environ.get(CPROFILE_ENV)
+    if not trace_file and not cprofile_file:
+        return False
+
+    if trace_file and not enabled:
+        enabled = True
+        trace_file_path = trace_file
+        atexit.register(write_trace)
+    if cprofile_file and profiler is None:
+        import cProfile
+        cprofile_file_path = cprofile_file
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(write_cprofile)
+    return True
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', metavar='TRACE_FILE', help=f'Write a Chrome trace (chrome://tracing, Perfetto) of the run phases to this file. Also set by {TRACE_ENV}.')
+    parser.add_argument('--cprofile', metavar='PROFILE_FILE', help=f'Write a cProfile dump of the main thread to this file. Also set by {CPROFILE_ENV}.')
+
+
+def trace():
+    # the trace in Chrome trace-event format
+    counter_time = round((time.perf_counter() - start_time) * 1e6, 1)
+    with counters_lock:
+        counter_events = [{"name": name, "ph": "C", "ts": counter_time, "pid": os.getpid(), "args": {name: value}}
+                          for name, value in sorted(counters.items())]
+    return {"traceEvents": list(events) + counter_events, "displayTimeUnit": "ms"}
+
+
+def write_trace():
+    if not trace_file_path:
+        return
+    with open(trace_file_path, "w", encoding="utf-8") as trace_file:
+        json.dump(trace(), trace_file)
+    print(f"Profile trace written to {trace_file_path} ({len(events)} spans)", file=sys.stderr)
+
+
+def write_cprofile():
+    if profiler is None:
+        return
+    profiler.disable()
+    profiler.dump_stats(cprofile_file_path)
+    print(f"cProfile written to {cprofile_file_path}", file=sys.stderr)
@@ -0,0 +1,88 @@
+import os
+import json
+import threading
+
+# Bump when the layout of the manifest file changes
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(catalog_file_path, catalog_name=None):
+    # detail_2023.json -> detail_2023.manifest.json, next to the catalog. A SQLite catalog file holds
+    # catalogs updated from different search paths, so each has its own manifest:
+    # catalog.db, detail_2023 -> catalog.detail_2023.manifest.json
+    base_path = os.path.splitext(catalog_file_path)[0]
+    if catalog_name:
+        base_path += "." + catalog_name
+    return base_path + ".manifest.json"
+
+
+class ScanManifest:
+    # Directory listings from the previous scan, keyed by directory path.
+    # Each entry holds the directory's mtime, the image files it contributed (name, size, mtime, ctime)
+    # and its subdirectory names. A directory whose mtime has not changed has the same entries,
+    # so the scanner reuses its listing instead of reading it again and only stats its subdirectories.
+    # Files edited in place (which does not touch the directory mtime) keep their previous size/mtime
+    # until the next full rescan.
+
+    def __init__(self, extensions, directories=None):
+        self.extensions = sorted(ext.lower() for ext in extensions)
+        self.previous = directories or {}
+        self.current = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, manifest_file_path, extensions):
+        # an unreadable or mismatching manifest is treated as empty, which makes the scan a full one
+        manifest = cls(extensions)
+        try:
+            with open(manifest_file_path, encoding='utf-8') as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get("version") == MANIFEST_VERSION and data.get("extensions") == manifest.extensions:
+            manifest.previous = data.get("directories", {})
+        return manifest
+
+    def previous_file_count(self):
+        # image files listed by the previous scan, an estimate of what this scan will find
+        return sum(len(entry[1]) for entry in self.previous.values())
+
+    def cached_listing(self, directory):
+        # returns (directory mtime, listing from the previous scan or None)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None, None
+
+        entry = self.previous.get(directory)
+        if entry is not None and entry[0] == mtime:
+            with self.lock:
+                self.hits += 1
+                self.current[directory] = entry
+            return mtime, (entry[1], entry[2])
+
+        with self.lock:
+            self.misses += 1
+        return mtime, None
+
+    def record(self, directory, mtime, listing):
+        if mtime is None:
+            return
+        files, subdirs = listing
+        with self.lock:
+            self.current[directory] = [mtime, files, subdirs]
+
+    def save(self, manifest_file_path):
+        # only directories seen by this scan are kept; write to a temporary file, then replace
+        data = {
+            "version": MANIFEST_VERSION,
+            "extensions": self.extensions,
+            "directories": self.current
+        }
+        temp_file_path = f"{manifest_file_path}.{os.getpid()}.tmp"
+        with open(temp_file_path, "w", encoding='utf-8') as manifest_file:
+            json.dump(data, manifest_file, separators=(",", ":"))
+        os.replace(temp_file_path, manifest_file_path)
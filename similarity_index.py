@@ -0,0 +1,58 @@
+from itertools import combinations
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    # Hamming-distance index over fixed-width integer hashes (64-bit dHash by default).
+    # Each hash is split into `blocks` chunks and filed under every chunk value. Two hashes within
+    # max_distance bits differ in at least one chunk by at most max_distance // blocks bits
+    # (pigeonhole), so a search only looks up the chunk values within that many bits of the
+    # query's chunks and checks the full distance of the few hashes filed there.
+
+    def __init__(self, bits=64, blocks=4):
+        self.block_bits = bits // blocks
+        self.block_mask = (1 << self.block_bits) - 1
+        self.tables = [{} for _ in range(blocks)]
+        self.flip_masks = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def chunks(self, value):
+        return [(value >> (block * self.block_bits)) & self.block_mask for block in range(len(self.tables))]
+
+    def add(self, value, item):
+        for table, chunk in zip(self.tables, self.chunks(value)):
+            table.setdefault(chunk, []).append((value, item))
+        self.size += 1
+
+    def masks_within(self, distance):
+        # every block_bits-wide mask with at most `distance` bits set
+        if distance not in self.flip_masks:
+            masks = [0]
+            for bit_count in range(1, distance + 1):
+                for bits in combinations(range(self.block_bits), bit_count):
+                    masks.append(sum(1 << bit for bit in bits))
+            self.flip_masks[distance] = masks
+        return self.flip_masks[distance]
+
+    def search(self, value, max_distance):
+        # [(distance, item)] for every item within max_distance bits of value
+        masks = self.masks_within(max_distance // len(self.tables))
+        results = []
+        seen = set()
+        for table, chunk in zip(self.tables, self.chunks(value)):
+            for mask in masks:
+                for candidate, item in table.get(chunk ^ mask, ()):
+                    key = (candidate, item)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = hamming_distance(value, candidate)
+                    if distance <= max_distance:
+                        results.append((distance, item))
+        return results
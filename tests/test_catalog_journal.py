@@ -0,0 +1,120 @@
+import os
+import json
+import tempfile
+import unittest
+
+from catalog_journal import CatalogJournal, JournalEdits, journal_path_for, write_json_catalog
+
+RECORDS = [{"source": "/pictures/a.jpg", "title": ""}, {"source": "/pictures/b.jpg", "title": ""},
+           {"source": "C:/Pictures/C.jpg", "title": ""}]
+
+
+class JournalEditsTest(unittest.TestCase):
+
+    def apply(self, journal_edits, records=RECORDS, parent_key="detail_2020"):
+        return list(journal_edits.apply(parent_key, records))
+
+    def test_no_edits(self):
+        journal_edits = JournalEdits()
+        self.assertFalse(journal_edits)
+        self.assertEqual(self.apply(journal_edits), RECORDS)
+
+    def test_latest_update_wins(self):
+        journal_edits = JournalEdits()
+        journal_edits.update("detail_2020", {"source": "/pictures/a.jpg", "title": "first"})
+        journal_edits.update("detail_2020", {"source": "/pictures/a.jpg", "title": "second"})
+        self.assertEqual(self.apply(journal_edits)[0], {"source": "/pictures/a.jpg", "title": "second"})
+
+    def test_remove(self):
+        journal_edits = JournalEdits()
+        journal_edits.remove("detail_2020", "/pictures/b.jpg")
+        self.assertEqual(self.apply(journal_edits), [RECORDS[0], RECORDS[2]])
+
+    def test_update_after_remove_is_ignored(self):
+        journal_edits = JournalEdits()
+        journal_edits.remove("detail_2020", "/pictures/a.jpg")
+        journal_edits.update("detail_2020", {"source": "/pictures/a.jpg", "title": "edited"})
+        self.assertEqual(self.apply(journal_edits), RECORDS[1:])
+
+    def test_remove_after_update(self):
+        journal_edits = JournalEdits()
+        journal_edits.update("detail_2020", {"source": "/pictures/a.jpg", "title": "edited"})
+        journal_edits.remove("detail_2020", "/pictures/a.jpg")
+        self.assertEqual(self.apply(journal_edits), RECORDS[1:])
+
+    def test_sources_are_normalized(self):
+        # backslashes match forward slashes; drive paths compare case-insensitively
+        journal_edits = JournalEdits()
+        journal_edits.update("detail_2020", {"source": "c:\\pictures\\c.JPG", "title": "edited"})
+        self.assertEqual(self.apply(journal_edits)[2], {"source": "c:\\pictures\\c.JPG", "title": "edited"})
+
+    def test_edits_are_per_catalog(self):
+        journal_edits = JournalEdits()
+        journal_edits.remove("detail_2021", "/pictures/a.jpg")
+        self.assertEqual(self.apply(journal_edits), RECORDS)
+
+    def test_updates_do_not_add_records(self):
+        journal_edits = JournalEdits()
+        journal_edits.update("detail_2020", {"source": "/pictures/new.jpg"})
+        self.assertEqual(self.apply(journal_edits), RECORDS)
+
+
+class CatalogJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalog_file_path = os.path.join(self.temp_dir.name, "detail_2020.json")
+        self.journal = CatalogJournal(self.catalog_file_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_journal_path(self):
+        self.assertEqual(journal_path_for(os.path.join("dir", "detail_2020.json")),
+                         os.path.join("dir", "detail_2020.journal.jsonl"))
+
+    def test_entries_round_trip(self):
+        self.assertEqual(list(self.journal.entries()), [])
+        self.journal.record_updated("detail_2020", {"source": "/pictures/a.jpg", "title": "\u00e9dit\u00e9"})
+        self.journal.record_removed("detail_2020", "/pictures/b.jpg")
+        self.assertEqual(list(self.journal.entries()), [
+            {"op": "update", "catalog": "detail_2020", "record": {"source": "/pictures/a.jpg", "title": "\u00e9dit\u00e9"}},
+            {"op": "remove", "catalog": "detail_2020", "source": "/pictures/b.jpg"},
+        ])
+
+    def test_truncated_tail_is_ignored(self):
+        self.journal.record_removed("detail_2020", "/pictures/a.jpg")
+        with open(self.journal.journal_file_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write('{"op": "remove", "catalog": "detail_2020", "sou')
+        self.assertEqual(list(self.journal.entries()),
+                         [{"op": "remove", "catalog": "detail_2020", "source": "/pictures/a.jpg"}])
+        self.assertEqual(list(CatalogJournal(self.catalog_file_path).pending().apply("detail_2020", RECORDS)),
+                         RECORDS[1:])
+
+    def test_append_after_truncated_tail(self):
+        # a new journal object (the next session) cuts the partial line before appending
+        self.journal.record_removed("detail_2020", "/pictures/a.jpg")
+        with open(self.journal.journal_file_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write('{"op": "upd')
+        journal = CatalogJournal(self.catalog_file_path)
+        journal.record_removed("detail_2020", "/pictures/b.jpg")
+        self.assertEqual([entry["source"] for entry in journal.entries()], ["/pictures/a.jpg", "/pictures/b.jpg"])
+
+    def test_pending(self):
+        self.journal.record_updated("detail_2020", {"source": "/pictures/b.jpg", "title": "edited"})
+        self.journal.record_removed("detail_2020", "/pictures/a.jpg")
+        self.journal.record_updated("detail_2020", {"source": "/pictures/a.jpg", "title": "too late"})
+        self.assertEqual(list(self.journal.pending().apply("detail_2020", RECORDS)),
+                         [{"source": "/pictures/b.jpg", "title": "edited"}, RECORDS[2]])
+
+    def test_write_json_catalog_drops_journal(self):
+        self.journal.record_removed("detail_2020", "/pictures/a.jpg")
+        write_json_catalog(self.catalog_file_path, {"detail_2020": RECORDS}, indent=4)
+        self.assertEqual(self.journal.size(), 0)
+        with open(self.catalog_file_path, encoding="utf-8") as catalog_file:
+            self.assertEqual(json.load(catalog_file), {"detail_2020": RECORDS})
+        self.assertEqual([name for name in os.listdir(self.temp_dir.name)], ["detail_2020.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
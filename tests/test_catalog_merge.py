@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from catalog_merge import diff_records, merge_catalog, merge_records, normalize_source
+
+
+def record(source, date_modified="2020-01-01 00:00:00", **fields):
+    return dict({"source": source, "date_modified": date_modified}, **fields)
+
+
+EXISTING = [
+    record("C:/Pictures/a.jpg", title="kept"),
+    record("C:/Pictures/b.jpg"),
+    record("/home/p/c.jpg"),
+]
+
+
+class NormalizeSourceTest(unittest.TestCase):
+
+    def test_drive_paths_fold_case_and_slashes(self):
+        self.assertEqual(normalize_source("C:\\Pictures\\A.JPG"), "c:/pictures/a.jpg")
+        self.assertEqual(normalize_source("c:/pictures/a.jpg"), "c:/pictures/a.jpg")
+
+    @unittest.skipIf(os.name == "nt", "every path is case-insensitive on Windows")
+    def test_other_paths_keep_case(self):
+        self.assertEqual(normalize_source("/home/p/C.jpg"), "/home/p/C.jpg")
+
+
+class DiffRecordsTest(unittest.TestCase):
+
+    def test_changes(self):
+        found = [
+            record("c:\\pictures\\A.jpg"),
+            record("C:/Pictures/b.jpg", "2021-05-05 00:00:00"),
+            record("/home/p/new.jpg"),
+        ]
+        added, stats = diff_records(iter(EXISTING), found)
+        self.assertEqual(added, [found[2]])
+        self.assertEqual(stats["changes"], {
+            "added": ["/home/p/new.jpg"],
+            # existing records are reported by their catalog source
+            "unchanged": ["C:/Pictures/a.jpg"],
+            "modified": ["C:/Pictures/b.jpg"],
+            "vanished": ["/home/p/c.jpg"],
+        })
+        self.assertEqual({key: stats[key] for key in ("added", "unchanged", "modified", "vanished", "existing",
+                                                      "found", "total")},
+                         {"added": 1, "unchanged": 1, "modified": 1, "vanished": 1, "existing": 3, "found": 3,
+                          "total": 4})
+
+    def test_file_found_twice_is_added_once(self):
+        added, stats = diff_records([], [record("C:/Pictures/x.jpg"), record("C:\\Pictures\\x.jpg")])
+        self.assertEqual(added, [record("C:/Pictures/x.jpg")])
+        self.assertEqual(stats["found"], 1)
+
+    def test_duplicate_existing_source_compares_first_copy(self):
+        existing = [record("/p/a.jpg", "2020-01-01 00:00:00"), record("/p/a.jpg", "2021-01-01 00:00:00")]
+        _, stats = diff_records(existing, [record("/p/a.jpg", "2020-01-01 00:00:00")])
+        self.assertEqual(stats["unchanged"], 1)
+        self.assertEqual(stats["modified"], 0)
+
+    def test_records_without_source_are_counted_only(self):
+        added, stats = diff_records([{"title": "no source"}], [])
+        self.assertEqual((added, stats["existing"], stats["vanished"]), ([], 1, 0))
+
+
+class MergeTest(unittest.TestCase):
+
+    def test_merge_records_appends_new_records(self):
+        found = [record("C:/Pictures/a.jpg", "2022-01-01 00:00:00"), record("/p/new.jpg")]
+        merged, stats = merge_records(EXISTING, found)
+        # existing records are kept as they are, even when the file changed
+        self.assertEqual(merged, EXISTING + [found[1]])
+        self.assertEqual(stats["total"], 4)
+
+    def test_merge_catalog(self):
+        catalog = {"device_id": "x"}
+        stats = merge_catalog(catalog, "detail_2020", [record("/p/a.jpg")])
+        self.assertEqual(catalog, {"device_id": "x", "detail_2020": [record("/p/a.jpg")]})
+        self.assertEqual((stats["catalog"], stats["added"]), ("detail_2020", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from catalog_model import CatalogModel
+
+
+class RecordedStore:
+    # stands in for JsonCatalogFile / SqliteCatalogStore
+    def __init__(self):
+        self.calls = []
+
+    def record_updated(self, model, parent_key, record):
+        self.calls.append(("update", parent_key, record["source"]))
+
+    def record_removed(self, model, parent_key, source):
+        self.calls.append(("remove", parent_key, source))
+
+
+def record(source, **fields):
+    return dict({"source": source, "title": ""}, **fields)
+
+
+class CatalogModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = RecordedStore()
+        self.model = CatalogModel({
+            "device_id": "x",
+            "detail_2020": [record("/p/a.jpg"), record("/p/b.jpg"), record("/p/c.jpg")],
+            "detail_2021": [record("/p/b.jpg"), record("/p/d.jpg")],
+        }, self.store)
+
+    def test_find(self):
+        self.assertEqual(self.model.find("/p/c.jpg"), ("detail_2020", record("/p/c.jpg")))
+        self.assertEqual(self.model.find("/p/d.jpg"), ("detail_2021", record("/p/d.jpg")))
+        self.assertEqual(self.model.find("/p/missing.jpg"), (None, None))
+
+    def test_trash_keeps_other_catalogs_paths(self):
+        self.assertEqual(list(self.model.paths), ["/p/a.jpg", "/p/b.jpg", "/p/c.jpg", "/p/b.jpg", "/p/d.jpg"])
+        self.model.trash_record("detail_2021", "/p/b.jpg")
+        self.assertEqual(list(self.model.paths), ["/p/a.jpg", "/p/b.jpg", "/p/c.jpg", "/p/d.jpg"])
+        self.assertEqual(self.store.calls, [("remove", "detail_2021", "/p/b.jpg")])
+
+    def test_trash_moves_later_records(self):
+        self.model.trash_record("detail_2020", "/p/a.jpg")
+        self.assertEqual(self.model.position("detail_2020", "/p/b.jpg"), 0)
+        self.assertEqual(self.model.position("detail_2020", "/p/c.jpg"), 1)
+        self.assertIsNone(self.model.position("detail_2020", "/p/a.jpg"))
+        self.assertFalse(self.model.remove_record("detail_2020", "/p/a.jpg"))
+
+    def test_duplicate_source_keeps_first_position(self):
+        model = CatalogModel({"detail_2020": [record("/p/a.jpg", title="first"), record("/p/b.jpg"),
+                                              record("/p/a.jpg", title="second")]})
+        self.assertEqual(model.position("detail_2020", "/p/a.jpg"), 0)
+        model.remove_record("detail_2020", "/p/a.jpg")
+        # the later copy is found once the first one is gone
+        self.assertEqual(model.position("detail_2020", "/p/a.jpg"), 1)
+        self.assertEqual(model.find("/p/a.jpg")[1]["title"], "second")
+
+    def test_equal_hashes_are_told_apart(self):
+        with mock.patch("catalog_model.hash", lambda key: 0, create=True):
+            model = CatalogModel({"detail_2020": [record("/p/a.jpg"), record("/p/b.jpg"), record("/p/c.jpg")]})
+            self.assertEqual([model.position("detail_2020", source) for source in ("/p/c.jpg", "/p/a.jpg", "/p/x.jpg")],
+                             [2, 0, None])
+            model.remove_record("detail_2020", "/p/b.jpg")
+            self.assertEqual(model.position("detail_2020", "/p/c.jpg"), 1)
+
+    def test_sources_are_normalized(self):
+        model = CatalogModel({"detail_2020": [record("C:/Pictures/A.jpg")]})
+        self.assertEqual(model.find("c:\\pictures\\a.JPG")[0], "detail_2020")
+
+    def test_update_keeps_stored_fields(self):
+        self.model.json_data["detail_2020"][0]["phash"] = "00ff"
+        self.model.update_record("detail_2020", record("/p/a.jpg", title="edited"))
+        self.assertEqual(self.model.find("/p/a.jpg")[1], record("/p/a.jpg", title="edited", phash="00ff"))
+        self.assertEqual(self.store.calls, [("update", "detail_2020", "/p/a.jpg")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import json
+import tempfile
+import unittest
+
+from catalog_journal import CatalogJournal
+from catalog_sqlite import SqliteCatalogStore
+from scan_manifest import manifest_path_for
+
+RECORDS = [
+    {"source": "C:/Pictures/2020/a.jpg", "title": "", "timestamp": 2},
+    {"source": "C:/Pictures/2020/b.jpg", "title": "", "timestamp": 1},
+]
+
+
+class SqliteCatalogStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SqliteCatalogStore(os.path.join(self.temp_dir.name, "catalog.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def write_catalog(self, name, json_data):
+        with open(self.path(name), "w", encoding="utf-8") as catalog_file:
+            json.dump(json_data, catalog_file, indent=4)
+        return self.path(name)
+
+    def test_round_trip_keeps_types_and_key_order(self):
+        records = [
+            {"title": "t", "source": "C:/Pictures/a.jpg", "for_sale": True, "price": 1, "timestamp": 1.0,
+             "media": None, "year_of_work": False, "location": 2 ** 70, "tags": ["a", {"b": True}], "phash": "00ff"},
+            {"source": "/p/b.jpg", "price": 12.5, "artist": "-1", "category": -2 ** 63, "description": ""},
+        ]
+        self.store.add_records("detail_2020", records)
+        self.assertEqual(self.store.records("detail_2020"), records)
+        self.assertEqual([list(record) for record in self.store.records("detail_2020")], [list(record) for record in records])
+        self.assertEqual([type(value) for value in self.store.records("detail_2020")[0].values()],
+                         [type(value) for value in records[0].values()])
+
+    def test_update_and_delete(self):
+        self.store.add_records("detail_2020", RECORDS)
+        self.assertTrue(self.store.update_record("detail_2020", dict(RECORDS[1], title="edited", for_sale=False)))
+        self.assertFalse(self.store.update_record("detail_2021", RECORDS[1]))
+        self.assertTrue(self.store.delete_record("detail_2020", "c:\\pictures\\2020\\A.JPG"))
+        self.assertEqual(self.store.records("detail_2020"), [dict(RECORDS[1], title="edited", for_sale=False)])
+        # a source already in the catalog is not added twice
+        self.assertEqual(self.store.add_records("detail_2020", RECORDS), 1)
+
+    def test_manifest_per_catalog(self):
+        self.assertEqual(manifest_path_for(self.path("detail_2020.json")), self.path("detail_2020.manifest.json"))
+        self.assertEqual(manifest_path_for(self.path("catalog.db"), "detail_2020"),
+                         self.path("catalog.detail_2020.manifest.json"))
+        self.assertNotEqual(manifest_path_for(self.path("catalog.db"), "detail_2020"),
+                            manifest_path_for(self.path("catalog.db"), "detail_2021"))
+
+    def test_import_applies_pending_journal(self):
+        catalog_file_path = self.write_catalog("detail_2020.json", {"device_id": "x", "detail_2020": RECORDS})
+        journal = CatalogJournal(catalog_file_path)
+        journal.record_updated("detail_2020", dict(RECORDS[0], title="edited"))
+        journal.record_removed("detail_2020", "C:\\Pictures\\2020\\b.jpg")
+
+        self.assertEqual(self.store.import_json(catalog_file_path), {"detail_2020": 1})
+        self.assertEqual(self.store.load(), {"detail_2020": [dict(RECORDS[0], title="edited")]})
+
+    def test_export_replaces_file_and_drops_stale_journal(self):
+        self.store.add_records("detail_2020", RECORDS)
+        json_file_path = self.write_catalog("export.json", {"detail_2020": []})
+        CatalogJournal(json_file_path).record_removed("detail_2020", RECORDS[0]["source"])
+
+        self.assertEqual(self.store.export_json(json_file_path), {"detail_2020": 2})
+        with open(json_file_path, encoding="utf-8") as json_file:
+            self.assertEqual(json.load(json_file), {"detail_2020": RECORDS})
+        self.assertEqual(CatalogJournal(json_file_path).size(), 0)
+        self.assertEqual([name for name in os.listdir(self.temp_dir.name) if name.startswith("export")], ["export.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import catalog_stream
+from catalog_journal import CatalogJournal
+from catalog_stream import (CatalogStreamReader, append_catalog_records, compact_catalog, iter_catalogs,
+                            load_catalog_records, write_catalog_stream)
+from image_record import ImageRecord
+
+CATALOG = {
+    "device_id": "3f2b9c1e",
+    "settings": {"nested": [1, 2.5, None, True], "text": "a \"quoted\" \\ value"},
+    "detail_2020": [
+        {"source": "C:/Pictures/2020/IMG_0001.jpg", "title": "Caf\u00e9 \u2603", "price": 123456789},
+        {"source": "C:/Pictures/2020/IMG_0002.jpg", "title": "", "price": -1.25e-3},
+    ],
+    "empty": [],
+    "count": 3,
+    "detail_2021": [{"source": "/home/pictures/2021/a.png", "tags": {"a": [], "b": {}}}],
+}
+
+
+def read_catalogs(text, chunk_size, include_values=True):
+    # every (name, value) pair, with record iterators turned into lists
+    with mock.patch.object(catalog_stream, "CHUNK_SIZE", chunk_size):
+        reader = CatalogStreamReader(io.StringIO(text))
+        return [(name, value if catalog_stream.is_catalog_value(value) else list(value))
+                for name, value in reader.catalogs(include_values)]
+
+
+class CatalogStreamReaderTest(unittest.TestCase):
+
+    def test_values_split_across_chunk_boundaries(self):
+        # every chunk size from one character up puts the boundary inside strings, numbers and escapes
+        for indent in (None, 4):
+            text = json.dumps(CATALOG, indent=indent)
+            for chunk_size in list(range(1, 40)) + [len(text) - 1, len(text), len(text) + 1]:
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(dict(read_catalogs(text, chunk_size)), CATALOG)
+
+    def test_record_lists_only_without_include_values(self):
+        names = [name for name, _ in read_catalogs(json.dumps(CATALOG), 7, include_values=False)]
+        self.assertEqual(names, ["detail_2020", "empty", "detail_2021"])
+
+    def test_unread_records_are_skipped(self):
+        with mock.patch.object(catalog_stream, "CHUNK_SIZE", 5):
+            reader = CatalogStreamReader(io.StringIO(json.dumps(CATALOG)))
+            names = [name for name, _ in reader.catalogs()]
+        self.assertEqual(names, ["detail_2020", "empty", "detail_2021"])
+
+    def test_empty_catalog_file(self):
+        self.assertEqual(read_catalogs("{}", 1), [])
+        self.assertEqual(read_catalogs(" { } ", 1), [])
+
+    def test_truncated_file_raises(self):
+        text = json.dumps(CATALOG)
+        for end in (len(text) // 2, len(text) - 1):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                read_catalogs(text[:end], 16)
+
+    def test_missing_separator_raises(self):
+        with self.assertRaises(ValueError):
+            read_catalogs('{"detail_2020": [{"source": "a"} {"source": "b"}]}', 8)
+
+
+class CatalogStreamFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalog_file_path = os.path.join(self.temp_dir.name, "detail_2020.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_catalog(self, json_data):
+        with open(self.catalog_file_path, "w", encoding="utf-8") as catalog_file:
+            json.dump(json_data, catalog_file, indent=4)
+
+    def read_catalog(self):
+        with open(self.catalog_file_path, encoding="utf-8") as catalog_file:
+            return catalog_file.read()
+
+    def test_write_matches_json_dump(self):
+        self.write_catalog(CATALOG)
+        expected = self.read_catalog()
+        write_catalog_stream(self.catalog_file_path, iter_catalogs(self.catalog_file_path, include_values=True))
+        self.assertEqual(self.read_catalog(), expected)
+
+    def test_append_keeps_other_keys(self):
+        self.write_catalog(CATALOG)
+        append_catalog_records(self.catalog_file_path, "detail_2020", [{"source": "C:/Pictures/2020/new.jpg"}])
+        expected = json.loads(json.dumps(CATALOG))
+        expected["detail_2020"].append({"source": "C:/Pictures/2020/new.jpg"})
+        self.assertEqual(json.loads(self.read_catalog()), expected)
+        self.assertEqual(list(json.loads(self.read_catalog())), list(CATALOG))
+
+    def test_append_adds_missing_catalog(self):
+        self.write_catalog({"device_id": "x"})
+        append_catalog_records(self.catalog_file_path, "detail_2022", [{"source": "/a.jpg"}])
+        self.assertEqual(json.loads(self.read_catalog()), {"device_id": "x", "detail_2022": [{"source": "/a.jpg"}]})
+
+    def test_journal_is_applied_while_reading(self):
+        self.write_catalog(CATALOG)
+        journal = CatalogJournal(self.catalog_file_path)
+        journal.record_updated("detail_2020", {"source": "C:\\Pictures\\2020\\img_0001.jpg", "title": "edited"})
+        journal.record_removed("detail_2021", "/home/pictures/2021/a.png")
+        catalogs = load_catalog_records(self.catalog_file_path)
+        self.assertEqual(catalogs["detail_2020"][0], {"source": "C:\\Pictures\\2020\\img_0001.jpg", "title": "edited"})
+        self.assertEqual(catalogs["detail_2021"], [])
+        self.assertEqual(catalogs["device_id"], CATALOG["device_id"])
+        self.assertTrue(all(isinstance(record, ImageRecord) for record in catalogs["detail_2020"]))
+
+    def test_compact_keeps_records_written_by_other_processes(self):
+        self.write_catalog({"device_id": "x", "detail_2020": [{"source": "/a.jpg", "timestamp": 1},
+                                                             {"source": "/b.jpg", "timestamp": 2}]})
+        journal = CatalogJournal(self.catalog_file_path)
+        journal.record_updated("detail_2020", {"source": "/a.jpg", "title": "edited", "timestamp": 3})
+        # an update run appends a record after the edit; it rewrites the file and drops the journal
+        append_catalog_records(self.catalog_file_path, "detail_2020", [{"source": "/c.jpg", "timestamp": 0}])
+        journal.record_removed("detail_2020", "/b.jpg")
+        compact_catalog(self.catalog_file_path)
+
+        self.assertEqual(json.loads(self.read_catalog()), {"device_id": "x", "detail_2020": [
+            {"source": "/a.jpg", "title": "edited", "timestamp": 3}, {"source": "/c.jpg", "timestamp": 0}]})
+        self.assertEqual(journal.size(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
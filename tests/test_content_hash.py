@@ -0,0 +1,109 @@
+import os
+import json
+import tempfile
+import unittest
+
+from content_hash import (PARTIAL_HASH_BYTES, DuplicateFinder, HashCache, deduplicate_image_files, duplicates_report,
+                          full_hash)
+from image_scanner import ImageFile
+
+
+class DuplicateFinderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.mtime = 1600000000
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def image_file(self, name, data, mtime=None):
+        # an ImageFile as the scanner returns it
+        path = os.path.join(self.temp_dir.name, name).replace("\\", "/")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.mtime = mtime or self.mtime + 1
+        os.utime(path, (self.mtime, self.mtime))
+        stat = os.stat(path)
+        return ImageFile(path, stat.st_size, stat.st_mtime, stat.st_ctime)
+
+    def names(self, duplicate_groups):
+        return sorted([os.path.basename(image_file.path) for image_file in group] for _, group in duplicate_groups)
+
+    def test_groups_identical_files_oldest_first(self):
+        large = os.urandom(3 * PARTIAL_HASH_BYTES)
+        image_files = [
+            self.image_file("copy.jpg", b"same"),
+            self.image_file("original.jpg", b"same", mtime=1500000000),
+            self.image_file("other.jpg", b"diff"),
+            self.image_file("alone.jpg", b"unique size"),
+            self.image_file("large_1.jpg", large),
+            self.image_file("large_2.jpg", large),
+        ]
+        duplicate_groups = DuplicateFinder(max_workers=2).find(image_files)
+        self.assertEqual(self.names(duplicate_groups), [["large_1.jpg", "large_2.jpg"], ["original.jpg", "copy.jpg"]])
+        for content_hash, group in duplicate_groups:
+            self.assertEqual(content_hash, full_hash(group[0].path))
+
+    def test_same_head_and_tail_but_different_middle(self):
+        head, tail = os.urandom(PARTIAL_HASH_BYTES), os.urandom(PARTIAL_HASH_BYTES)
+        image_files = [self.image_file("a.jpg", head + b"a" * 100 + tail), self.image_file("b.jpg", head + b"b" * 100 + tail)]
+        finder = DuplicateFinder()
+        self.assertEqual(finder.find(image_files), [])
+        self.assertEqual(finder.hashed, {"partial": 2, "full": 2})
+
+    def test_different_sizes_are_never_read(self):
+        finder = DuplicateFinder()
+        self.assertEqual(finder.find([self.image_file("a.jpg", b"a"), self.image_file("b.jpg", b"bb")]), [])
+        self.assertEqual(finder.hashed, {"partial": 0, "full": 0})
+
+    def test_full_hashes_replace_the_partial_pass(self):
+        image_files = [self.image_file("a.jpg", b"same"), self.image_file("b.jpg", b"same"),
+                       self.image_file("c.jpg", b"diff")]
+        finder = DuplicateFinder()
+        content_hashes = finder.content_hashes(image_files)
+        self.assertEqual(finder.find(image_files, content_hashes)[0][0], content_hashes[image_files[0].path])
+        self.assertEqual(finder.hashed, {"partial": 0, "full": 3})
+
+    def test_unreadable_files_are_left_out(self):
+        image_files = [self.image_file("a.jpg", b"same"), self.image_file("b.jpg", b"same"),
+                       self.image_file("c.jpg", b"same")]
+        os.remove(image_files[2].path)
+        self.assertEqual(self.names(DuplicateFinder().find(image_files)), [["a.jpg", "b.jpg"]])
+
+    def test_hash_cache(self):
+        image_files = [self.image_file("a.jpg", b"same"), self.image_file("b.jpg", b"same")]
+        hash_cache = HashCache()
+        DuplicateFinder(hash_cache).find(image_files)
+
+        finder = DuplicateFinder(hash_cache)
+        self.assertEqual(len(finder.find(image_files)), 1)
+        self.assertEqual(finder.hashed, {"partial": 0, "full": 0})
+
+        # a changed file is hashed again
+        changed = self.image_file("b.jpg", b"diff")
+        finder = DuplicateFinder(hash_cache)
+        self.assertEqual(finder.find([image_files[0], changed]), [])
+        self.assertEqual(finder.hashed, {"partial": 1, "full": 0})
+
+    def test_deduplicate_image_files(self):
+        image_files = [self.image_file("copy.jpg", b"same"), self.image_file("original.jpg", b"same", mtime=1500000000),
+                       self.image_file("other.jpg", b"diff")]
+        cache_file_path = os.path.join(self.temp_dir.name, "content_hashes.json")
+        duplicates_file = os.path.join(self.temp_dir.name, "duplicates.json")
+        kept, content_hashes = deduplicate_image_files(image_files, cache_file_path, content_hash=True,
+                                                       duplicates_file=duplicates_file, canonical_only=True)
+        self.assertEqual([os.path.basename(image_file.path) for image_file in kept], ["original.jpg", "other.jpg"])
+        self.assertEqual(sorted(content_hashes), sorted(image_file.path for image_file in image_files))
+        with open(duplicates_file, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual((report["groups"], report["duplicate_files"], report["duplicate_bytes"]), (1, 1, 4))
+        self.assertEqual(report["duplicates"][0]["canonical"], image_files[1].path)
+        self.assertEqual(HashCache.load(cache_file_path).get(image_files[0], "full"), content_hashes[image_files[0].path])
+
+    def test_empty_report(self):
+        self.assertEqual(duplicates_report([]), {"groups": 0, "duplicate_files": 0, "duplicate_bytes": 0, "duplicates": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import image_scanner
+from ignore_matcher import IgnoreMatcher, normalize_path, read_ignore_list
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.base = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.base, *parts)
+
+    def test_empty(self):
+        ignore = IgnoreMatcher(["", "   ", "# a comment"])
+        self.assertFalse(ignore)
+        self.assertFalse(ignore.matches(self.path("pictures")))
+
+    def test_path_and_everything_below_it(self):
+        ignore = IgnoreMatcher([self.path("pictures", "private")])
+        self.assertTrue(ignore)
+        self.assertTrue(ignore.matches(self.path("pictures", "private"), is_directory=True))
+        self.assertTrue(ignore.matches(self.path("pictures", "private", "2020", "a.jpg")))
+        self.assertFalse(ignore.matches(self.path("pictures")))
+        self.assertFalse(ignore.matches(self.path("pictures", "public", "a.jpg")))
+
+    def test_components_are_not_prefixes(self):
+        ignore = IgnoreMatcher([self.path("pictures", "pics")])
+        self.assertFalse(ignore.matches(self.path("pictures", "pics2", "a.jpg")))
+        self.assertFalse(ignore.matches(self.path("pictures", "pic")))
+
+    def test_line_formats(self):
+        # trailing slashes, surrounding blanks and backslashes, as in ignore_this.txt
+        ignore = IgnoreMatcher([self.path("downloads") + "/  ", "  " + self.path("app data").replace("/", "\\")])
+        self.assertTrue(ignore.matches(self.path("downloads", "a.jpg")))
+        if os.sep == "\\":
+            self.assertTrue(ignore.matches(self.path("app data", "a.jpg")))
+
+    def test_ancestor_added_after_descendant(self):
+        ignore = IgnoreMatcher([self.path("pictures", "private", "2020"), self.path("pictures", "private")])
+        self.assertTrue(ignore.matches(self.path("pictures", "private", "2021", "a.jpg")))
+        # the descendant's branch was pruned from the trie
+        node = ignore.trie
+        for part in normalize_path(self.path("pictures", "private")).split("/"):
+            node = node[part]
+        self.assertEqual(node, {None: True})
+
+    def test_descendant_added_after_ancestor(self):
+        ignore = IgnoreMatcher([self.path("pictures"), self.path("pictures", "private", "2020")])
+        node = ignore.trie
+        for part in normalize_path(self.path("pictures")).split("/"):
+            node = node[part]
+        self.assertEqual(node, {None: True})
+        self.assertTrue(ignore.matches(self.path("pictures", "other.jpg")))
+
+    def test_patterns(self):
+        ignore = IgnoreMatcher(["*/AppData/*", "*.tmp.jpg"])
+        self.assertTrue(ignore.matches(self.path("user", "AppData", "a.jpg")))
+        self.assertTrue(ignore.matches(self.path("pictures", "a.tmp.jpg")))
+        self.assertFalse(ignore.matches(self.path("pictures", "a.jpg")))
+        # the directory itself is only pruned when it is known to be a directory
+        self.assertFalse(ignore.matches(self.path("user", "AppData")))
+        self.assertTrue(ignore.matches(self.path("user", "AppData"), is_directory=True))
+
+    def test_read_ignore_list(self):
+        self.assertEqual(read_ignore_list(self.path("missing.txt")), [])
+        self.assertEqual(read_ignore_list(None), [])
+        ignore_file = self.path("ignore_this.txt")
+        with open(ignore_file, "w", encoding="utf-8") as f:
+            f.write(self.path("downloads") + "/\n*/AppData/*\n")
+        self.assertEqual(read_ignore_list(ignore_file), [self.path("downloads") + "/", "*/AppData/*"])
+        self.assertTrue(IgnoreMatcher.from_file(ignore_file).matches(self.path("downloads", "a.jpg")))
+
+    def test_scanner_prunes_ignored_directories(self):
+        for parts in (("keep", "a.jpg"), ("skip", "b.jpg"), ("skip", "deep", "c.jpg"), ("keep", "AppData", "d.jpg")):
+            os.makedirs(self.path(*parts[:-1]), exist_ok=True)
+            open(self.path(*parts), "wb").close()
+
+        listed = []
+        list_directory = image_scanner.list_directory
+
+        def recording_list_directory(directory, extensions):
+            listed.append(os.path.normpath(directory))
+            return list_directory(directory, extensions)
+
+        ignore = IgnoreMatcher([self.path("skip"), "*/AppData/*"])
+        for max_workers in (1, 4):
+            listed.clear()
+            with self.subTest(max_workers=max_workers), \
+                    mock.patch.object(image_scanner, "list_directory", recording_list_directory):
+                found = [image_file.path for image_file in image_scanner.scan_images(
+                    self.base, ignore=ignore, max_workers=max_workers)]
+                self.assertEqual([os.path.normpath(path) for path in found], [self.path("keep", "a.jpg")])
+                self.assertEqual(sorted(listed), sorted([os.path.normpath(self.base), self.path("keep")]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import pickle
+import unittest
+
+from image_record import ImageRecord, new_image_record, pack_date, record_to_json, to_image_records, unpack_date
+
+RECORDS = [
+    {"source": "C:/Pictures/2020/IMG_0001.jpg", "device_id": "3f2b", "load_date": "2023-11-06 10:15:00",
+     "date_modified": "2020-01-10 10:08:36", "artist": "", "title": "Caf\u00e9", "media": "Digital Photo",
+     "category": "", "location": "52.520008, 13.404954", "description": "", "year_of_work": "",
+     "for_sale": "No", "price": ""},
+    # edited in the GUI: different key order, numbers, booleans and extra keys
+    {"title": "t", "source": "C:\\Pictures\\b.png", "timestamp": 1700000000.5, "price": 10, "for_sale": True,
+     "date_modified": "2020-01-10", "content_hash": "ab" * 32, "tags": ["a", {"b": None}], "width": 0},
+    # values the date packing must keep as they are
+    {"source": "/p/c.jpg", "date_modified": "2020-01-10 10:08:36\n"},
+    {"source": "/p/d.jpg", "date_modified": "\u0662\u0660\u0662\u0660-01-10 10:08:36"},
+    {"source": "/p/e.jpg", "date_modified": None},
+    {"source": "/p/f.jpg", "date_modified": 20200110100836},
+    # no source, a source that is not a string, a file name without a directory
+    {"title": "no source"},
+    {"source": None, "title": ""},
+    {"source": "g.jpg"},
+    {},
+]
+
+
+class PackDateTest(unittest.TestCase):
+
+    def test_catalog_dates_are_packed(self):
+        self.assertEqual(pack_date("2019-07-04 12:34:56"), 20190704123456)
+        self.assertEqual(unpack_date(20190704123456), "2019-07-04 12:34:56")
+
+    def test_other_values_are_kept(self):
+        for value in ["", "2019-07-04", "0999-07-04 12:34:56", "2019-07-04 12:34:56\n", "2019-07-04T12:34:56",
+                      "\u0662\u0660\u0661\u0669-07-04 12:34:56", None, 20190704123456, 1.5]:
+            with self.subTest(value=value):
+                self.assertEqual(pack_date(value), (value,))
+                self.assertEqual(unpack_date(pack_date(value)), value)
+
+
+class ImageRecordTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for interned in (None, {}):
+            for record in RECORDS:
+                with self.subTest(record=record, interned=interned is not None):
+                    image_record = ImageRecord.from_dict(record, interned)
+                    self.assertEqual(image_record.to_dict(), record)
+                    self.assertEqual(list(image_record), list(record))
+                    self.assertEqual(json.dumps(image_record, default=record_to_json), json.dumps(record))
+                    self.assertEqual(pickle.loads(pickle.dumps(image_record)).to_dict(), record)
+
+    def test_types_are_kept_when_shared(self):
+        # 1 == 1.0 == True, so records differing only in the type of a value must not share their values
+        records = to_image_records([{"source": "/p/a.jpg", "price": 1}, {"source": "/p/b.jpg", "price": True},
+                                    {"source": "/p/c.jpg", "price": 1.0}, {"source": "/p/d.jpg", "price": "1"}])
+        self.assertEqual([type(record["price"]) for record in records], [int, bool, float, str])
+
+    def test_equal_values_are_shared_within_a_load(self):
+        records = to_image_records([dict(RECORDS[0], source=f"C:/Pictures/2020/IMG_{n}.jpg") for n in range(3)])
+        self.assertIs(records[0].fields, records[2].fields)
+        self.assertIs(records[0].source, records[2].source)
+        self.assertEqual(records[2]["source"], "C:/Pictures/2020/IMG_2.jpg")
+
+    def test_dictionary_operations(self):
+        record = ImageRecord.from_dict(RECORDS[0])
+        self.assertIn("title", record)
+        self.assertNotIn("phash", record)
+        self.assertIsNone(record.get("phash"))
+        with self.assertRaises(KeyError):
+            record["phash"]
+
+        record["phash"] = "00ff"
+        record["title"] = "edited"
+        record["source"] = "/p/moved.jpg"
+        record["date_modified"] = "2021-02-03 04:05:06"
+        expected = dict(RECORDS[0], phash="00ff", title="edited", source="/p/moved.jpg",
+                        date_modified="2021-02-03 04:05:06")
+        self.assertEqual(record, expected)
+        self.assertEqual(list(record.keys()), list(expected))
+
+        for key in ("source", "date_modified", "phash", "title"):
+            del record[key]
+            del expected[key]
+        self.assertEqual(record.to_dict(), expected)
+        self.assertEqual(list(record.items()), list(expected.items()))
+        with self.assertRaises(KeyError):
+            del record["source"]
+
+    def test_new_image_record(self):
+        record = new_image_record("/p/a.jpg", "3f2b", "2023-11-06 10:15:00", "2020-01-10 10:08:36")
+        self.assertEqual(record["date_modified"], "2020-01-10 10:08:36")
+        self.assertEqual(len(record), 13)
+        self.assertEqual(record["price"], "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import json
+import tempfile
+import unittest
+
+from image_scanner import CATALOG_EXTENSIONS, scan_image_files
+from scan_manifest import MANIFEST_VERSION, ScanManifest
+
+
+class ScanManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.temp_dir.name, "pictures")
+        self.manifest_file_path = os.path.join(self.temp_dir.name, "detail_2020.manifest.json")
+        for parts in (("a.jpg",), ("2020", "b.png"), ("2020", "notes.txt"), ("2021", "c.gif")):
+            self.write_file(*parts)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write_file(self, *parts, data=b"image"):
+        os.makedirs(os.path.dirname(self.path(*parts)), exist_ok=True)
+        with open(self.path(*parts), "wb") as image_file:
+            image_file.write(data)
+
+    def touch_directory(self, *parts):
+        # a new directory mtime, whatever the file system's timestamp resolution
+        stat = os.stat(self.path(*parts))
+        os.utime(self.path(*parts), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def scan(self, manifest):
+        image_files = scan_image_files(self.root, [], manifest=manifest)
+        manifest.save(self.manifest_file_path)
+        return [os.path.relpath(image_file.path, self.root).replace("\\", "/") for image_file in image_files]
+
+    def load(self):
+        return ScanManifest.load(self.manifest_file_path, CATALOG_EXTENSIONS)
+
+    def test_unchanged_directories_are_reused(self):
+        first = self.scan(ScanManifest(CATALOG_EXTENSIONS))
+        self.assertEqual(first, ["2020/b.png", "2021/c.gif", "a.jpg"])
+
+        manifest = self.load()
+        self.assertEqual(manifest.previous_file_count(), 3)
+        self.assertEqual(self.scan(manifest), first)
+        self.assertEqual((manifest.hits, manifest.misses), (3, 0))
+
+    def test_changed_directory_is_listed_again(self):
+        self.scan(ScanManifest(CATALOG_EXTENSIONS))
+        self.write_file("2020", "d.jpg")
+        os.remove(self.path("2021", "c.gif"))
+        self.touch_directory("2020")
+        self.touch_directory("2021")
+
+        manifest = self.load()
+        self.assertEqual(self.scan(manifest), ["2020/b.png", "2020/d.jpg", "a.jpg"])
+        self.assertEqual((manifest.hits, manifest.misses), (1, 2))
+
+    def test_new_subdirectory_is_found(self):
+        self.scan(ScanManifest(CATALOG_EXTENSIONS))
+        self.write_file("2022", "e.jpg")
+        self.touch_directory()
+
+        manifest = self.load()
+        self.assertEqual(self.scan(manifest), ["2020/b.png", "2021/c.gif", "2022/e.jpg", "a.jpg"])
+        # the new directory has no entry to reuse, the root has changed
+        self.assertEqual((manifest.hits, manifest.misses), (2, 2))
+
+    def test_only_scanned_directories_are_saved(self):
+        self.scan(ScanManifest(CATALOG_EXTENSIONS))
+        for name in os.listdir(self.path("2021")):
+            os.remove(self.path("2021", name))
+        os.rmdir(self.path("2021"))
+        self.touch_directory()
+
+        self.scan(self.load())
+        self.assertNotIn(self.path("2021"), self.load().previous)
+
+    def test_mismatching_or_unreadable_manifest_is_empty(self):
+        self.scan(ScanManifest(CATALOG_EXTENSIONS))
+        self.assertEqual(ScanManifest.load(self.manifest_file_path, [".jpg"]).previous, {})
+
+        with open(self.manifest_file_path, encoding="utf-8") as manifest_file:
+            data = json.load(manifest_file)
+        data["version"] = MANIFEST_VERSION + 1
+        with open(self.manifest_file_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(data, manifest_file)
+        self.assertEqual(self.load().previous, {})
+
+        with open(self.manifest_file_path, "w", encoding="utf-8") as manifest_file:
+            manifest_file.write('{"version": ')
+        self.assertEqual(self.load().previous, {})
+        self.assertEqual(ScanManifest.load(os.path.join(self.temp_dir.name, "missing.json"),
+                                           CATALOG_EXTENSIONS).previous, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+from math import comb
+
+from similarity_index import MultiIndexHash, hamming_distance
+
+
+def brute_force(items, value, max_distance):
+    return sorted((hamming_distance(value, candidate), item) for candidate, item in items
+                  if hamming_distance(value, candidate) <= max_distance)
+
+
+def near(value, bits, random_bits):
+    # value with `bits` distinct bits flipped
+    for bit in random_bits.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+class MultiIndexHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1234)
+        self.items = []
+        for index in range(300):
+            value = self.random.getrandbits(64)
+            self.items.append((value, f"image_{index}"))
+            # near copies at every distance up to 16 bits
+            self.items.append((near(value, index % 17, self.random), f"copy_{index}"))
+
+    def test_search_matches_brute_force(self):
+        for blocks in (1, 2, 4, 8):
+            index = MultiIndexHash(blocks=blocks)
+            for value, item in self.items:
+                index.add(value, item)
+            self.assertEqual(len(index), len(self.items))
+            for max_distance in (0, 1, 3, 4, 7, 8, 12, 16):
+                if comb(64 // blocks, max_distance // blocks) > 5000:
+                    # wide blocks with many bits to flip have too many masks to try
+                    continue
+                for value, _ in self.items[::25]:
+                    with self.subTest(blocks=blocks, max_distance=max_distance, value=value):
+                        self.assertEqual(sorted(index.search(value, max_distance)),
+                                         brute_force(self.items, value, max_distance))
+
+    def test_query_not_in_the_index(self):
+        index = MultiIndexHash()
+        for value, item in self.items:
+            index.add(value, item)
+        for _ in range(20):
+            value = self.random.getrandbits(64)
+            self.assertEqual(sorted(index.search(value, 10)), brute_force(self.items, value, 10))
+
+    def test_equal_hashes_are_all_returned(self):
+        index = MultiIndexHash()
+        index.add(0xFFFF, "a")
+        index.add(0xFFFF, "b")
+        index.add(0xFFFE, "c")
+        index.add(0, "d")
+        self.assertEqual(sorted(index.search(0xFFFF, 1)), [(0, "a"), (0, "b"), (1, "c")])
+        self.assertEqual(index.search(0xFFFF, 0), [(0, "a"), (0, "b")])
+
+    def test_other_widths(self):
+        index = MultiIndexHash(bits=16, blocks=4)
+        items = [(value, value) for value in range(0, 1 << 16, 7)]
+        for value, item in items:
+            index.add(value, item)
+        for value in (0, 0xABCD, 0xFFFF):
+            self.assertEqual(sorted(index.search(value, 5)), brute_force(items, value, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
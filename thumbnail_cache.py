@@ -0,0 +1,148 @@
+import os
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from preview_loader import load_preview
+from catalog_stream import iter_catalog_sources
+
+# Size of the Picture Deck thumbnails
+THUMBNAIL_SIZE = (100, 100)
+
+# The cache lives next to the scripts and is trimmed back to this size (least recently used first)
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnail_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Image modes that can be saved to PNG as they are
+PNG_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")
+
+
+class ThumbnailCache:
+    # Persistent thumbnail cache. Entries are PNG files keyed by image path, mtime, size and
+    # thumbnail size, so an edited or replaced image gets a new entry. Reading an entry touches
+    # its file mtime, which is the recency used for LRU eviction.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = tuple(size)
+        self.total_bytes = None
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_file_path(self, image_path, stat):
+        key = f"{os.path.normcase(os.path.abspath(image_path))}|{stat.st_mtime_ns}|{stat.st_size}|{self.size[0]}x{self.size[1]}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".png")
+
+    def get(self, image_path):
+        # returns the thumbnail as a loaded PIL image, creating the cache entry when needed
+        stat = os.stat(image_path)
+        cache_file_path = self.cache_file_path(image_path, stat)
+
+        from PIL import Image
+        try:
+            thumbnail = Image.open(cache_file_path)
+            thumbnail.load()
+            os.utime(cache_file_path)
+            return thumbnail
+        except Exception:
+            # missing or damaged cache file; Pillow raises more than OSError for damaged files
+            pass
+
+        thumbnail = self.make_thumbnail(image_path)
+        self.store(cache_file_path, thumbnail)
+        return thumbnail
+
+    def make_thumbnail(self, image_path):
+        image = load_preview(image_path, self.size)
+        if image.mode not in PNG_MODES:
+            image = image.convert("RGB")
+        return image
+
+    def store(self, cache_file_path, thumbnail):
+        # write to a temporary file and rename, so a reader never sees a partial PNG
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        temp_file_path = f"{cache_file_path}.{threading.get_ident()}.tmp"
+        try:
+            thumbnail.save(temp_file_path, "PNG")
+            os.replace(temp_file_path, cache_file_path)
+        except OSError:
+            # the cache is best effort; the thumbnail is still returned
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            return
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self.cache_size()
+            else:
+                self.total_bytes += os.path.getsize(cache_file_path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def cache_entries(self):
+        entries = []
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith(".png"):
+                    try:
+                        stat = os.stat(os.path.join(root, file))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+        return entries
+
+    def cache_size(self):
+        return sum(size for _, size, _ in self.cache_entries())
+
+    def evict(self):
+        # remove least recently used entries until the cache is back under 90% of max_bytes
+        entries = sorted(self.cache_entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        target_bytes = self.max_bytes * 0.9
+        for _, size, file_path in entries:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(file_path)
+                total_bytes -= size
+            except OSError:
+                continue
+        self.total_bytes = total_bytes
+
+    def pregenerate(self, image_paths, max_workers=4):
+        # create the missing thumbnails for a list of images; returns (generated or found, failed)
+
+        def generate(image_path):
+            # a corrupt file may raise SyntaxError, struct.error, EOFError, ... and must not stop the others
+            try:
+                self.get(image_path)
+                return True
+            except Exception:
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(generate, image_paths))
+        return results.count(True), results.count(False)
+
+
+def catalog_image_paths(catalog_file_path):
+    # streamed, so a large catalog is never loaded as a whole
+    return list(iter_catalog_sources(catalog_file_path))
+
+
+if __name__ == "__main__":
+    # Pre-generate the Picture Deck thumbnails of a catalog
+    parser = argparse.ArgumentParser(description='Create the Picture Deck thumbnails for the images in a catalog.')
+    parser.add_argument('--catalog_file_path', required=True, help='Full path to the JSON catalog file.')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Thumbnail cache directory.')
+    parser.add_argument('--max_mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help='Maximum cache size in MB.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of images decoded at the same time.')
+    args = parser.parse_args()
+
+    thumbnail_cache = ThumbnailCache(args.cache_dir, args.max_mb * 1024 * 1024)
+    image_paths = catalog_image_paths(args.catalog_file_path)
+    print(f"Generating thumbnails for {len(image_paths)} images...")
+    generated, failed = thumbnail_cache.pregenerate(image_paths, args.workers)
+    print(f"Thumbnails ready: {generated}, failed: {failed}")
@@ -1,69 +1,17 @@
 import argparse
 import os
-import glob
 import json
 from datetime import datetime
-
-def find_images(start_year, end_year, search_path, ignore_list):
-    if not end_year:
-        print("Error: End year is required.")
-        exit(1)
-
-    if end_year < start_year:
-        print("Error: End year should be greater than or equal to start year.")
-        exit(1)
-
-    # Define a list of common image file extensions
-    extensions = ["*.jpg", "*.jpeg", "*.png", "*.gif"]
-    # Use glob to search for files with those extensions in the search_path directory
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(search_path, "**", ext), recursive=True))
-    # Filter the files to only include those modified within the date range and not in the ignore_list
-    filtered_files = []
-    for file_path in files:
-
-        ignore_file_check = False
-        for ignore_path in ignore_list:
-            if os.path.abspath(file_path) == os.path.abspath(ignore_path) or os.path.commonpath([os.path.abspath(file_path), os.path.abspath(ignore_path)]) == os.path.abspath(ignore_path):
-                ignore_file_check = True
-                break
-
-        if ignore_file_check:
-            continue       
-       
-       
-        modified_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-        if start_year <= modified_date.year <= end_year and file_path not in ignore_list:
-            file_path = file_path.replace("\\", "/")
-            filtered_files.append(file_path)
-            
-    return filtered_files
-
-
-# Create the argument parser
-parser = argparse.ArgumentParser(description='Search for images within a date range and write metadata to a JSON file.')
-parser.add_argument('--catalog_file_path', required=True, help='Full path to the JSON catalog file.')
-parser.add_argument('--search_path', required=True, help='Path to the directory to search for image files.')
-parser.add_argument('--ignore_file', type=str, required=False, help='Text file name with paths to ignore.')
-
-# Parse the arguments
-args = parser.parse_args()
-
-catalog_file_path = args.catalog_file_path
-search_path = args.search_path
-ignore_file = args.ignore_file
-print("ignore_file=", ignore_file)
-
-# Extract start_year and end_year from the catalog_file_path
-base_name = os.path.basename(catalog_file_path)
-base_name = os.path.splitext(base_name)[0]
-years = base_name.split('_')[1:]
-if len(years) == 1:
-    start_year = end_year = int(years[0])
-else:
-    start_year = int(years[0])
-    end_year = int(years[1])
+from image_scanner import find_image_files, scan_image_files, check_year_range, CATALOG_EXTENSIONS
+from ignore_matcher import IgnoreMatcher, read_ignore_list
+from image_record import new_image_record
+from catalog_merge import diff_records, write_merge_stats
+from scan_manifest import ScanManifest, manifest_path_for
+from content_hash import deduplicate_image_files, hash_cache_path_for
+from image_metadata import image_metadata, metadata_cache_path_for, files_captured_in, add_metadata_fields
+from catalog_sqlite import SqliteCatalogStore, is_sqlite_catalog
+from catalog_stream import iter_catalog_records, append_catalog_records
+import profiling
 
 
 # Function to get the device_id
@@ -89,86 +37,223 @@ def get_device_id(catalog_file_path):
         return None
 
 
-device_id = get_device_id("device_id.json")  # Get the device id
-print("device_id",device_id)
-ignore_list = []
-
-if args.ignore_file:
-    ignore_filename = args.ignore_file
-    if os.path.exists(ignore_filename):
-        with open(ignore_filename, encoding='utf-8') as ignore_file:
-            ignore_list = [line.rstrip() for line in ignore_file]
-            print("ignore_list=", ignore_list)
-
-
-print("Getting catalog items...")
-
-# Call the function to search for images within the date range of start_year and end_year
-image_files = find_images(start_year, end_year, search_path, ignore_list)
-
-# Create a list of dictionaries for each image file with metadata fields
-image_list = []
-total_size = 0  # Initialize total size to 0
-
-for file_path in image_files:
-    # Get the current datetime as a string
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # Get the date modified of the file and convert it to a string representation
-    mod_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M:%S")
-    # Create a dictionary with metadata fields, including date modified
-    image_dict = {
-        "source": file_path,
-        "device_id": device_id,   
-        "load_date": current_date,
-        "date_modified": mod_date,
-        "artist": "",
-        "title": "",
-        "media": "",
-        "category": "",
-        "location": "",
-        "description": "",
-        "year_of_work": "",
-        "for_sale": "",
-        "price": ""
+class UpdateCancelled(Exception):
+    # raised by a progress callback to stop update_catalog before it writes anything
+    pass
+
+
+# Records built between two progress reports
+PROGRESS_INTERVAL = 1000
+
+
+def catalog_years(base_name):
+    # detail_2023 -> (2023, 2023), detail_2015_2017 -> (2015, 2017)
+    years = base_name.split('_')[1:]
+    if len(years) == 1:
+        return int(years[0]), int(years[0])
+    return int(years[0]), int(years[1])
+
+
+def update_catalog(catalog_file_path, search_path, ignore_list=(), catalog_name=None, full_rescan=False,
+                   stats_file=None, content_hash=False, duplicates_file=None, canonical_only=False,
+                   phash=False, exif=False, device_id=None, progress=None):
+    # Add the images found below search_path to the catalog and return the merge statistics.
+    # progress(phase, done, total) is called from this thread as the update goes, with total None
+    # while it is not known. It may raise UpdateCancelled; the catalog and manifest are then left as
+    # they were, since nothing is written before the merge is complete.
+    if progress is None:
+        def progress(phase, done, total):
+            pass
+
+    # Extract start_year and end_year from the catalog_file_path, or the catalog name for SQLite catalogs
+    if is_sqlite_catalog(catalog_file_path):
+        if not catalog_name:
+            raise ValueError("--catalog_name is required for SQLite catalogs.")
+        base_name = catalog_name
+    else:
+        base_name = os.path.basename(catalog_file_path)
+        base_name = os.path.splitext(base_name)[0]
+    start_year, end_year = catalog_years(base_name)
+
+    if device_id is None:
+        device_id = get_device_id("device_id.json")  # Get the device id
+    print("device_id",device_id)
+
+    print("Getting catalog items...")
+
+    # Compile the ignore list once; ignored directories are pruned during the search
+    ignore_matcher = IgnoreMatcher(list(ignore_list))
+
+    # Load the directory manifest stored next to the catalog; unchanged directories are not read again
+    manifest_file_path = manifest_path_for(catalog_file_path, base_name if is_sqlite_catalog(catalog_file_path) else None)
+    if full_rescan:
+        scan_manifest = ScanManifest(CATALOG_EXTENSIONS)
+    else:
+        scan_manifest = ScanManifest.load(manifest_file_path, CATALOG_EXTENSIONS)
+
+    # the previous scan tells roughly how many files this one will find
+    expected_files = scan_manifest.previous_file_count() or None
+
+    def scan_progress(found):
+        progress("scan", found, expected_files)
+
+    # Hash and metadata caches are kept next to the catalog
+    cache_dir = os.path.dirname(catalog_file_path)
+
+    if exif:
+        # Images are selected by the year they were taken, read from the EXIF header; images without
+        # a capture date fall back to their modification year
+        check_year_range(start_year, end_year)
+        image_files = scan_image_files(search_path, ignore_matcher, manifest=scan_manifest, progress=scan_progress)
+        progress("metadata", 0, len(image_files))
+        metadata = image_metadata(image_files, metadata_cache_path_for(cache_dir))
+        image_files = files_captured_in(image_files, metadata, start_year, end_year)
+    else:
+        # Call the function to search for images within the date range of start_year and end_year
+        image_files = find_image_files(start_year, end_year, search_path, ignore_matcher, manifest=scan_manifest,
+                                       progress=scan_progress)
+    print(f"Directories reused from manifest: {scan_manifest.hits}, rescanned: {scan_manifest.misses}")
+
+    # Find identical copies by content; hashes are cached next to the catalog, by path, mtime and size
+    content_hashes = {}
+    if content_hash or duplicates_file or canonical_only:
+        progress("hashes", 0, len(image_files))
+        image_files, content_hashes = deduplicate_image_files(
+            image_files, hash_cache_path_for(cache_dir), content_hash, duplicates_file, canonical_only)
+
+    # Perceptual hashes of resized and re-encoded copies differ in only a few bits
+    phashes = {}
+    if phash:
+        progress("phash", 0, len(image_files))
+        from perceptual_hash import perceptual_hashes
+        phashes = perceptual_hashes(image_files, hash_cache_path_for(cache_dir))
+
+    # Create a list of records for each image file with metadata fields
+    image_list = []
+    total_size = 0  # Initialize total size to 0
+
+    with profiling.span("build_records", files=len(image_files)):
+        for image_file in image_files:
+            file_path = image_file.path
+            # Get the current datetime as a string
+            current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Get the date modified of the file (stat taken during the scan) and convert it to a string representation
+            mod_date = datetime.fromtimestamp(image_file.mtime).strftime("%Y-%m-%d %H:%M:%S")
+            # Create a record with metadata fields, including date modified; the other fields start empty
+            image_dict = new_image_record(file_path, device_id, current_date, mod_date)
+            if content_hash:
+                image_dict["content_hash"] = content_hashes.get(file_path, "")
+            if phash:
+                image_dict["phash"] = phashes.get(file_path, "")
+            if exif:
+                add_metadata_fields(image_dict, metadata.get(file_path, {}))
+            # Append the dictionary to the list of image objects
+            image_list.append(image_dict)
+            # Add the file size to the total size
+            total_size += image_file.size
+            if len(image_list) % PROGRESS_INTERVAL == 0:
+                progress("records", len(image_list), len(image_files))
+
+    # Create a dictionary with the list of image objects
+    if end_year == start_year:
+        base_name = f"detail_{start_year}"
+    else:
+        base_name = f"detail_{start_year}_{end_year}"
+    output_dict = {
+        base_name: image_list
     }
-    # Append the dictionary to the list of image objects
-    image_list.append(image_dict)
-    # Add the file size to the total size
-    total_size += os.path.getsize(file_path)
-
-# Create a dictionary with the list of image objects
-if end_year == start_year:
-    base_name = f"detail_{start_year}"
-else:
-    base_name = f"detail_{start_year}_{end_year}"
-output_dict = {
-    base_name: image_list
-}
-# Load the existing catalog file
-existing_catalog_path = catalog_file_path
-if os.path.exists(existing_catalog_path):
-    with open(existing_catalog_path, encoding='utf-8') as json_file:
-        existing_catalog = json.load(json_file)
-else:
-    existing_catalog = {}
-
-# Loop through the image dictionaries in the temporary catalog and check if the file path already exists in the existing catalog
-for image_dict in output_dict[base_name]:
-    source_path = image_dict["source"]
-    if source_path not in [existing_image_dict["source"] for existing_image_dict in existing_catalog.get(base_name, [])] and not any(ignore_path in source_path for ignore_path in ignore_list):
-        print("source_path =", source_path)
-        # If the file path does not exist and is not in the ignore_list, append the new dictionary to the existing catalog
-        existing_catalog.setdefault(base_name, []).append(image_dict)
-
-
-# Write the updated catalog to the file
-with open(existing_catalog_path, "w") as json_file:
-    json.dump(existing_catalog, json_file, indent=4)
-
-# Convert total size to megabytes and gigabytes
-total_size_mb = total_size / (1024 * 1024)
-total_size_gb = total_size_mb / 1024
-print(f"Total number of images: {len(image_files)}")
-print(f"Total size: {total_size} bytes, {total_size_mb:.2f} MB, {total_size_gb:.2f} GB")
-
-print("Done.")
+    # Read the existing catalog records. A JSON catalog is streamed record by record (with the edits still
+    # waiting in its journal applied), so only the sources and dates are held in memory.
+    progress("merge", 0, len(image_list))
+    existing_catalog_path = catalog_file_path
+    catalog_store = None
+    if is_sqlite_catalog(existing_catalog_path):
+        catalog_store = SqliteCatalogStore(existing_catalog_path)
+        existing_records = catalog_store.records(base_name)
+    elif os.path.exists(existing_catalog_path):
+        existing_records = (record for _, record in iter_catalog_records(existing_catalog_path, base_name))
+    else:
+        existing_records = []
+
+    # Compare the temporary catalog with the existing catalog. Sources are looked up in an index built once,
+    # with case and slashes normalized; ignored paths were already pruned by the search.
+    try:
+        added_records, merge_stats = diff_records(existing_records, output_dict[base_name])
+        merge_stats["catalog"] = base_name
+        for source_path in merge_stats["changes"]["added"]:
+            print("source_path =", source_path)
+        profiling.count("records_added", len(added_records))
+
+        # last chance to cancel; from here on the catalog is written
+        progress("write", 0, len(added_records))
+    except UpdateCancelled:
+        if catalog_store is not None:
+            catalog_store.close()
+        raise
+
+    # Write the updated catalog to the file; a SQLite catalog only inserts the added rows
+    if catalog_store is not None:
+        catalog_store.add_records(base_name, added_records)
+        catalog_store.close()
+    else:
+        # the old file is streamed into a temporary file with the added records appended, then renamed,
+        # so a crash cannot truncate the catalog
+        append_catalog_records(existing_catalog_path, base_name, added_records, indent=4)
+
+    # Save the manifest only after the catalog has been written
+    scan_manifest.save(manifest_file_path)
+
+    # Convert total size to megabytes and gigabytes
+    total_size_mb = total_size / (1024 * 1024)
+    total_size_gb = total_size_mb / 1024
+    print(f"Total number of images: {len(image_files)}")
+    print(f"Total size: {total_size} bytes, {total_size_mb:.2f} MB, {total_size_gb:.2f} GB")
+    print(f"Added: {merge_stats['added']}, unchanged: {merge_stats['unchanged']}, modified: {merge_stats['modified']}, vanished: {merge_stats['vanished']}")
+
+    # Write the machine-readable merge statistics
+    if stats_file:
+        write_merge_stats(merge_stats, stats_file)
+        print("stats_file=", stats_file)
+
+    return merge_stats
+
+
+def main():
+    # Create the argument parser
+    parser = argparse.ArgumentParser(description='Search for images within a date range and write metadata to a JSON file.')
+    parser.add_argument('--catalog_file_path', required=True, help='Full path to the JSON (or SQLite .db/.sqlite) catalog file.')
+    parser.add_argument('--catalog_name', type=str, required=False, help='Catalog to update inside a SQLite catalog file, e.g. detail_2023.')
+    parser.add_argument('--search_path', required=True, help='Path to the directory to search for image files.')
+    parser.add_argument('--ignore_file', type=str, required=False, help='Text file name with paths to ignore.')
+    parser.add_argument('--full_rescan', action='store_true', help='Ignore the scan manifest and read every directory again.')
+    parser.add_argument('--stats_file', type=str, required=False, help='JSON file to write the added/unchanged/modified/vanished statistics to.')
+    parser.add_argument('--content_hash', action='store_true', help='Store a content hash of each image file in its record.')
+    parser.add_argument('--duplicates_file', type=str, required=False, help='JSON file to write the groups of identical image files to.')
+    parser.add_argument('--canonical_only', action='store_true', help='Catalog only one copy of identical image files.')
+    parser.add_argument('--phash', action='store_true', help='Store a perceptual hash of each image for finding near-duplicates.')
+    parser.add_argument('--exif', action='store_true', help='Read the capture date, camera, size and GPS position from the image headers and select images by capture year.')
+    profiling.add_arguments(parser)
+
+    # Parse the arguments
+    args = parser.parse_args()
+    profiling.enable(args.profile, args.cprofile)
+
+    print("ignore_file=", args.ignore_file)
+    ignore_list = read_ignore_list(args.ignore_file)
+    if ignore_list:
+        print("ignore_list=", ignore_list)
+
+    try:
+        update_catalog(args.catalog_file_path, args.search_path, ignore_list, catalog_name=args.catalog_name,
+                       full_rescan=args.full_rescan, stats_file=args.stats_file, content_hash=args.content_hash,
+                       duplicates_file=args.duplicates_file, canonical_only=args.canonical_only, phash=args.phash,
+                       exif=args.exif)
+    except ValueError as e:
+        print("Error:", str(e))
+        exit(1)
+
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()